@@ -0,0 +1,199 @@
+import json
+import os
+import struct
+import weakref
+import numpy as np
+import pygame
+
+from PygameCollection.utils import loadConvImg, factoredScaling, maskToArray, arrayToMask
+
+# Asset bundle format (.tcab), all values little endian: header "<4sHHI" (magic, version, reserved, length of the
+# table of contents), the table of contents (utf8 json, see saveBundle) and the data of every image starting at
+# multiples of 8 bytes: the raw pixels (pygame.image.tobytes) followed by the packed bits of its mask (np.packbits per row)
+MAGIC = b"TCAB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+EXTENSION = ".tcab"
+
+def _aligned(offset):
+	return (offset + 7) & ~7
+
+def _displayExists():
+	return pygame.display.get_surface() is not None
+
+# Loads, converts and scales every image once, all users of an image share the same surface and mask.
+# Images are identified by their source path and scaling, e.g. image(("assets", "img", "TankBlue.png"), 0.5).
+# A bundle stores the preprocessed images and masks, so loading them skips decoding and scaling. Entries whose
+# source file has changed since the bundle was written are ignored
+class AssetManager:
+	def __init__(self):
+		self.images = {} # key -> surface
+		self.masks = weakref.WeakKeyDictionary() # surface -> mask
+		self.sources = {} # key -> (mtime in ns, size) of the source file
+		self.hits = 0
+		self.misses = 0
+		self.bundlePath = None
+		self._decoded = set() # keys of images loaded from their source file since the bundle was written
+		self._unconverted = set() # keys of images loaded without a display mode (they are converted once there is one)
+
+	def __len__(self):
+		return len(self.images)
+
+	def __contains__(self, key):
+		return key in self.images
+
+	@staticmethod
+	def key(pathTuple, scaleFactor=1, size=None, preserveAlpha=True):
+		return os.path.join(*pathTuple), scaleFactor, None if size is None else tuple(size), preserveAlpha
+
+	# scaleFactor or size, see utils.loadConvFacScaledImg and utils.loadConvScaledImg
+	def image(self, pathTuple, scaleFactor=1, size=None, preserveAlpha=True):
+		assert size is None or scaleFactor == 1, "either scale by a factor or to a size"
+		key = AssetManager.key(pathTuple, scaleFactor, size, preserveAlpha)
+		img = self.images.get(key)
+		if img is None:
+			self.misses += 1
+			path = key[0]
+			img = loadConvImg(path, preserveAlpha)
+			if size is not None:
+				img = pygame.transform.scale(img, size)
+			elif scaleFactor != 1:
+				img = factoredScaling(img, scaleFactor)
+			self._store(key, img, AssetManager._stat(path))
+			self._decoded.add(key)
+			return img
+		self.hits += 1
+		if key in self._unconverted and _displayExists():
+			img = self._convert(key)
+		return img
+
+	# masks are shared by every user of the surface and dropped together with it
+	def mask(self, img):
+		mask = self.masks.get(img)
+		if mask is None:
+			mask = self.masks[img] = pygame.mask.from_surface(img)
+		return mask
+
+	def clear(self):
+		self.images.clear()
+		self.masks.clear()
+		self.sources.clear()
+		self._decoded.clear()
+		self._unconverted.clear()
+
+	def _store(self, key, img, source):
+		self.images[key] = img
+		self.sources[key] = source
+		if _displayExists():
+			self._unconverted.discard(key)
+		else:
+			self._unconverted.add(key)
+
+	def _convert(self, key):
+		old = self.images[key]
+		img = old.convert_alpha() if key[3] else old.convert()
+		mask = self.masks.get(old)
+		if mask is not None:
+			self.masks[img] = mask
+		self.images[key] = img
+		self._unconverted.discard(key)
+		return img
+
+	@staticmethod
+	def _stat(path):
+		s = os.stat(path)
+		return s.st_mtime_ns, s.st_size
+
+	# the table of contents lists per image: key, source (mtime, size), image size, pixel format and the offsets of
+	# its pixels and mask relative to the start of the data
+	def saveBundle(self, path):
+		entries, sections = [], []
+		offset = 0
+		for key, img in self.images.items():
+			fmt = "RGBA" if key[3] else "RGB"
+			pixels = pygame.image.tobytes(img, fmt)
+			bits = np.packbits(maskToArray(self.mask(img)), axis=1).tobytes()
+			maskOffset = _aligned(offset + len(pixels))
+			entries.append({"key": list(key), "source": list(self.sources[key]), "size": list(img.get_size()), "format": fmt,
+							"pixels": offset, "mask": maskOffset, "maskLength": len(bits)})
+			sections += [(offset, pixels), (maskOffset, bits)]
+			offset = _aligned(maskOffset + len(bits))
+		toc = json.dumps(entries).encode("utf8")
+		start = _aligned(HEADER.size + len(toc))
+		# written next to the bundle first, so readers (e.g. other processes) never see a partial file
+		tmpPath = f"{path}.{os.getpid()}.tmp"
+		try:
+			with open(tmpPath, "wb") as f:
+				f.write(HEADER.pack(MAGIC, VERSION, 0, len(toc)))
+				f.write(toc)
+				for sectionOffset, data in sections:
+					f.write(b"\0" * (start + sectionOffset - f.tell()))
+					f.write(data)
+			os.replace(tmpPath, path)
+		finally:
+			if os.path.exists(tmpPath):
+				os.remove(tmpPath)
+		self._decoded.clear()
+
+	# adds the images of the bundle which are not loaded yet and whose source file is unchanged, returns their count
+	def loadBundle(self, path):
+		with open(path, "rb") as f:
+			data = f.read()
+		if len(data) < HEADER.size:
+			raise ValueError(f"{path} is not an asset bundle (file too short)")
+		magic, version, _, tocLength = HEADER.unpack_from(data)
+		if magic != MAGIC:
+			raise ValueError(f"{path} is not an asset bundle (bad magic {magic!r})")
+		if version != VERSION:
+			raise ValueError(f"{path}: unsupported asset bundle version {version} (expected {VERSION})")
+		try:
+			entries = json.loads(data[HEADER.size:HEADER.size+tocLength].decode("utf8"))
+		except ValueError as e:
+			raise ValueError(f"{path}: damaged table of contents") from e
+		start = _aligned(HEADER.size + tocLength)
+		loaded = 0
+		for e in entries:
+			sourcePath, scaleFactor, size, preserveAlpha = e["key"]
+			key = (sourcePath, scaleFactor, None if size is None else tuple(size), preserveAlpha)
+			if key in self.images:
+				continue
+			try:
+				if tuple(e["source"]) != AssetManager._stat(sourcePath):
+					continue
+			except OSError:
+				continue
+			w, h = e["size"]
+			pixelsEnd = start + e["pixels"] + w*h*len(e["format"])
+			maskEnd = start + e["mask"] + e["maskLength"]
+			if max(pixelsEnd, maskEnd) > len(data):
+				raise ValueError(f"{path}: truncated asset bundle")
+			img = pygame.image.frombytes(data[start+e["pixels"]:pixelsEnd], (w, h), e["format"])
+			bits = np.frombuffer(data, dtype=np.uint8, count=e["maskLength"], offset=start+e["mask"]).reshape(h, -1)
+			self._store(key, img, tuple(e["source"]))
+			if _displayExists():
+				img = self._convert(key)
+			self.masks[img] = arrayToMask(np.unpackbits(bits, axis=1, count=w))
+			loaded += 1
+		return loaded
+
+	# loads the bundle once, a missing or invalid bundle is ignored (it is written again by updateBundle)
+	def useBundle(self, path):
+		if path == self.bundlePath:
+			return
+		self.bundlePath = path
+		try:
+			self.loadBundle(path)
+		except (OSError, ValueError):
+			pass
+
+	# writes the bundle again if images had to be loaded from their source files, returns True if it was written
+	def updateBundle(self):
+		if self.bundlePath is None or not self._decoded:
+			return False
+		try:
+			self.saveBundle(self.bundlePath)
+		except OSError:
+			return False
+		return True
+
+assets = AssetManager()
@@ -0,0 +1,337 @@
+import numpy as np
+from math import cos, sin, acos, atan2, hypot, floor, pi, inf
+from PygameCollection.math import Vector2DArray, Point2D
+from PygameCollection.spatial import BoxGrid, boxesIntersect
+
+# Continuous collision of moving circles against thick line segments (e.g. walls).
+# A segment with half width w hit by a circle of radius r is treated as a capsule of radius r+w around the segment,
+# the time of impact is the first t in [0, 1] at which the circle center enters that capsule
+
+class SweepHit:
+	def __init__(self, wall, t, point, normal):
+		self.wall = wall
+		self.t = t # fraction of the motion until impact
+		self.point = point # circle center at impact
+		self.normal = normal # unit vector pointing from the segment to the circle
+
+	def reflect(self, direction):
+		return self.wall.reflectVector(direction)
+
+# p0: (n, 2) start positions, motion: (n, 2) movement during the sweep, radii: (n)
+# starts, deltas, lengthsSq, halfWidths: segments as returned by TankMap.wallArrays()
+# ignore: (n) index of a segment which is skipped for each circle (-1 = none)
+# grid: BoxGrid built over segmentBoxes() of the segments (e.g. TankMap.wallGrid()), built for this call if None
+# returns t (n) (inf if nothing was hit), segment index (n) (-1 if nothing was hit) and normals (n, 2) at impact
+def sweepCircles(p0, motion, radii, starts, deltas, lengthsSq, halfWidths, ignore=None, grid=None):
+	n = len(p0)
+	tHit = np.full(n, np.inf)
+	segHit = np.full(n, -1, dtype=np.int32)
+	normals = np.zeros((n, 2))
+	if len(starts) == 0 or n == 0:
+		return tHit, segHit, normals
+
+	# broadphase: bounding boxes of the swept circles against bounding boxes of the capsules
+	ci, si = _overlappingBoxes(p0, motion, radii, starts, deltas, halfWidths, grid)
+	if ignore is not None:
+		keep = ignore[ci] != si
+		ci, si = ci[keep], si[keep]
+	if len(ci) == 0:
+		return tHit, segHit, normals
+
+	# values per pair as columns (np.take is a lot faster than fancy indexing of 2D arrays)
+	v = np.take(motion, ci, axis=0)
+	r = np.take(p0, ci, axis=0) - np.take(starts, si, axis=0)
+	d = np.take(deltas, si, axis=0)
+	vx, vy, rx, ry, dx, dy = v[:, 0], v[:, 1], r[:, 0], r[:, 1], d[:, 0], d[:, 1]
+	R = np.take(radii, ci) + np.take(halfWidths, si)
+	lSq = np.take(lengthsSq, si)
+	length = np.sqrt(lSq)
+
+	# midphase: the swept circle has to come close to the line through the segment (bounding boxes of diagonal
+	# segments are large), |cross product| = distance to the line * segment length
+	keep = np.abs((rx + vx/2)*dy - (ry + vy/2)*dx) <= (R + np.sqrt(vx*vx + vy*vy)/2)*length
+	ci, si, vx, vy, rx, ry, dx, dy, R, lSq, length = (x[keep] for x in (ci, si, vx, vy, rx, ry, dx, dy, R, lSq, length))
+	if len(ci) == 0:
+		return tHit, segHit, normals
+
+	nx, ny = -dy/length, dx/length
+	t = np.full(len(ci), np.inf)
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		# long sides of the capsule (lines parallel to the segment at distance R)
+		s0 = rx*nx + ry*ny
+		ds = vx*nx + vy*ny
+		tSide = (np.abs(s0) - R) / np.abs(ds)
+		u = ((rx + tSide*vx)*dx + (ry + tSide*vy)*dy) / lSq
+		valid = (s0*ds < 0) & (np.abs(s0) >= R) & (tSide <= 1) & (u >= 0) & (u <= 1)
+		t[valid] = tSide[valid]
+
+		# round caps around both end points
+		a = vx*vx + vy*vy
+		for cx, cy in ((rx, ry), (rx - dx, ry - dy)):
+			b = 2*(cx*vx + cy*vy)
+			c = cx*cx + cy*cy - R*R
+			disc = b*b - 4*a*c
+			tCap = (-b - np.sqrt(np.maximum(disc, 0))) / (2*a)
+			valid = (c > 0) & (b < 0) & (disc >= 0) & (tCap <= 1) & (tCap < t)
+			t[valid] = tCap[valid]
+
+		# already overlapping and still moving towards the segment -> immediate hit
+		u0 = np.clip((rx*dx + ry*dy) / lSq, 0, 1)
+		ax, ay = rx - u0*dx, ry - u0*dy
+		inside = (ax*ax + ay*ay < R*R) & (ax*vx + ay*vy < 0)
+		t[inside] = 0
+
+	# narrowphase result: earliest impact per circle
+	hits = np.isfinite(t)
+	ci, si, t = ci[hits], si[hits], t[hits]
+	if len(ci) == 0:
+		return tHit, segHit, normals
+	order = np.lexsort((t, ci))
+	ci, si, t = ci[order], si[order], t[order]
+	first = np.ones(len(ci), dtype=bool)
+	first[1:] = ci[1:] != ci[:-1]
+	ci, si, t = ci[first], si[first], t[first]
+	tHit[ci] = t
+	segHit[ci] = si
+
+	# normal: from the closest point of the segment to the circle center at impact
+	q = p0[ci] + t[:, None]*motion[ci]
+	qRel = q - starts[si]
+	u = np.clip(np.sum(qRel*deltas[si], axis=1) / lengthsSq[si], 0, 1)
+	away = qRel - u[:, None]*deltas[si]
+	dist = np.linalg.norm(away, axis=1)
+	# center lies on the segment -> fall back to the side normal facing against the motion
+	side = np.stack((-deltas[si, 1], deltas[si, 0]), axis=1) / np.sqrt(lengthsSq[si])[:, None]
+	side *= -np.sign(np.sum(motion[ci]*side, axis=1) + 1e-12)[:, None]
+	normals[ci] = np.where(dist[:, None] > 1e-9, away / np.maximum(dist, 1e-9)[:, None], side)
+	return tHit, segHit, normals
+
+# bounding boxes (x1, y1, x2, y2) of the capsules around the segments
+def segmentBoxes(starts, deltas, halfWidths):
+	ends = starts + deltas
+	return np.hstack((np.minimum(starts, ends) - halfWidths[:, None], np.maximum(starts, ends) + halfWidths[:, None]))
+
+# index pairs (circle, segment) whose bounding boxes overlap, ordered by circle and then by segment.
+# Only the segments sharing a grid cell with the swept box of a circle are compared
+def _overlappingBoxes(p0, motion, radii, starts, deltas, halfWidths, grid=None):
+	p1 = p0 + motion
+	circleBoxes = np.hstack((np.minimum(p0, p1) - radii[:, None], np.maximum(p0, p1) + radii[:, None]))
+	wallBoxes = segmentBoxes(starts, deltas, halfWidths)
+	if grid is None:
+		grid = BoxGrid()
+		grid.build(wallBoxes)
+	ci, si = grid.query(circleBoxes)
+	keep = boxesIntersect(np.take(circleBoxes, ci, axis=0), np.take(wallBoxes, si, axis=0))
+	return ci[keep], si[keep]
+
+# reflects every direction at the matching normal, same math as Wall.reflectVector for many vectors at once
+def reflectDirections(directions, normals):
+	r = Vector2DArray.fromSymReflection(Vector2DArray(directions), Vector2DArray(normals))
+	r.toUnitVec()
+	r.toCounter()
+	return r.arr
+
+
+# Rectangle rotated by angle around its center (hx, hy = half extents along its local axes)
+class OrientedBox:
+	def __init__(self, cx, cy, hx, hy, angle):
+		self.cx, self.cy = cx, cy
+		self.hx, self.hy = hx, hy
+		self.angle = angle
+
+	def axes(self):
+		c, s = cos(self.angle), sin(self.angle)
+		return (c, s), (-s, c)
+
+	def corners(self):
+		(ux, uy), (vx, vy) = self.axes()
+		return [
+			(self.cx + sx*self.hx*ux + sy*self.hy*vx, self.cy + sx*self.hx*uy + sy*self.hy*vy)
+			for sx, sy in ((1, 1), (-1, 1), (-1, -1), (1, -1))
+		]
+
+	def boundingRadius(self):
+		return hypot(self.hx, self.hy)
+
+	def moved(self, dx, dy, dAngle=0):
+		return OrientedBox(self.cx + dx, self.cy + dy, self.hx, self.hy, self.angle + dAngle)
+
+# walls which can be touched by the box when it moves at most 'distance' (in any direction) or rotates
+def _wallsInReach(box, walls, distance):
+	reach = box.boundingRadius() + distance
+	return [w for w in walls if Point2D.segmentDistance(box.cx, box.cy, *w[:4]) <= reach + w[4]]
+
+# wall of half width hw around the segment a -> b as box
+def wallBox(ax, ay, bx, by, hw):
+	l = hypot(bx - ax, by - ay)
+	return OrientedBox((ax + bx)/2, (ay + by)/2, l/2, hw, atan2(by - ay, bx - ax) if l > 0 else 0)
+
+def wallCorners(ax, ay, bx, by, hw):
+	return wallBox(ax, ay, bx, by, hw).corners()
+
+# (center, radius) of the projection of a box onto the axis (lx, ly)
+def _projection(box, axes, lx, ly):
+	(ux, uy), (vx, vy) = axes
+	return box.cx*lx + box.cy*ly, box.hx*abs(ux*lx + uy*ly) + box.hy*abs(vx*lx + vy*ly)
+
+# separating axis test of two boxes
+def boxesOverlap(a: OrientedBox, b: OrientedBox):
+	aAxes, bAxes = a.axes(), b.axes()
+	for lx, ly in aAxes + bAxes:
+		ac, ar = _projection(a, aAxes, lx, ly)
+		bc, br = _projection(b, bAxes, lx, ly)
+		if abs(ac - bc) >= ar + br:
+			return False
+	return True
+
+# Translation of a box by (dx, dy) against walls given as (ax, ay, bx, by, halfWidth).
+# Swept separating axis test: returns the fraction t in [0, 1] of the motion which is free and the contact normal
+# (pointing from the wall to the box, None if the whole motion is free)
+def boxTimeOfImpact(box: OrientedBox, dx, dy, walls):
+	tBest, normalBest = 1.0, None
+	boxAxes = box.axes()
+	for w in _wallsInReach(box, walls, hypot(dx, dy)):
+		wall = wallBox(*w)
+		wallAxes = wall.axes()
+		tEnter, tExit, enterAxis = -inf, inf, None
+		minPenetration, penetrationAxis = inf, None
+		separated = False
+		for lx, ly in boxAxes + wallAxes:
+			ac, ar = _projection(box, boxAxes, lx, ly)
+			bc, br = _projection(wall, wallAxes, lx, ly)
+			a0, a1, b0, b1 = ac - ar, ac + ar, bc - br, bc + br
+			v = dx*lx + dy*ly
+			if a1 <= b0:
+				if v <= 0:
+					separated = True
+					break
+				enter, exit = (b0 - a1)/v, (b1 - a0)/v
+			elif a0 >= b1:
+				if v >= 0:
+					separated = True
+					break
+				enter, exit = (b1 - a0)/v, (b0 - a1)/v
+			else:
+				enter = -inf
+				exit = inf if v == 0 else ((b1 - a0)/v if v > 0 else (b0 - a1)/v)
+				# direction which pushes the box out of the wall the fastest
+				if b1 - a0 < minPenetration:
+					minPenetration, penetrationAxis = b1 - a0, (lx, ly)
+				if a1 - b0 < minPenetration:
+					minPenetration, penetrationAxis = a1 - b0, (-lx, -ly)
+			if enter > tEnter:
+				tEnter, enterAxis = enter, (-lx, -ly) if v > 0 else (lx, ly)
+			tExit = min(tExit, exit)
+		if separated or tEnter > tExit or tEnter > 1:
+			continue
+		if tEnter == -inf:
+			# already overlapping (e.g. spawned inside a wall): only block moving further into the wall
+			if dx*penetrationAxis[0] + dy*penetrationAxis[1] < 0 and 0 < tBest:
+				tBest, normalBest = 0.0, penetrationAxis
+			continue
+		# a contact exactly at the end of the motion counts as well, so the box keeps its skin distance
+		# (rotations can not be limited from an exact contact, see boxRotationLimit)
+		if tEnter < tBest or (normalBest is None and tEnter == tBest):
+			tBest, normalBest = max(0.0, tEnter), enterAxis
+	return tBest, normalBest
+
+# smallest rotation phi in (0, limit] for which rho*cos(psi0 + sign*phi) == k while decreasing, inf if there is none
+def _angleOfContact(psi0, sign, rho, k, limit):
+	if rho == 0 or abs(k/rho) > 1:
+		return inf
+	base = acos(k/rho)
+	best = inf
+	for target in (base, -base):
+		phi = ((target - psi0)*sign) % (2*pi)
+		# value has to decrease through k (coming from the outside)
+		if 0 < phi <= limit and -sin(psi0 + sign*phi)*sign < 0 and phi < best:
+			best = phi
+	return best
+
+# Rotation of a box by dAngle around its center against walls given as (ax, ay, bx, by, halfWidth).
+# Contacts of box corners with wall edges and of wall corners with box edges are solved in closed form,
+# returns the allowed (signed) rotation
+def boxRotationLimit(box: OrientedBox, dAngle, walls, skin=1e-4):
+	if dAngle == 0:
+		return 0
+	sign = 1 if dAngle > 0 else -1
+	limit = abs(dAngle)
+	boxCorners = box.corners()
+	rho = box.boundingRadius() # every corner moves on the same circle
+	cornerAngles = [atan2(py - box.cy, px - box.cx) for px, py in boxCorners]
+	(ux, uy), (vx, vy) = box.axes()
+	for w in _wallsInReach(box, walls, 0):
+		wall = wallBox(*w)
+		if boxesOverlap(box, wall):
+			continue
+		corners = wall.corners()
+		mx = sum(c[0] for c in corners)/4
+		my = sum(c[1] for c in corners)/4
+		# box corners (moving on circles around the box center) against the wall's edges
+		for i in range(4):
+			(ex0, ey0), (ex1, ey1) = corners[i], corners[(i + 1) % 4]
+			el = hypot(ex1 - ex0, ey1 - ey0)
+			if el == 0:
+				continue
+			tx, ty = (ex1 - ex0)/el, (ey1 - ey0)/el
+			nx, ny = ty, -tx
+			if nx*(ex0 - mx) + ny*(ey0 - my) < 0:
+				nx, ny = -nx, -ny
+			h = nx*ex0 + ny*ey0 - (nx*box.cx + ny*box.cy)
+			if abs(h) > rho:
+				continue
+			beta = atan2(ny, nx)
+			for alpha in cornerAngles:
+				phi = _angleOfContact(alpha - beta, sign, rho, h, limit)
+				if phi < limit:
+					a = alpha + sign*phi
+					cx, cy = box.cx + rho*cos(a), box.cy + rho*sin(a)
+					if 0 <= (cx - ex0)*tx + (cy - ey0)*ty <= el:
+						limit = phi
+		# wall corners against the box edges (seen from the box, the corners rotate the opposite way)
+		for qx, qy in corners:
+			rx, ry = qx - box.cx, qy - box.cy
+			q = hypot(rx, ry)
+			if q > rho:
+				continue
+			lx, ly = rx*ux + ry*uy, rx*vx + ry*vy
+			gamma = atan2(ly, lx)
+			for beta, h, other in ((0, box.hx, box.hy), (pi, box.hx, box.hy), (pi/2, box.hy, box.hx), (-pi/2, box.hy, box.hx)):
+				phi = _angleOfContact(gamma - beta, -sign, q, h, limit)
+				if phi < limit:
+					# position along the edge at the moment of contact
+					if abs(q*sin(gamma - sign*phi - beta)) <= other:
+						limit = phi
+	if limit < abs(dAngle):
+		return sign*max(0.0, limit - skin)
+	return dAngle
+
+# Moves a box by (dx, dy) after rotating it by dAngle without entering any wall.
+# With slide the motion remaining after a contact continues along the wall,
+# rotationStep rounds a blocked rotation down to whole steps (e.g. for sprites with quantized rotation)
+# returns (dx, dy, dAngle) that can be applied safely
+def solveBoxMotion(box: OrientedBox, dx, dy, dAngle, walls, slide=True, rotationStep=None, skin=0.01):
+	allowed = boxRotationLimit(box, dAngle, walls)
+	if rotationStep is not None and allowed != dAngle:
+		allowed = floor(abs(allowed)/rotationStep + 1e-9)*rotationStep*(1 if dAngle > 0 else -1)
+	dAngle = allowed
+	box = box.moved(0, 0, dAngle)
+	mx, my, normal = _clampedMotion(box, dx, dy, walls, skin)
+	if slide and normal is not None:
+		# remaining motion without its part towards the wall
+		rx, ry = dx - mx, dy - my
+		d = rx*normal[0] + ry*normal[1]
+		sx, sy, _ = _clampedMotion(box.moved(mx, my), rx - d*normal[0], ry - d*normal[1], walls, skin)
+		mx, my = mx + sx, my + sy
+	return mx, my, dAngle
+
+def _clampedMotion(box, dx, dy, walls, skin):
+	if dx == 0 and dy == 0:
+		return 0, 0, None
+	t, normal = boxTimeOfImpact(box, dx, dy, walls)
+	if normal is None:
+		return dx, dy, None
+	# stop slightly before the contact
+	f = max(0.0, t - skin/hypot(dx, dy))
+	return dx*f, dy*f, normal
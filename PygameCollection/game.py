@@ -1,28 +1,171 @@
+import bisect
+import os
 import pygame
 from abc import ABC, abstractmethod
 from enum import Enum, auto
+from time import perf_counter
+from PygameCollection.profiling import profiler
 
-# Basic implementation of a drawing queue
+# Layered drawing queue: layers are updated and drawn in ascending order, the items of a layer in the order they
+# were added. Every item gets a handle, items can be removed by their handle or by themselves in O(1).
+# Changes made while the queue is being iterated (e.g. an item removing itself in update()) take effect afterwards
 class BaseDrawingQueue:
-	def __init__(self, drawableObjects=None):
-		self.items: list = [] if drawableObjects is None else drawableObjects
+	DEFAULT_LAYER = 0
 
-	def append(self, drawableObj):
-		self.items.append(drawableObj)
+	def __init__(self, drawableObjects=None):
+		self._layers = {} # layer -> {handle: item}
+		self._order = [] # layers in ascending order
+		self._items = {} # handle -> (layer, item)
+		self._handles = {} # item -> handle
+		self._nextHandle = 0
+		self._iterating = 0
+		self._pending = [] # (added, layer, handle) changes made while iterating
+		for obj in drawableObjects or ():
+			self.append(obj)
+
+	def __len__(self):
+		return len(self._items)
+
+	def __contains__(self, drawableObj):
+		return drawableObj in self._handles
+
+	# all items in drawing order
+	@property
+	def items(self):
+		return [obj for _, obj in self._each()]
+
+	def append(self, drawableObj, layer=DEFAULT_LAYER):
+		assert drawableObj not in self._handles, "object is already part of the queue"
+		handle = self._nextHandle
+		self._nextHandle += 1
+		self._items[handle] = (layer, drawableObj)
+		self._handles[drawableObj] = handle
+		if self._iterating:
+			self._pending.append((True, layer, handle))
+		else:
+			self._add(layer, handle, drawableObj)
+		return handle
 
+	# priority is the layer of the object
 	def insert(self, drawableObj, priority):
-		self.items.insert(drawableObj, priority)
+		return self.append(drawableObj, priority)
 
-	def remove(self, drawableObj):
-		# find more efficient design
-		self.items.remove(drawableObj)
+	def extend(self, drawableObjs, layer=DEFAULT_LAYER):
+		return [self.append(obj, layer) for obj in drawableObjs]
 
-	def drawAll(self):
-		for i in self.items[::-1]:
-			i.draw()
+	# drawableObj: the object or its handle
+	def remove(self, drawableObj):
+		handle = drawableObj if isinstance(drawableObj, int) else self._handles[drawableObj]
+		layer, obj = self._items.pop(handle)
+		del self._handles[obj]
+		if self._iterating:
+			self._pending.append((False, layer, handle))
+		else:
+			del self._layers[layer][handle]
+
+	def removeAll(self, drawableObjs):
+		for obj in drawableObjs:
+			self.remove(obj)
+
+	def layerOf(self, drawableObj):
+		handle = drawableObj if isinstance(drawableObj, int) else self._handles[drawableObj]
+		return self._items[handle][0]
+
+	def _add(self, layer, handle, obj):
+		if layer not in self._layers:
+			self._layers[layer] = {}
+			bisect.insort(self._order, layer)
+		self._layers[layer][handle] = obj
+
+	# (layer, item) pairs in drawing order
+	def _each(self):
+		self._iterating += 1
+		try:
+			for layer in self._order:
+				for handle, obj in self._layers[layer].items():
+					# removed during this iteration
+					if handle in self._items:
+						yield layer, obj
+		finally:
+			self._iterating -= 1
+			if not self._iterating and self._pending:
+				self._applyPending()
+
+	def _applyPending(self):
+		pending, self._pending = self._pending, []
+		for added, layer, handle in pending:
+			if not added:
+				self._layers[layer].pop(handle, None)
+			elif handle in self._items:
+				self._add(layer, handle, self._items[handle][1])
+
+	def updateAll(self):
+		for _, i in self._each():
+			if not i.skipUpdate:
+				i.update()
+
+	def savePreviousAll(self):
+		for _, i in self._each():
+			i.savePrevious()
+
+	def drawAll(self, surface):
+		self.drawDynamic(surface, static=True)
+
+	# draws all static items onto the given surface
+	def drawStatic(self, surface):
+		for _, i in self._each():
+			if i.static and not i.skipDraw:
+				i.draw(surface)
+
+	# changes whenever a static item has to be redrawn (static items can provide a version attribute)
+	def staticVersion(self):
+		return tuple((id(i), getattr(i, "version", 0), i.skipDraw) for _, i in self._each() if i.static)
+
+	# draws all non static items (and static ones if static is True) and returns the rects they have drawn on
+	# (None if any item did not report its rects). Batched items (see GraphicalObj.blitSequence) are collected and
+	# drawn with one Surface.blits call per layer
+	def drawDynamic(self, surface, static=False):
+		rects = []
+		batch = []
+		batchLayer = None
+		for layer, i in self._each():
+			if i.skipDraw or (i.static and not static):
+				continue
+			if batch and (layer != batchLayer or not i.batched):
+				rects = self._drawBatch(surface, batch, rects)
+			if i.batched:
+				batch.extend(i.blitSequence())
+				batchLayer = layer
+				continue
+			r = i.draw()
+			if r is None:
+				rects = None
+			elif rects is not None:
+				rects.extend(r)
+		if batch:
+			rects = self._drawBatch(surface, batch, rects)
+		return rects
 
+	@staticmethod
+	def _drawBatch(surface, batch, rects):
+		drawn = surface.blits(batch, doreturn=rects is not None)
+		batch.clear()
+		if rects is not None:
+			rects.extend(drawn)
+		return rects
+
+# The game state is advanced by tick() in fixed timesteps of 1/tps seconds, drawing is only a consumer of that state.
+# A windowed game draws as many frames as maxFps allows and runs as many ticks per frame as the elapsed time requires
+# (at most maxTicksPerFrame, so the game only slows down if it can not keep up at all). Frames between two ticks
+# are interpolated (see alpha).
+# A headless game never opens a window and is driven externally (see PygameCollection.simulation)
 class Base2DGame(ABC):
-	def __init__(self, name="[PLACEHOLDER]", tps=60):
+	def __init__(self, name="[PLACEHOLDER]", tps=60, headless=False):
+		self.headless = headless
+		if headless:
+			os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+			# SIGINT/SIGTERM would otherwise only become QUIT events, which nobody polls without a window
+			os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
 		pygame.init()
 		self.name = name
 		self.windowSize = (1920, 1080)
@@ -31,6 +174,30 @@ class Base2DGame(ABC):
 		self.backgroundColor = (255, 255, 255)
 
 		self.tps = tps
+		self.dt = 1 / tps # fixed timestep
+		self.ticks = 0
+		self.screen = None
+		self.clock = None
+		self.running = False
+
+		self.maxFps = 144 # 0 --> unlimited
+		self.maxTicksPerFrame = 10
+		self.interpolate = True
+		self.alpha = 1.0 # position of the drawn frame between the previous (0) and the current tick (1)
+		self.droppedTicks = 0 # ticks which were skipped because the game could not keep up
+		self._accumulator = 0
+		self._lastFrame = None
+		self._pendingEvents = [] # events which have not been seen by a tick yet
+		self._pressedKeys = None
+		self._pressedButtons = None
+
+		# dirty rect rendering: static items are drawn once into self.background, every frame only the areas which were
+		# drawn on are restored and presented. Anything drawn in loop() has to be reported by markDirty()
+		self.dirtyRendering = False
+		self.background = None
+		self._backgroundVersion = None
+		self._lastRects = None # rects drawn in the previous frame (None = whole screen)
+		self._dirty = None # rects to present in this frame (None = whole screen)
 
 		self.drawingQueue: BaseDrawingQueue = BaseDrawingQueue()
 		self.key: Keys = None
@@ -39,92 +206,241 @@ class Base2DGame(ABC):
 		self.loop = self.loopWrapper(self.loop)
 
 	def run(self):
+		assert not self.headless, "headless games are run through a Simulation"
 		self.screen = pygame.display.set_mode(self.windowSize)
 		self.clock = pygame.time.Clock()
 		self.setup()
 		self.running = True
 		while self.running:
 			self.loop()
+		self.teardown()
 
 	def setup(self):
 		pass
 
+	# called once after the game loop has ended
+	def teardown(self):
+		pass
+
+	# simulated time in seconds (independent of the wall clock)
+	def time(self):
+		return self.ticks * self.dt
+
+	# durations are compared in whole ticks, so game logic never depends on floating point time
+	def toTicks(self, seconds):
+		return round(seconds * self.tps)
+
+	# advances the game state by exactly one timestep without drawing anything
+	def tick(self):
+		if self.interpolate and not self.headless:
+			self.drawingQueue.savePreviousAll()
+		with profiler.phase("tick"):
+			with profiler.phase("update"):
+				self.update()
+			with profiler.phase("objects"):
+				self.drawingQueue.updateAll()
+			with profiler.phase("lateUpdate"):
+				self.lateUpdate()
+		self.ticks += 1
+
+	# game logic of a single tick, can be overridden
+	def update(self):
+		pass
+
+	# game logic after all objects of the drawing queue have been updated (e.g. collision handling), can be overridden
+	def lateUpdate(self):
+		pass
+
 	@abstractmethod
 	def loop(self):
 		pass
 
 	def loopWrapper(self, runMethod):
 		def gameloop(*args, **kwargs):
-			self.__loopBegin()
-			r = runMethod(*args, **kwargs)
+			with profiler.phase("input"):
+				events = self.__loopBegin()
+			self.__runTicks()
+			# loop() runs once per frame and sees the events of this frame
+			self.__refreshInput(events)
+			with profiler.phase("draw"):
+				self.__drawObjects()
+			with profiler.phase("loop"):
+				r = runMethod(*args, **kwargs)
 			self.__loopClose()
+			profiler.endFrame()
 			return r
 		return gameloop
 
 	def __loopBegin(self):
-		self.screen.fill(self.backgroundColor)
+		if not self.dirtyRendering:
+			self.screen.fill(self.backgroundColor)
 
-		self.__handleEvents()
-		self.__drawObjects()
+		return self.__handleEvents()
 
-	#todo: change handler logic, to only traverse all events once (e.g. keys and mouse class shouldnt iterate individually)
 	def __handleEvents(self):
 		events = pygame.event.get()
-		self.key = Keys(pygame.key.get_pressed(), events)
-		self.mouse = Mouse(pygame.mouse.get_pressed(), events)
-		# events is iterated twice <- efficient solution?
-		for event in events:
-			if event.type == pygame.QUIT:
-				self.running = False
+		self._pendingEvents.extend(events)
+		self._pressedKeys = pygame.key.get_pressed()
+		self._pressedButtons = pygame.mouse.get_pressed()
+		if any(e.type == pygame.QUIT for e in events):
+			self.running = False
+		return events
+
+	# the events are only traversed once (see Events), keys and mouse are refreshed instead of recreated
+	def __refreshInput(self, events):
+		events = Events(events)
+		if self.key is None:
+			self.key = Keys(self._pressedKeys, events)
+			self.mouse = Mouse(self._pressedButtons, events)
+		else:
+			self.key.refresh(self._pressedKeys, events)
+			self.mouse.refresh(self._pressedButtons, events)
+
+	# runs the ticks which are due, events are only seen by the first one of them
+	def __runTicks(self):
+		now = perf_counter()
+		# the first frame runs a single tick
+		self._accumulator += self.dt if self._lastFrame is None else now - self._lastFrame
+		self._lastFrame = now
+		ticks = 0
+		while self._accumulator >= self.dt:
+			if ticks == self.maxTicksPerFrame:
+				# too slow to catch up, the remaining time is dropped instead of piling up
+				self.droppedTicks += int(self._accumulator / self.dt)
+				self._accumulator %= self.dt
+				break
+			self.__refreshInput(self._pendingEvents if ticks == 0 else ())
+			self.tick()
+			self._accumulator -= self.dt
+			ticks += 1
+		if ticks:
+			self._pendingEvents = []
+		profiler.count("ticks", ticks)
+		self.alpha = min(1.0, self._accumulator / self.dt) if self.interpolate else 1.0
 
 	def __drawObjects(self):
-		self.drawingQueue.drawAll()
+		if self.dirtyRendering:
+			self.__drawDirty()
+		else:
+			self.drawingQueue.drawAll(self.screen)
+
+	def __drawDirty(self):
+		version = self.drawingQueue.staticVersion()
+		if self.background is None or version != self._backgroundVersion:
+			self.background = pygame.Surface(self.windowSize).convert()
+			self.background.fill(self.backgroundColor)
+			self.drawingQueue.drawStatic(self.background)
+			self._backgroundVersion = version
+			self._lastRects = None
+		if self._lastRects is None:
+			self.screen.blit(self.background, (0, 0))
+		else:
+			for r in self._lastRects:
+				self.screen.blit(self.background, r, r)
+		rects = self.drawingQueue.drawDynamic(self.screen)
+		self._dirty = None if self._lastRects is None or rects is None else self._lastRects + rects
+		self._lastRects = rects
+
+	# reports areas which were drawn on outside of the drawing queue (only needed for dirty rect rendering)
+	def markDirty(self, *rects):
+		if self._dirty is not None:
+			self._dirty.extend(rects)
+		if self._lastRects is not None:
+			self._lastRects.extend(rects)
 
 	def __loopClose(self):
-		self.clock.tick(self.tps)
+		with profiler.phase("wait"):
+			self.clock.tick(self.maxFps)
 		#todo: remove this?
 		#self.screen.blit(pygame.transform.flip(self.screen, True, True), (0, 0))
 		#self.screen.blit(pygame.transform.rotate(self.screen, 180), (0, 0))
-		pygame.display.flip()
+		with profiler.phase("flip"):
+			if self.dirtyRendering and self._dirty is not None:
+				pygame.display.update(self._dirty)
+			else:
+				pygame.display.flip()
 
 class KeyType(Enum):
 	PYGAME = auto()
 	STRING = auto()
 
+_keyCodes = {}
+
+# pygame key code of a key name (e.g. "w" or "space"), every name is only resolved once. Key codes are returned unchanged
+def keyCode(key):
+	if isinstance(key, int):
+		return key
+	code = _keyCodes.get(key)
+	if code is None:
+		code = _keyCodes[key] = pygame.key.key_code(key)
+	return code
+
+# replaces pygame.key.get_pressed() whenever there is no window to read the keyboard from (e.g. bots, replays)
+class HeldKeys:
+	def __init__(self, keys=()):
+		self.keys = {keyCode(k) for k in keys}
+
+	def __getitem__(self, key):
+		return key in self.keys
+
+# the events of one frame, indexed by type and by key/button in a single pass
+class Events:
+	def __init__(self, pygameEvents=()):
+		self.events = pygameEvents
+		self.byType = {}
+		self.keysDown, self.keysUp = set(), set()
+		self.buttonsDown, self.buttonsUp = set(), set()
+		for e in pygameEvents:
+			self.byType.setdefault(e.type, []).append(e)
+			if e.type == pygame.KEYDOWN:
+				self.keysDown.add(e.key)
+			elif e.type == pygame.KEYUP:
+				self.keysUp.add(e.key)
+			elif e.type == pygame.MOUSEBUTTONDOWN:
+				self.buttonsDown.add(e.button)
+			elif e.type == pygame.MOUSEBUTTONUP:
+				self.buttonsUp.add(e.button)
+
+	def ofType(self, eventType):
+		return self.byType.get(eventType, ())
+
+	def __iter__(self):
+		return iter(self.events)
+
+def _asEvents(events):
+	return events if isinstance(events, Events) else Events(events)
+
 class Keys:
 	def __init__(self, pygameKeys, pygameEvents):
+		self.refresh(pygameKeys, pygameEvents)
+
+	# pygameEvents: list of pygame events or Events
+	def refresh(self, pygameKeys, pygameEvents):
 		self.pyKeys = pygameKeys
-		self.pyEvts = pygameEvents
+		self.events = _asEvents(pygameEvents)
+		self.pyEvts = self.events.events
 
 	def get(self):
 		return self.pyKeys
 
 	def heldDown(self, key, keyType: KeyType=KeyType.PYGAME):
-		assert isinstance(keyType, KeyType)
-		if keyType == KeyType.PYGAME:
-			return self.pyKeys[key]
-		elif keyType == KeyType.STRING:
-			return self.pyKeys[pygame.key.key_code(key)]
-
-	def __checkEvt(self, key, keyType, condition):
-		assert isinstance(keyType, KeyType)
-		for e in self.pyEvts:
-			if e.type == condition:
-				if e.key == (key if keyType == KeyType.PYGAME else pygame.key.key_code(key)):
-					return True
-		return False
+		return self.pyKeys[key if keyType == KeyType.PYGAME else keyCode(key)]
 
 	def keyUp(self, key, keyType: KeyType=KeyType.PYGAME):
-		return self.__checkEvt(key, keyType, pygame.KEYUP)
+		return (key if keyType == KeyType.PYGAME else keyCode(key)) in self.events.keysUp
 
 	def keyDown(self, key, keyType: KeyType=KeyType.PYGAME):
-		return self.__checkEvt(key, keyType, pygame.KEYDOWN)
+		return (key if keyType == KeyType.PYGAME else keyCode(key)) in self.events.keysDown
 
 
 class Mouse:
 	def __init__(self, pygameMouse, pygameEvents):
+		self.refresh(pygameMouse, pygameEvents)
+
+	def refresh(self, pygameMouse, pygameEvents):
 		self.pyMouse = pygameMouse
-		self.pyEvts = pygameEvents
+		self.events = _asEvents(pygameEvents)
+		self.pyEvts = self.events.events
 
 	def heldDown(self, mouseButton=None):
 		assert mouseButton in (1, 2, 3)
@@ -139,21 +455,13 @@ class Mouse:
 	def setPos(self, pos):
 		pygame.mouse.set_pos(pos)
 
-	def __checkEvt(self, mouseButton, condition):
-		assert mouseButton in (1, 2, 3)
-		for e in self.pyEvts:
-			if e.type == condition:
-				if mouseButton is not None:
-					return True if mouseButton == e.button else False
-				else:
-					return True
-		return False
-
 	def mouseDown(self, mouseButton):
-		return self.__checkEvt(mouseButton, pygame.MOUSEBUTTONDOWN)
+		assert mouseButton in (1, 2, 3)
+		return mouseButton in self.events.buttonsDown
 
 	def mouseUp(self, mouseButton):
-		return self.__checkEvt(mouseButton, pygame.MOUSEBUTTONUP)
+		assert mouseButton in (1, 2, 3)
+		return mouseButton in self.events.buttonsUp
 
 
 # A controller mutates game obj attributes (e.g. used in movement controllers to alternate position)
@@ -184,15 +492,38 @@ class ObjController(ABC):
 			self.action(self.obj, *args, **kwargs)
 
 
+# Maps keys to callbacks. Key names are resolved to key codes when binding, so dispatching a frame
+# only costs O(bound keys + events) lookups
 class GameObjControlManager:
 	def __init__(self):
-		self.controls = {}
+		self.controls = {} # key code -> callable, called every tick while the key is held down
+		self.onKeyDown = {} # key code -> callable, called once when the key is pressed
+		self.onKeyUp = {} # key code -> callable, called once when the key is released
 
 	def bindSpriteAction(self, sprite: ObjController, key, action):
-		self.controls[key] = sprite.actions[action]
+		self.controls[keyCode(key)] = sprite.actions[action]
 
 	def bindCallable(self, key, callable):
-		self.controls[key] = callable
+		self.controls[keyCode(key)] = callable
+
+	def bindKeyDown(self, key, callable):
+		self.onKeyDown[keyCode(key)] = callable
+
+	def bindKeyUp(self, key, callable):
+		self.onKeyUp[keyCode(key)] = callable
 
 	def unbindKey(self, key):
-		del self.controls[key]
\ No newline at end of file
+		code = keyCode(key)
+		for bindings in (self.controls, self.onKeyDown, self.onKeyUp):
+			bindings.pop(code, None)
+
+	def dispatch(self, keys: Keys):
+		for code, action in self.controls.items():
+			if keys.pyKeys[code]:
+				action()
+		for pressed, bindings in ((keys.events.keysDown, self.onKeyDown), (keys.events.keysUp, self.onKeyUp)):
+			if bindings:
+				for code in pressed:
+					action = bindings.get(code)
+					if action is not None:
+						action()
\ No newline at end of file
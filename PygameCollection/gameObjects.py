@@ -1,5 +1,9 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from math import pi
+from PygameCollection.assets import assets
 from PygameCollection.math import Vector2D, rad2deg
+from PygameCollection.profiling import Profiler, profiler
 import pygame
 
 class GraphicalObj(ABC):
@@ -8,19 +12,29 @@ class GraphicalObj(ABC):
 		self.screen = game.screen
 		self.skipUpdate = False
 		self.skipDraw = False
+		self.static = False # static objects are only drawn into the game's background when dirty rect rendering is used
+		self.batched = False # batched objects are drawn by the drawing queue through blitSequence() instead of draw()
 		self.draw = self.__drawWrapper(self.draw)
 
+	# returns the list of rects which were drawn on (None = unknown, e.g. the whole screen)
 	@abstractmethod
 	def draw(self):
 		pass
 
+	# (surface, dest) pairs for Surface.blits, the drawing queue collects them of all batched objects of a layer
+	def blitSequence(self):
+		return []
+
 	def update(self):
 		pass
 
+	# called before every tick while frames are interpolated (see Base2DGame.alpha), keeps the state draw() starts from
+	def savePrevious(self):
+		pass
+
+	# updating is done separately by the game's tick (see Base2DGame.tick), drawing never mutates the game state
 	def __drawWrapper(self, drawMethod):
 		def __inner(*args, **kwargs):
-			if not self.skipUpdate:
-				self.update()
 			if not self.skipDraw:
 				r = drawMethod(*args, **kwargs)
 				return r
@@ -35,7 +49,7 @@ class Sprite2D(pygame.sprite.Sprite, GraphicalObj, ABC):
 		self.img = image
 		self.rect = image.get_rect()
 		self.pos = position
-		self.staticMask = pygame.mask.from_surface(self.img)
+		self.staticMask = assets.mask(self.img)
 		self.mask = None
 
 		self._drawOrg = self.draw # In case draw method is overridden
@@ -53,18 +67,79 @@ class Sprite2D(pygame.sprite.Sprite, GraphicalObj, ABC):
 			other.mask = other.getMask()
 		return pygame.sprite.collide_mask(self, other)
 
+# Shared LRU cache of rotated images and their masks. Rotations are quantized into 'steps' per full turn,
+# so every sprite using the same image shares the same surfaces and masks
+class RotationCache:
+	def __init__(self, maxSize=2048, steps=360):
+		self.maxSize = maxSize
+		self.steps = steps
+		self.items = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self.items)
+
+	def quantize(self, rot, steps=None):
+		steps = self.steps if steps is None else steps
+		return round((rot % (2*pi)) / (2*pi) * steps) % steps
+
+	# returns (rotatedImage, mask)
+	def get(self, img, rot, steps=None):
+		steps = self.steps if steps is None else steps
+		key = (img, steps, self.quantize(rot, steps))
+		entry = self.items.get(key)
+		if entry is not None:
+			self.hits += 1
+			self.items.move_to_end(key)
+			return entry
+		self.misses += 1
+		profiler.count("rotationCache.misses")
+		with profiler.phase("maskBuild"):
+			entry = self._render(img, key[2]*2*pi/steps)
+		self.items[key] = entry
+		if len(self.items) > self.maxSize:
+			self.items.popitem(last=False)
+		return entry
+
+	# renders every rotation step of an image in advance (e.g. when loading a game)
+	def warmUp(self, img, steps=None):
+		steps = self.steps if steps is None else steps
+		for i in range(steps):
+			self.get(img, i*2*pi/steps, steps)
+
+	def clear(self):
+		self.items.clear()
+
+	# the mask is built before the surface is RLE encoded (reading pixels of an RLE surface decodes it again).
+	# Rotated images are mostly transparent corners, which RLE blits skip
+	@staticmethod
+	def _render(img, rot):
+		rotated = img.copy() if rot == 0 else pygame.transform.rotate(img, rad2deg(-rot))
+		mask = pygame.mask.from_surface(rotated)
+		if pygame.display.get_surface() is not None:
+			rotated = rotated.convert_alpha()
+		rotated.set_alpha(255, pygame.RLEACCEL)
+		return rotated, mask
+
+rotationCache = RotationCache()
+
 # Base Class to represent moving objects
 class MovableSprite(Sprite2D, ABC):
 	def __init__(self, game, image, position: Vector2D, velocity=0, direction=Vector2D(1, 0), rotation=0, rotationSpeed=0, *args, **kwargs):
 		super().__init__(game, image, position, *args, **kwargs)
 		assert isinstance(position, Vector2D) and isinstance(direction, Vector2D)
-		self.imgRotated = self.img
 		self.v = velocity
 		self.dir = direction
 		self.rot = rotation
 		self.rotSpeed = rotationSpeed
 		self.rotOffset = None
+		self.rotSteps = None # resolution of the rotated images (None = rotationCache default)
+		self.imgRotated, self.rotMask = rotationCache.get(self.img, self.rot)
 		self.staticMask = self.getMask()
+		self.prevPos = None
+		self.prevRot = None
+		self.batched = True
 
 	# set rotation offset (difference between standard vec(1, 0) and sprite direction)
 	def setRotationOffset(self, rotOffset):
@@ -72,54 +147,122 @@ class MovableSprite(Sprite2D, ABC):
 		self.dir = Vector2D.fromRadiant(rotOffset)
 
 	def getMask(self):
-		return pygame.mask.from_surface(self.imgRotated)
+		return self.rotMask
 
 	# faster than getMask, but only returns basic mask without rotation, etc.
 	def getStaticMask(self):
 		return self.staticMask
 
 	def update(self):
-		self.rect.center = self.pos.toTuple()
-		if self.rot != 0:
-			self.imgRotated = pygame.transform.rotate(self.img, rad2deg(-self.rot))
+		with profiler.phase("sprite"):
+			self.rect.center = self.pos.toTuple()
+			self.imgRotated, self.rotMask = rotationCache.get(self.img, self.rot, self.rotSteps)
 			self.rect = self.imgRotated.get_rect(center=self.rect.center)
 
+	def savePrevious(self):
+		self.prevPos = self.pos
+		self.prevRot = self.rot
+
+	# (pos, rot, rotated image, rect) drawn between the previous and the current tick,
+	# rotations are interpolated along the shorter direction
+	def interpolated(self):
+		alpha = self.game.alpha
+		if alpha >= 1 or self.prevPos is None or (self.prevPos == self.pos and self.prevRot == self.rot):
+			return self.pos, self.rot, self.imgRotated, self.rect
+		pos = self.prevPos + (self.pos - self.prevPos)*alpha
+		rot = self.prevRot + ((self.rot - self.prevRot + pi) % (2*pi) - pi)*alpha
+		img, _ = rotationCache.get(self.img, rot, self.rotSteps)
+		return pos, rot, img, img.get_rect(center=pos.toTuple())
+
+	def blitSequence(self):
+		_, _, img, rect = self.interpolated()
+		return [(img, rect)]
+
 	def draw(self):
-		if self.rot != 0:
-			self.screen.blit(self.imgRotated, self.rect)
-		else:
-			self.screen.blit(self.img, self.rect)
+		return self.screen.blits(self.blitSequence(), doreturn=True)
 
+# the debug overlays are drawn at the interpolated pose of the sprite and add their rects to the drawn ones (dirty rendering)
 def showRect(mSprite: MovableSprite, width=4, debugDirLineLen=150):
 	def _drawDebug(drawMethod):
 		def __inner(*args, **kwargs):
 			r = drawMethod(*args, **kwargs)
-			pygame.draw.rect(mSprite.screen, (255, 0, 0), mSprite.rect, width)
+			if r is None:
+				return r
+			_, _, _, rect = mSprite.interpolated()
 			#pygame.draw.line(mSprite.screen, (255, 0, 0), mSprite.pos.toTuple(), (mSprite.pos + mSprite.dir * debugDirLineLen).toTuple(), 10) # see showVector()
-			return r
+			return r + [pygame.draw.rect(mSprite.screen, (255, 0, 0), rect, width)]
 		return __inner
 	mSprite.draw = _drawDebug(mSprite.draw)
+	mSprite.batched = False
 
 def hideRect(mSprite: MovableSprite):
 	mSprite.draw = mSprite._drawOrg
+	mSprite.batched = True
 
 def showMask(mSprite: MovableSprite, width=4):
 	def _drawDebug(drawMethod):
 		def __inner(*args, **kwargs):
 			r = drawMethod(*args, **kwargs)
-			points = [(Vector2D(*p)+ mSprite.getMaskOffset()).toTuple() for p in mSprite.getMask().outline()]
-			pygame.draw.lines(mSprite.screen, (255, 0, 0), True, points, width)
-			return r
+			if r is None:
+				return r
+			_, rot, _, rect = mSprite.interpolated()
+			_, mask = rotationCache.get(mSprite.img, rot, mSprite.rotSteps)
+			points = [(x + rect.x, y + rect.y) for x, y in mask.outline()]
+			if len(points) < 2:
+				return r
+			return r + [pygame.draw.lines(mSprite.screen, (255, 0, 0), True, points, width)]
 		return __inner
 	mSprite.draw = _drawDebug(mSprite.draw)
+	mSprite.batched = False
 
 def showCenter(mSprite: MovableSprite, radius=5):
 	def _drawDebug(drawMethod):
 		def __inner(*args, **kwargs):
 			r = drawMethod(*args, **kwargs)
-			pygame.draw.circle(mSprite.screen, (255, 0, 0), mSprite.rect.center, radius)
-			return r
+			if r is None:
+				return r
+			pos, _, _, _ = mSprite.interpolated()
+			return r + [pygame.draw.circle(mSprite.screen, (255, 0, 0), pos.toTuple(), radius)]
 
 		return __inner
 
-	mSprite.draw = _drawDebug(mSprite.draw)
\ No newline at end of file
+	mSprite.draw = _drawDebug(mSprite.draw)
+	mSprite.batched = False
+
+# Shows the rolling statistics of a Profiler (slowest phases first) in milliseconds,
+# the text is only rendered again every refreshInterval frames
+class ProfilerOverlay(GraphicalObj):
+	def __init__(self, game, profiler: Profiler=profiler, pos=(10, 10), lines=16, refreshInterval=30, fontSize=16):
+		super().__init__(game)
+		self.profiler = profiler
+		self.pos = pos
+		self.lines = lines
+		self.refreshInterval = refreshInterval
+		self.font = pygame.font.SysFont("couriernew,dejavusansmono,monospace", fontSize)
+		self._surface = None
+		self._renderedAt = None
+
+	def draw(self):
+		if self._surface is None or self.profiler.frames - self._renderedAt >= self.refreshInterval:
+			self._render()
+		return [self.screen.blit(self._surface, self.pos)]
+
+	def _render(self):
+		stats = self.profiler.stats()
+		rows = sorted(stats["phases"].items(), key=lambda i: -i[1]["p50"])[:self.lines]
+		blocks = stats["counters"].get("allocatedBlocks")
+		text = [f"{'phase':<32}{'p50':>8}{'p95':>8}{'p99':>8}"]
+		text += [f"{name[-32:]:<32}{s['p50']:>8.3f}{s['p95']:>8.3f}{s['p99']:>8.3f}" for name, s in rows]
+		if blocks is not None:
+			text.append(f"{'allocated blocks/frame':<32}{blocks['p50']:>8.0f}{blocks['p95']:>8.0f}{blocks['p99']:>8.0f}")
+		if not self.profiler.enabled:
+			text.append("(profiler disabled)")
+		rendered = [self.font.render(t, True, (255, 255, 255)) for t in text]
+		self._surface = pygame.Surface((max(r.get_width() for r in rendered) + 10, sum(r.get_height() for r in rendered) + 10), pygame.SRCALPHA)
+		self._surface.fill((0, 0, 0, 170))
+		y = 5
+		for r in rendered:
+			self._surface.blit(r, (5, y))
+			y += r.get_height()
+		self._renderedAt = self.profiler.frames
+
@@ -13,20 +13,35 @@ class Point2D:
 	def distance(cls, x1, y1, x2, y2):
 		return math.sqrt((x2 - x1)**2+(y2-y1)**2)
 
+	# shortest distance between point (x, y) and the line segment (x1, y1) -> (x2, y2)
+	@classmethod
+	def segmentDistance(cls, x, y, x1, y1, x2, y2):
+		dx, dy = x2 - x1, y2 - y1
+		l = dx*dx + dy*dy
+		t = 0 if l == 0 else max(0, min(1, ((x - x1)*dx + (y - y1)*dy) / l))
+		return math.hypot(x - (x1 + t*dx), y - (y1 + t*dy))
+
+# Plain scalar vector, components are stored as given (no NumPy array per instance).
+# For math on many vectors at once use Vector2DArray
 class Vector2D:
-	# np.double = float64
-	def __init__(self, x, y, dtype=np.double):
-		self.dtype = dtype
-		self.x, self.y = x, y
-		self.vec = np.array((x, y), dtype=self.dtype)
+	__slots__ = ("x", "y")
+
+	# dtype is only kept for compatibility, components are python numbers
+	def __init__(self, x, y, dtype=None):
+		self.x = x
+		self.y = y
+
+	@property
+	def vec(self):
+		return np.array((self.x, self.y), dtype=np.double)
 
 	def magnitude(self):
-		return np.sqrt(self.vec.dot(self.vec))
+		return math.hypot(self.x, self.y)
 
 	def enclosedAngle(self, v2):
 		if v2.x == 1 and v2.y == 0:
 			return acos(self.x/self.magnitude())
-		return acos((self*v2)/(self.magnitude()*v2.magnitude()))
+		return acos((self.x*v2.x + self.y*v2.y)/(self.magnitude()*v2.magnitude()))
 
 	# self is projected on to v2
 	def projectionLength(self, v2):
@@ -53,12 +68,10 @@ class Vector2D:
 		m = self.magnitude()
 		self.x = self.x / m
 		self.y = self.y / m
-		self.vec = np.array((self.x, self.y), dtype=self.dtype)
 
 	def toCounter(self):
 		self.x = -self.x
 		self.y = -self.y
-		self.vec = np.array((self.x, self.y), dtype=self.dtype)
 
 	#
 	# def makeCollinearTo(self, v2):
@@ -67,8 +80,15 @@ class Vector2D:
 	def __str__(self):
 		return f"Vector2D({self.x} {self.y})"
 
+	def __repr__(self):
+		return str(self)
+
 	def __len__(self):
-		return len(self.vec)
+		return 2
+
+	def __iter__(self):
+		yield self.x
+		yield self.y
 
 	def __add__(self, other):
 		if isinstance(other, Vector2D):
@@ -84,7 +104,7 @@ class Vector2D:
 
 	def __mul__(self, other):
 		if isinstance(other, Vector2D):
-			return self.vec.dot(other.vec)
+			return self.x*other.x + self.y*other.y
 		elif isinstance(other, (int, float)):
 			return Vector2D(self.x*other, self.y*other)
 		else:
@@ -106,13 +126,13 @@ class Vector2D:
 		return hash(self.toTuple())
 
 	@classmethod
-	def fromIterable(cls, iterable, dtype=np.double):
+	def fromIterable(cls, iterable, dtype=None):
 		assert len(iterable) == 2
-		return Vector2D(*iterable, dtype=dtype)
+		return Vector2D(*iterable)
 
 	@classmethod
-	def fromRadiant(cls, radiant, dtype=np.double):
-		return Vector2D(cos(radiant), sin(radiant), dtype=dtype)
+	def fromRadiant(cls, radiant, dtype=None):
+		return Vector2D(cos(radiant), sin(radiant))
 
 	@classmethod
 	def copy(cls, v):
@@ -120,12 +140,12 @@ class Vector2D:
 
 	@classmethod
 	def asUnitVector(cls, v):
-		newVec = Vector2D.copy(v)
-		return newVec / newVec.magnitude()
+		m = v.magnitude()
+		return Vector2D(v.x / m, v.y / m)
 
 	@classmethod
 	def asCounterVector(cls, v):
-		return Vector2D(v.x*-1, v.y*-1)
+		return Vector2D(-v.x, -v.y)
 
 	@classmethod
 	def getNormVec(cls, v):
@@ -165,7 +185,97 @@ class Vector2D:
 	@classmethod
 	def fromMatrixVecMul(cls, v1, matrix):
 		assert isinstance(matrix, Matrix2D)
-		return Vector2D.fromIterable(v1.vec.dot(matrix.matx))
+		m = matrix.matx
+		return Vector2D(float(v1.x*m[0, 0] + v1.y*m[1, 0]), float(v1.x*m[0, 1] + v1.y*m[1, 1]))
+
+
+# Many vectors stored as one (n, 2) NumPy array, operations are applied to all of them at once
+class Vector2DArray:
+	__slots__ = ("arr",)
+
+	def __init__(self, arr):
+		self.arr = np.asarray(arr, dtype=np.double).reshape(-1, 2)
+
+	@property
+	def x(self):
+		return self.arr[:, 0]
+
+	@property
+	def y(self):
+		return self.arr[:, 1]
+
+	def __len__(self):
+		return len(self.arr)
+
+	def __getitem__(self, i):
+		return Vector2D(*self.arr[i].tolist())
+
+	def __iter__(self):
+		for x, y in self.arr.tolist():
+			yield Vector2D(x, y)
+
+	def magnitude(self):
+		return np.hypot(self.arr[:, 0], self.arr[:, 1])
+
+	def dot(self, other):
+		return np.sum(self.arr*Vector2DArray._asArray(other), axis=1)
+
+	def toRadiant(self):
+		return np.arctan2(self.arr[:, 1], self.arr[:, 0]) % (2*pi)
+
+	def toUnitVec(self):
+		self.arr /= np.maximum(self.magnitude(), 1e-12)[:, None]
+
+	def toCounter(self):
+		np.negative(self.arr, out=self.arr)
+
+	def toList(self):
+		return list(self)
+
+	def __add__(self, other):
+		return Vector2DArray(self.arr + Vector2DArray._asArray(other))
+
+	def __sub__(self, other):
+		return Vector2DArray(self.arr - Vector2DArray._asArray(other))
+
+	def __mul__(self, other):
+		if isinstance(other, (Vector2DArray, Vector2D)):
+			return self.dot(other)
+		other = np.asarray(other, dtype=np.double)
+		return Vector2DArray(self.arr * (other[:, None] if other.ndim == 1 else other))
+
+	def __truediv__(self, other):
+		other = np.asarray(other, dtype=np.double)
+		return Vector2DArray(self.arr / (other[:, None] if other.ndim == 1 else other))
+
+	@staticmethod
+	def _asArray(other):
+		if isinstance(other, Vector2DArray):
+			return other.arr
+		if isinstance(other, Vector2D):
+			return np.array((other.x, other.y), dtype=np.double)
+		return np.asarray(other, dtype=np.double)
+
+	@classmethod
+	def fromVectors(cls, vectors):
+		return Vector2DArray([(v.x, v.y) for v in vectors])
+
+	@classmethod
+	def fromRadiant(cls, radiants):
+		radiants = np.asarray(radiants, dtype=np.double)
+		return Vector2DArray(np.stack((np.cos(radiants), np.sin(radiants)), axis=1))
+
+	# every vector of v1 is projected on to the matching vector (or the single vector) of v2
+	@classmethod
+	def fromProjection(cls, v1, v2):
+		b = Vector2DArray._asArray(v2).reshape(-1, 2)
+		bSq = np.sum(b*b, axis=1)
+		return Vector2DArray(b * (np.sum(v1.arr*b, axis=1)/bSq)[:, None])
+
+	# same as Vector2D.fromSymReflection for every vector
+	@classmethod
+	def fromSymReflection(cls, v1, v2):
+		return Vector2DArray(2*Vector2DArray.fromProjection(v1, v2).arr - v1.arr)
 
 
 # todo: implement?
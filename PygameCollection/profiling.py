@@ -0,0 +1,152 @@
+import json
+import sys
+from collections import deque
+from functools import wraps
+from time import perf_counter
+import numpy as np
+
+class _NullPhase:
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase:
+	__slots__ = ("profiler", "name", "start")
+
+	def __init__(self, profiler, name):
+		self.profiler = profiler
+		self.name = name
+
+	def __enter__(self):
+		stack = self.profiler._stack
+		# nested phases are named by their path, e.g. "tick/objects/sprite"
+		if stack:
+			self.name = f"{stack[-1]}/{self.name}"
+		stack.append(self.name)
+		self.start = perf_counter()
+		return self
+
+	def __exit__(self, *args):
+		end = perf_counter()
+		p = self.profiler
+		p._stack.pop()
+		p._frameTimes[self.name] = p._frameTimes.get(self.name, 0) + end - self.start
+		if p.tracing and len(p.traceEvents) < p.maxTraceEvents:
+			p.traceEvents.append((self.name, self.start, end))
+		return False
+
+# Named, nestable timers and counters which are collected per frame (or tick) into rolling buffers of the last
+# 'window' frames. While disabled, phase() returns a shared no-op context and count() returns immediately
+class Profiler:
+	def __init__(self, enabled=False, window=600):
+		self._enabled = enabled
+		self.window = window
+		self.tracing = False # records every phase for toChromeTrace
+		self.maxTraceEvents = 200000
+		self.reset()
+
+	def reset(self):
+		self.frames = 0
+		self.phases = {} # name -> deque of seconds per frame
+		self.counters = {} # name -> deque of counts per frame
+		self.traceEvents = []
+		self._stack = []
+		self._frameTimes = {}
+		self._frameCounts = {}
+		self._discardFrame = False
+		self._origin = perf_counter()
+		self._blocks = sys.getallocatedblocks()
+
+	@property
+	def enabled(self):
+		return self._enabled
+
+	# a frame during which profiling is switched on is incomplete and gets discarded
+	@enabled.setter
+	def enabled(self, enabled):
+		if enabled and not self._enabled:
+			self._discardFrame = True
+		self._enabled = enabled
+
+	def phase(self, name):
+		if not self._enabled:
+			return _NULL_PHASE
+		return _Phase(self, name)
+
+	def count(self, name, amount=1):
+		if self._enabled:
+			self._frameCounts[name] = self._frameCounts.get(name, 0) + amount
+
+	# decorator, times every call of the function as a phase
+	def timed(self, name):
+		def decorator(function):
+			@wraps(function)
+			def __inner(*args, **kwargs):
+				if not self._enabled:
+					return function(*args, **kwargs)
+				with _Phase(self, name):
+					return function(*args, **kwargs)
+			return __inner
+		return decorator
+
+	# closes the current frame: its phase times and counters are moved into the rolling buffers,
+	# 'allocatedBlocks' counts the net change of allocated memory blocks during the frame
+	def endFrame(self):
+		if not self._enabled:
+			return
+		blocks = sys.getallocatedblocks()
+		self._frameCounts["allocatedBlocks"] = blocks - self._blocks
+		self._blocks = blocks
+		if self._discardFrame:
+			self._frameTimes = {}
+			self._frameCounts = {}
+			self._discardFrame = False
+			return
+		for values, buffers in ((self._frameTimes, self.phases), (self._frameCounts, self.counters)):
+			for name, v in values.items():
+				b = buffers.get(name)
+				if b is None:
+					b = buffers[name] = deque(maxlen=self.window)
+				b.append(v)
+		self._frameTimes = {}
+		self._frameCounts = {}
+		self.frames += 1
+
+	# phase times in milliseconds (sum of all calls within a frame), only frames in which the phase ran are counted
+	def stats(self):
+		return {
+			"frames": self.frames,
+			"phases": {name: _summary(b, 1000) for name, b in self.phases.items()},
+			"counters": {name: _summary(b, 1) for name, b in self.counters.items()},
+		}
+
+	def toJson(self, path=None):
+		data = json.dumps(self.stats(), indent=2)
+		if path is not None:
+			with open(path, "w", encoding="utf8") as f:
+				f.write(data)
+		return data
+
+	# trace event format, can be opened in chrome://tracing or https://ui.perfetto.dev (needs tracing enabled)
+	def toChromeTrace(self, path=None):
+		events = [
+			{"name": name.rsplit("/", 1)[-1], "cat": name, "ph": "X", "pid": 0, "tid": 0,
+			 "ts": (start - self._origin) * 1e6, "dur": (end - start) * 1e6}
+			for name, start, end in self.traceEvents
+		]
+		data = json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+		if path is not None:
+			with open(path, "w", encoding="utf8") as f:
+				f.write(data)
+		return data
+
+def _summary(values, scale):
+	a = np.fromiter(values, dtype=np.double, count=len(values)) * scale
+	p50, p95, p99 = np.percentile(a, (50, 95, 99)) if len(a) else (0, 0, 0)
+	return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(a.mean()) if len(a) else 0, "max": float(a.max()) if len(a) else 0, "samples": len(a)}
+
+profiler = Profiler()
@@ -0,0 +1,37 @@
+from timeit import default_timer
+from PygameCollection.game import Base2DGame, HeldKeys, Events, Keys, Mouse
+from PygameCollection.profiling import profiler
+
+# Steps a headless game at its fixed timestep as fast as possible (no window, no drawing, no frame limiter)
+class Simulation:
+	def __init__(self, game: Base2DGame):
+		assert game.headless, "game must be created with headless=True"
+		self.game = game
+		self.game.setup()
+		self.game.running = True
+		self.keys = Keys(HeldKeys(), Events())
+		self.mouse = Mouse((0, 0, 0), Events())
+
+	# heldKeys: pygame key codes or key names which are held down during this tick
+	def step(self, heldKeys=()):
+		self.keys.refresh(HeldKeys(heldKeys), self.keys.events)
+		self.game.key = self.keys
+		self.game.mouse = self.mouse
+		self.game.tick()
+		profiler.endFrame()
+
+	# inputs: None, an iterable of held keys per tick or a callable(tick) returning the held keys of the given tick
+	def run(self, ticks, inputs=None):
+		start = default_timer()
+		if callable(inputs):
+			for _ in range(ticks):
+				if not self.game.running:
+					break
+				self.step(inputs(self.game.ticks))
+		else:
+			inputs = iter(() if inputs is None else inputs)
+			for _ in range(ticks):
+				if not self.game.running:
+					break
+				self.step(next(inputs, ()))
+		return default_timer() - start
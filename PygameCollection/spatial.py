@@ -0,0 +1,214 @@
+from math import floor, inf
+import numpy as np
+from PygameCollection.math import Point2D
+
+# Uniform grid over line segments (broadphase), any hashable object can be stored as item.
+# Each segment is registered in every cell its (padded) extent touches
+class SegmentGrid:
+	def __init__(self, cellSize=64):
+		assert cellSize > 0
+		self.cellSize = cellSize
+		self.cells: dict = {}
+		self.segments: dict = {}
+		self._itemCells: dict = {}
+		self._bounds = None
+
+	def __len__(self):
+		return len(self.segments)
+
+	def __contains__(self, item):
+		return item in self.segments
+
+	def clear(self):
+		self.cells.clear()
+		self.segments.clear()
+		self._itemCells.clear()
+		self._bounds = None
+
+	def insert(self, item, start, end, padding=0):
+		if item in self.segments:
+			self.remove(item)
+		self.segments[item] = (*start, *end)
+		cells = self._coveredCells(*start, *end, padding)
+		self._itemCells[item] = cells
+		self._bounds = None
+		for c in cells:
+			self.cells.setdefault(c, set()).add(item)
+
+	def remove(self, item):
+		del self.segments[item]
+		self._bounds = None
+		for c in self._itemCells.pop(item):
+			bucket = self.cells[c]
+			bucket.discard(item)
+			if not bucket:
+				del self.cells[c]
+
+	# compact representation of the cells (e.g. for storing them on disk), items are referenced by their index in items:
+	# cell coordinates (k, 2), offsets (k+1) and item indices, the items of cell i are indices[offsets[i]:offsets[i+1]]
+	def toArrays(self, items):
+		indexOf = {item: i for i, item in enumerate(items)}
+		keys = sorted(self.cells)
+		offsets = [0]
+		indices = []
+		for c in keys:
+			indices.extend(sorted(indexOf[i] for i in self.cells[c]))
+			offsets.append(len(indices))
+		return np.array(keys, dtype=np.int32).reshape(-1, 2), np.array(offsets, dtype=np.int32), np.array(indices, dtype=np.int32)
+
+	# inverse of toArrays, segments are the (x1, y1, x2, y2) of each item
+	@classmethod
+	def fromArrays(cls, cellSize, items, segments, keys, offsets, indices):
+		grid = cls(cellSize)
+		for item, segment in zip(items, segments):
+			grid.segments[item] = tuple(segment)
+			grid._itemCells[item] = []
+		offsets = offsets.tolist()
+		indices = indices.tolist()
+		for i, c in enumerate(map(tuple, keys.tolist())):
+			bucket = {items[j] for j in indices[offsets[i]:offsets[i+1]]}
+			grid.cells[c] = bucket
+			for item in bucket:
+				grid._itemCells[item].append(c)
+		return grid
+
+	def cellOf(self, x, y):
+		return floor(x / self.cellSize), floor(y / self.cellSize)
+
+	# all items registered in cells overlapping the rect (may contain items which do not touch the rect itself)
+	def queryRect(self, x1, y1, x2, y2):
+		cx1, cy1 = self.cellOf(min(x1, x2), min(y1, y2))
+		cx2, cy2 = self.cellOf(max(x1, x2), max(y1, y2))
+		found = set()
+		for cx in range(cx1, cx2 + 1):
+			for cy in range(cy1, cy2 + 1):
+				bucket = self.cells.get((cx, cy))
+				if bucket:
+					found |= bucket
+		return found
+
+	# all items with a distance of at most radius to (x, y)
+	def queryRadius(self, x, y, radius):
+		return {i for i in self.queryRect(x - radius, y - radius, x + radius, y + radius) if self.distance(i, x, y) <= radius}
+
+	def distance(self, item, x, y):
+		return Point2D.segmentDistance(x, y, *self.segments[item])
+
+	# returns (item, distance) of the closest segment or (None, inf) if there is none within maxDistance
+	# rings of cells around (x, y) are searched until no closer segment can be found
+	def nearest(self, x, y, maxDistance=inf):
+		if not self.segments:
+			return None, inf
+		cx, cy = self.cellOf(x, y)
+		best, bestDistance = None, inf
+		visited = set()
+		ring = 0
+		maxRing = self._maxRing(cx, cy)
+		while ring <= maxRing:
+			# every cell outside of the current ring is at least ring * cellSize away
+			if (ring - 1) * self.cellSize > min(bestDistance, maxDistance):
+				break
+			for c in self._ringCells(cx, cy, ring):
+				for i in self.cells.get(c, ()):
+					if i in visited:
+						continue
+					visited.add(i)
+					d = self.distance(i, x, y)
+					if d < bestDistance:
+						best, bestDistance = i, d
+			ring += 1
+		if bestDistance > maxDistance:
+			return None, inf
+		return best, bestDistance
+
+	def _maxRing(self, cx, cy):
+		if self._bounds is None:
+			xs = [c[0] for c in self.cells]
+			ys = [c[1] for c in self.cells]
+			self._bounds = (min(xs), min(ys), max(xs), max(ys))
+		x1, y1, x2, y2 = self._bounds
+		return max(abs(cx - x1), abs(cx - x2), abs(cy - y1), abs(cy - y2))
+
+	@staticmethod
+	def _ringCells(cx, cy, ring):
+		if ring == 0:
+			yield cx, cy
+			return
+		for x in range(cx - ring, cx + ring + 1):
+			yield x, cy - ring
+			yield x, cy + ring
+		for y in range(cy - ring + 1, cy + ring):
+			yield cx - ring, y
+			yield cx + ring, y
+
+	# walks the rows of the grid and clips the segment to each row to find the touched columns
+	def _coveredCells(self, x1, y1, x2, y2, padding):
+		cells = []
+		cy1 = floor((min(y1, y2) - padding) / self.cellSize)
+		cy2 = floor((max(y1, y2) + padding) / self.cellSize)
+		for cy in range(cy1, cy2 + 1):
+			top, bottom = cy * self.cellSize - padding, (cy + 1) * self.cellSize + padding
+			if y1 == y2:
+				xa, xb = x1, x2
+			else:
+				ta = max(0, min(1, (top - y1) / (y2 - y1)))
+				tb = max(0, min(1, (bottom - y1) / (y2 - y1)))
+				xa, xb = x1 + ta*(x2 - x1), x1 + tb*(x2 - x1)
+			cx1 = floor((min(xa, xb) - padding) / self.cellSize)
+			cx2 = floor((max(xa, xb) + padding) / self.cellSize)
+			cells.extend((cx, cy) for cx in range(cx1, cx2 + 1))
+		return cells
+
+# Uniform grid over axis aligned boxes (x1, y1, x2, y2) for many moving objects (broadphase).
+# The grid is rebuilt from arrays with build() (e.g. once per tick), each box is binned into every cell it touches
+class BoxGrid:
+	KEY_SPAN = 2**31 # cell keys are cx*KEY_SPAN + cy
+
+	def __init__(self, cellSize=64):
+		assert cellSize > 0
+		self.cellSize = cellSize
+		self.keys = np.empty(0, dtype=np.int64) # sorted cell keys
+		self.items = np.empty(0, dtype=np.int64) # index of the box of each key
+		self.size = 0
+
+	def __len__(self):
+		return self.size
+
+	def build(self, boxes):
+		items, keys = self._cells(boxes)
+		self.size = len(boxes)
+		order = np.argsort(keys, kind="stable")
+		self.keys = keys[order]
+		self.items = items[order]
+
+	# unique (query index, item index) pairs of boxes which share at least one cell
+	def query(self, boxes):
+		queries, keys = self._cells(boxes)
+		lo = np.searchsorted(self.keys, keys, side="left")
+		counts = np.searchsorted(self.keys, keys, side="right") - lo
+		total = int(counts.sum())
+		if total == 0:
+			return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+		starts = np.cumsum(counts) - counts
+		positions = np.repeat(lo - starts, counts) + np.arange(total)
+		# sorting and dropping repeats is a lot faster than np.unique (hash based for integers)
+		pairs = np.sort(np.repeat(queries, counts) * self.size + self.items[positions])
+		first = np.ones(len(pairs), dtype=bool)
+		first[1:] = pairs[1:] != pairs[:-1]
+		pairs = pairs[first]
+		return pairs // self.size, pairs % self.size
+
+	# (box index, cell key) of every cell touched by the boxes
+	def _cells(self, boxes):
+		boxes = np.asarray(boxes, dtype=np.double).reshape(-1, 4)
+		c = np.floor(boxes / self.cellSize).astype(np.int64)
+		cx1, cy1 = np.minimum(c[:, 0], c[:, 2]), np.minimum(c[:, 1], c[:, 3])
+		w = np.abs(c[:, 2] - c[:, 0]) + 1
+		counts = w * (np.abs(c[:, 3] - c[:, 1]) + 1)
+		items = np.repeat(np.arange(len(boxes)), counts)
+		k = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+		return items, (cx1[items] + k % w[items]) * BoxGrid.KEY_SPAN + cy1[items] + k // w[items]
+
+# True for every pair of boxes (x1, y1, x2, y2) which overlap (touching edges count)
+def boxesIntersect(a, b):
+	return (a[:, 0] <= b[:, 2]) & (b[:, 0] <= a[:, 2]) & (a[:, 1] <= b[:, 3]) & (b[:, 1] <= a[:, 3])
@@ -3,7 +3,6 @@ import pygame, os
 from timeit import default_timer
 from math import pi
 from PygameCollection.math import Vector2D, Matrix2D
-from PygameCollection.gameObjects import MovableSprite
 
 def secondsToFormat(s):
     t = {"h":3600, "m":60, "s":1}
@@ -16,14 +15,32 @@ def secondsToFormat(s):
 def factoredScaling(Surface, factor):
     return pygame.transform.scale(Surface, (Surface.get_width() * factor, Surface.get_height() * factor))
 
+# converting requires a display mode, headless games keep the image format as loaded
+def loadConvImg(path, preserveAlpha=True):
+    img = pygame.image.load(path)
+    if pygame.display.get_surface() is None:
+        return img
+    return img.convert_alpha() if preserveAlpha else img.convert()
+
 def loadConvFacScaledImg(pathTuple, scaleFactor=1, preserveAlpha=True):
-    img = pygame.image.load(os.path.join(*pathTuple)).convert_alpha() if preserveAlpha else pygame.image.load(os.path.join(*pathTuple)).convert()
+    img = loadConvImg(os.path.join(*pathTuple), preserveAlpha)
     return img if scaleFactor == 1 else  factoredScaling(img, scaleFactor)
 
 def loadConvScaledImg(pathTuple, newDimensions=None, preserveAlpha=True):
-    img = pygame.image.load(os.path.join(*pathTuple)).convert_alpha() if preserveAlpha else pygame.image.load(os.path.join(*pathTuple)).convert()
+    img = loadConvImg(os.path.join(*pathTuple), preserveAlpha)
     return img if newDimensions == None else pygame.transform.scale(img, newDimensions)
 
+# masks as (height, width) bool arrays and back, e.g. to store precomputed masks on disk
+def maskToArray(mask):
+    surface = mask.to_surface(setcolor=(255, 255, 255, 255), unsetcolor=(0, 0, 0, 0))
+    return pygame.surfarray.array_alpha(surface).T > 0
+
+def arrayToMask(array):
+    h, w = array.shape
+    surface = pygame.image.frombuffer(np.ascontiguousarray(array, dtype=np.uint8), (w, h), "P")
+    surface.set_colorkey(0)
+    return pygame.mask.from_surface(surface)
+
 
 # class linearVectorArt:
 #     pass
@@ -63,7 +80,8 @@ def showVector(screen, vector: Vector2D, x, y, length=100, lineWidth=7, headLeng
 
     pygame.draw.polygon(screen, (255, 0, 0), points)
 
-def showVecDirSprite(sprite: MovableSprite, *args, **kwargs):
+# sprite: gameObjects.MovableSprite (not imported, gameObjects depends on this module through assets)
+def showVecDirSprite(sprite, *args, **kwargs):
     showVector(sprite.screen, sprite.dir, *sprite.pos.toTuple(), *args, **kwargs)
 
 def printRuntime(callable):
@@ -1,39 +1,200 @@
+import numpy as np
 import pygame
-from PygameCollection.gameObjects import MovableSprite
+from PygameCollection.assets import assets
+from PygameCollection.gameObjects import GraphicalObj
+from PygameCollection.collision import sweepCircles, reflectDirections
 from PygameCollection.math import Vector2D
+from PygameCollection.profiling import profiler
 from abc import ABC
 from enum import Enum
-from timeit import default_timer
 from math import pi
 
 # PROJECTILE-classes ---------
-class Projectile(MovableSprite, ABC):
-	def __init__(self, game, img, pos, *args, **kwargs):
-		super().__init__(game, img, pos, *args, **kwargs)
-		self.born = default_timer()
-		self.lifetime = 2 # in seconds
-
-	def hasExpired(self):
-		return default_timer() - self.born > self.lifetime if self.lifetime != -1 else False
+# projectile classes only describe a kind of projectile, all live projectiles are simulated together by the ProjectilePool
+class Projectile(ABC):
+	SPEED = 10
+	LIFETIME = 2 # in seconds (simulated time), -1 --> infinite
+	DAMAGE = 1 # health a tank loses when hit
 
 
 class CanonBall(Projectile):
-	def __init__(self, *args, **kwargs):
-		super().__init__(*args, **kwargs)
-		self.v = 10
-		self.lastCollided = None
+	SPEED = 10
+
+
+# Structure of arrays holding every live projectile of a game. Projectiles are addressed by their slot index,
+# movement, wall reflection (swept, see PygameCollection.collision) and expiration are done for all slots at once in update()
+class ProjectilePool(GraphicalObj):
+	ARRAYS = ("pos", "dir", "speed", "born", "lifetime", "radius", "lastCollided", "alive")
+
+	def __init__(self, game, capacity=256):
+		super().__init__(game)
+		self.capacity = 0
+		self.pos = np.empty((0, 2), dtype=np.double)
+		self.prevPos = np.empty((0, 2), dtype=np.double) # positions of the previous tick, only used for drawing
+		self.dir = np.empty((0, 2), dtype=np.double)
+		self.speed = np.empty(0, dtype=np.double)
+		self.born = np.empty(0, dtype=np.int64) # tick of the spawn
+		self.lifetime = np.empty(0, dtype=np.int64) # in ticks, -1 --> infinite
+		self.radius = np.empty(0, dtype=np.double)
+		self.lastCollided = np.empty(0, dtype=np.int32) # index of the last reflecting wall (-1 = none)
+		self.alive = np.empty(0, dtype=bool)
+		self.imgs = []
+		self.owners = []
+		self.free = []
+		self._radii = {}
+		self._mapVersion = None
+		self.reserved = 0 # slots reserved by attached Ammunitions, the arrays never hold less (see reserve)
+		self.hits = 0 # spawns which got a free slot
+		self.misses = 0 # spawns which had to grow the arrays
+		self.batched = True
+		self._grow(capacity)
+
+	def __len__(self):
+		return self.capacity - len(self.free)
+
+	# grows the arrays once in advance, so that spawning the reserved projectiles never reallocates them during a match
+	def reserve(self, count):
+		self.reserved += count
+		if self.reserved > self.capacity:
+			self._grow(self.reserved)
+
+	def release(self, count):
+		self.reserved -= count
+
+	def stats(self):
+		return {"capacity": self.capacity, "live": len(self), "reserved": self.reserved, "hits": self.hits, "misses": self.misses}
 
+	def _grow(self, capacity):
+		extra = capacity - self.capacity
+		self.pos = np.concatenate((self.pos, np.zeros((extra, 2))))
+		self.prevPos = np.concatenate((self.prevPos, np.zeros((extra, 2))))
+		self.dir = np.concatenate((self.dir, np.zeros((extra, 2))))
+		self.speed = np.concatenate((self.speed, np.zeros(extra)))
+		self.born = np.concatenate((self.born, np.zeros(extra, dtype=np.int64)))
+		self.lifetime = np.concatenate((self.lifetime, np.zeros(extra, dtype=np.int64)))
+		self.radius = np.concatenate((self.radius, np.zeros(extra)))
+		self.lastCollided = np.concatenate((self.lastCollided, np.full(extra, -1, dtype=np.int32)))
+		self.alive = np.concatenate((self.alive, np.zeros(extra, dtype=bool)))
+		self.imgs.extend([None]*extra)
+		self.owners.extend([None]*extra)
+		# slots are handed out from the end of the free list, lowest index first
+		self.free = list(range(capacity-1, self.capacity-1, -1)) + self.free
+		self.capacity = capacity
+
+	# radius of the visible part of the image (transparent borders are ignored)
+	def _radiusOf(self, img):
+		if img not in self._radii:
+			rects = assets.mask(img).get_bounding_rects()
+			self._radii[img] = max(max(r.w, r.h) for r in rects)/2 if rects else 0
+		return self._radii[img]
+
+	# lifetime in seconds (-1 --> infinite), owner is notified via owner.kill(slot) once the projectile expires
+	def spawn(self, pos: Vector2D, direction: Vector2D, speed, lifetime, img, owner=None):
+		if self.free:
+			self.hits += 1
+		else:
+			self.misses += 1
+			profiler.count("projectiles.poolMisses")
+			self._grow(self.capacity*2)
+		slot = self.free.pop()
+		self.pos[slot] = self.prevPos[slot] = pos.toTuple()
+		self.dir[slot] = direction.toTuple()
+		self.speed[slot] = speed
+		self.born[slot] = self.game.ticks
+		self.lifetime[slot] = -1 if lifetime == -1 else self.game.toTicks(lifetime)
+		self.radius[slot] = self._radiusOf(img)
+		self.lastCollided[slot] = -1
+		self.alive[slot] = True
+		self.imgs[slot] = img
+		self.owners[slot] = owner
+		return slot
+
+	def kill(self, slot):
+		assert self.alive[slot]
+		self.alive[slot] = False
+		self.imgs[slot] = None
+		self.owners[slot] = None
+		self.free.append(slot)
+
+	def hasExpired(self, slot):
+		return self.lifetime[slot] != -1 and self.game.ticks - self.born[slot] > self.lifetime[slot]
+
+	def getPosition(self, slot):
+		return Vector2D(*self.pos[slot])
+
+	def getDirection(self, slot):
+		return Vector2D(*self.dir[slot])
+
+	@profiler.timed("projectiles")
 	def update(self):
-		oldPos = self.pos
-		self.pos += self.dir * self.v
-		super().update()
-		if (wall := self.game.map.hitsWall(self)) and wall != self.lastCollided:
-			self.lastCollided = wall
+		if len(self) == 0:
+			return
+		self._expire()
+		idx = np.flatnonzero(self.alive)
+		if len(idx) == 0:
+			return
+		tankMap = self.game.map
+		if tankMap.version != self._mapVersion:
+			# wall indices are not valid anymore
+			self.lastCollided[:] = -1
+			self._mapVersion = tankMap.version
+		# continuous collision, so fast projectiles can not pass through walls
+		starts, deltas, lengthsSq, norms, halfWidths = tankMap.wallArrays()
+		pos = self.pos[idx]
+		motion = self.dir[idx]*self.speed[idx, None]
+		t, walls, normals = sweepCircles(pos, motion, self.radius[idx], starts, deltas, lengthsSq, halfWidths, ignore=self.lastCollided[idx], grid=tankMap.wallGrid())
+		hit = np.isfinite(t)
+		self.pos[idx[~hit]] = pos[~hit] + motion[~hit]
+		if hit.any():
+			# projectiles are stopped at the point of impact and reflected at the wall
 			# todo: handle edge case -> projectile is spawned inside wall
-			self.pos = oldPos
-			self.dir = wall.reflectVector(self.dir)
+			bounced = idx[hit]
+			self.pos[bounced] = pos[hit] + t[hit, None]*motion[hit]
+			self.dir[bounced] = reflectDirections(self.dir[bounced], normals[hit])
+			self.lastCollided[bounced] = walls[hit]
+
+	def _expire(self):
+		idx = np.flatnonzero(self.alive & (self.lifetime != -1))
+		expired = idx[self.game.ticks - self.born[idx] > self.lifetime[idx]]
+		for slot in expired:
+			owner = self.owners[slot]
+			if owner is not None:
+				owner.kill(slot)
+			else:
+				self.kill(slot)
+
+	# copy of the simulated state (images are not part of it), see tankGame.TankClash.getState
+	def getState(self):
+		return {
+			"arrays": {name: getattr(self, name).copy() for name in ProjectilePool.ARRAYS},
+			"owners": list(self.owners),
+			"imgs": list(self.imgs),
+			"free": list(self.free),
+			"mapVersion": self._mapVersion,
+		}
+
+	def setState(self, state):
+		for name in ProjectilePool.ARRAYS:
+			setattr(self, name, state["arrays"][name].copy())
+		self.owners = list(state["owners"])
+		self.imgs = list(state["imgs"])
+		self.free = list(state["free"])
+		self._mapVersion = state["mapVersion"]
+		self.capacity = len(self.alive)
+		self.prevPos = self.pos.copy()
 
+	def savePrevious(self):
+		np.copyto(self.prevPos, self.pos)
 
+	def blitSequence(self):
+		slots = np.flatnonzero(self.alive)
+		alpha = self.game.alpha
+		pos = self.pos[slots] if alpha >= 1 else self.prevPos[slots] + (self.pos[slots] - self.prevPos[slots])*alpha
+		imgs = self.imgs
+		return [(imgs[slot], (x - imgs[slot].get_width()//2, y - imgs[slot].get_height()//2)) for slot, (x, y) in zip(slots.tolist(), pos.tolist())]
+
+	def draw(self):
+		return self.screen.blits(self.blitSequence(), doreturn=True)
 
 
 # AMMO-classes ---------
@@ -45,28 +206,56 @@ class Ammunition:
 		self.img = img
 
 		self.shotInterval = shotInterval
-		self.lastShot = None
+		self.lastShot = None # tick of the last shot
+		self.shotsFired = 0
 		self.shotMaximum = shotMaximum
-		self.activeShots = set()
+		self.activeShots = set() # slots in the game's ProjectilePool
+		self.pool: ProjectilePool = None
+		self.reservation: ProjectilePool = None # pool holding shotMaximum slots for this ammunition
 
 	# respects the shotMaximum
 	def tryGetBullet(self, game, pos, *args, **kwargs):
 		if len(self.activeShots) >= self.shotMaximum:
 			return
-		elif self.lastShot is not None and default_timer()-self.lastShot < self.shotInterval:
+		elif self.lastShot is not None and game.ticks-self.lastShot < game.toTicks(self.shotInterval):
 			return
 		return self.forceGetBullet(game, pos, *args, **kwargs)
 
-	def forceGetBullet(self, game, pos, *args, **kwargs):
-		b = self.ammoClass(game, self.img, pos, *args, **kwargs)
-		self.lastShot = default_timer()
-		if self.lifetime is not None:
-			b.lifetime = self.lifetime
-		self.activeShots.add(b)
-		return b
+	# reserves shotMaximum slots in the pool, shots of attached ammunition never have to grow it
+	def attach(self, pool):
+		if self.reservation is pool:
+			return
+		self.detach()
+		pool.reserve(self.shotMaximum)
+		self.reservation = self.pool = pool
+
+	# projectiles which are still alive are killed through self.pool as usual
+	def detach(self):
+		if self.reservation is not None:
+			self.reservation.release(self.shotMaximum)
+			self.reservation = None
+
+	# returns the slot of the new projectile in game.projectiles
+	def forceGetBullet(self, game, pos, direction):
+		self.attach(game.projectiles)
+		lifetime = self.ammoClass.LIFETIME if self.lifetime is None else self.lifetime
+		slot = self.pool.spawn(pos, direction, self.ammoClass.SPEED, lifetime, self.img, owner=self)
+		self.lastShot = game.ticks
+		self.shotsFired += 1
+		self.activeShots.add(slot)
+		return slot
 
-	def kill(self, projectile):
-		self.activeShots.remove(projectile)
+	def getState(self):
+		return {"lastShot": self.lastShot, "shotsFired": self.shotsFired, "activeShots": set(self.activeShots)}
+
+	def setState(self, state):
+		self.lastShot = state["lastShot"]
+		self.shotsFired = state["shotsFired"]
+		self.activeShots = set(state["activeShots"])
+
+	def kill(self, slot):
+		self.activeShots.remove(slot)
+		self.pool.kill(slot)
 
 	# convenience method
 	@classmethod
@@ -85,6 +274,9 @@ class AmmoTypeData:
 		assert self.img is not None, "'img' attribute must be set"
 		return Ammunition(self.ammoClass, self.shotInterval, self.shotMaximum, self.lifetime, self.img)
 
+# attributes of AmmoTypeData which can be changed at runtime (e.g. for balance tests, see tournament.py)
+AMMO_PARAMETERS = ("shotInterval", "shotMaximum", "lifetime")
+
 # lifetime = -1 --> infinte
 class AmmoType(Enum):
 	NORMAL = AmmoTypeData(CanonBall, shotInterval=0.1, shotMaximum=100, lifetime=-1)
@@ -100,6 +292,18 @@ class AmmoType(Enum):
 		assert isinstance(ammoType, AmmoType)
 		return ammunition.ammoClass == ammoType.value.ammoClass
 
+	# {type name: {parameter: value}} for every AmmoType, ammunition created afterwards uses the new values
+	@classmethod
+	def getParameters(cls):
+		return {t.name: {p: getattr(t.value, p) for p in AMMO_PARAMETERS} for t in cls}
+
+	@classmethod
+	def setParameters(cls, parameters):
+		for name, values in parameters.items():
+			for p, v in values.items():
+				assert p in AMMO_PARAMETERS, f"unknown ammo parameter '{p}'"
+				setattr(cls[name].value, p, v)
+
 	@classmethod
 	def setImage(cls, ammoType, img):
 		assert isinstance(ammoType, AmmoType)
@@ -0,0 +1,65 @@
+# Runs the benchmark suite headless and compares results against a saved baseline
+# usage: python -m benchmarks run [suites ...] [--out results.json]
+#        python -m benchmarks compare baseline.json results.json [--threshold 0.1]
+import argparse
+import sys
+
+from benchmarks import harness, vector2d, tankCollision, tankMap, spriteUpdate, gameTick, drawing, hitDetection
+
+SUITES = {
+	"vector2d": vector2d.run,
+	"tankCollision": tankCollision.run,
+	"tankMap": tankMap.run,
+	"spriteUpdate": spriteUpdate.run,
+	"gameTick": gameTick.run,
+	"drawing": drawing.run,
+	"hitDetection": hitDetection.run,
+}
+
+def runSuites(names):
+	results = {}
+	for name in names:
+		print(f"running {name} ...", file=sys.stderr)
+		results[name] = SUITES[name]()
+	return results
+
+def printComparison(rows, onlyChanges=False):
+	print(f"{'benchmark':<64}{'baseline':>14}{'current':>14}{'ratio':>8}")
+	for key, b, c, ratio, status in rows:
+		if onlyChanges and status == "ok":
+			continue
+		flag = {"regression": "  REGRESSION", "improvement": "  improved"}.get(status, "")
+		print(f"{key:<64}{b:>14.2f}{c:>14.2f}{ratio:>8.2f}{flag}")
+
+def main(args=None):
+	parser = argparse.ArgumentParser(prog="python -m benchmarks", description="headless benchmark suite")
+	commands = parser.add_subparsers(dest="command", required=True)
+	runParser = commands.add_parser("run", help="run benchmarks and store the results as json")
+	runParser.add_argument("suites", nargs="*", help=f"any of {', '.join(SUITES)} (default: all)")
+	runParser.add_argument("--out", default="benchmarkResults.json")
+	compareParser = commands.add_parser("compare", help="compare two result files, exits with 1 if anything regressed")
+	compareParser.add_argument("baseline")
+	compareParser.add_argument("current")
+	compareParser.add_argument("--threshold", type=float, default=0.1, help="relative change which counts as regression/improvement")
+	compareParser.add_argument("--changes", action="store_true", help="only list changed benchmarks")
+	args = parser.parse_args(args)
+
+	if args.command == "run":
+		unknown = set(args.suites) - SUITES.keys()
+		if unknown:
+			parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+		results = runSuites(args.suites or list(SUITES))
+		harness.save(results, args.out)
+		for key, v in harness.flatten(results).items():
+			print(f"{key:<64}{v:>14.2f}")
+		print(f"saved results to '{args.out}'", file=sys.stderr)
+	elif args.command == "compare":
+		rows = harness.compare(harness.load(args.baseline), harness.load(args.current), args.threshold)
+		printComparison(rows, args.changes)
+		regressions = sum(r[4] == "regression" for r in rows)
+		print(f"{regressions} regression(s) of {len(rows)} benchmarks (threshold {args.threshold:.0%})")
+		return 1 if regressions else 0
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,73 @@
+# Drawing N rotated tanks and M projectiles through the drawing queue, batched (one Surface.blits call per layer)
+# and with every object drawn by its own draw(). Batching is roughly on par with drawing every object on its own,
+# the speedup of the rotated frames comes from RLE encoding them (compare drawDynamic with drawDynamic.noRle)
+# usage: python -m benchmarks.drawing
+from math import pi
+import pygame
+
+from benchmarks.harness import BenchGame, seed, usPerCall
+from PygameCollection.game import BaseDrawingQueue
+from PygameCollection.math import Vector2D
+from PygameCollection.gameObjects import MovableSprite, rotationCache
+from PygameCollection.utils import loadConvFacScaledImg
+from ammo import AmmoType, ProjectilePool
+from tankGame import Tank
+
+# (tanks, projectiles)
+SCENARIOS = ((8, 100), (64, 800), (64, 0))
+
+class BenchSprite(MovableSprite):
+	pass
+
+# replaces the cached rotation frames of img by frames rendered like before they were RLE encoded
+def _dropRle(img, steps):
+	for i in range(steps):
+		key = (img, steps, i)
+		_, mask = rotationCache.items[key]
+		rotationCache.items[key] = (img.copy() if i == 0 else pygame.transform.rotate(img, -360*i/steps), mask)
+
+def _scene(game, tanks, projectiles, rng, rle=True):
+	img = loadConvFacScaledImg(("assets", "img", "TankBlue.png"), 0.5)
+	rotationCache.warmUp(img, Tank.ROT_STEPS)
+	if not rle:
+		_dropRle(img, Tank.ROT_STEPS)
+	queue = BaseDrawingQueue()
+	for _ in range(tanks):
+		sprite = BenchSprite(game, img, Vector2D(float(rng.uniform(0, game.w)), float(rng.uniform(0, game.h))), rotation=float(rng.uniform(0, 2*pi)))
+		sprite.rotSteps = Tank.ROT_STEPS
+		sprite.update()
+		queue.append(sprite, 1)
+	pool = ProjectilePool(game)
+	for _ in range(projectiles):
+		pool.spawn(Vector2D(float(rng.uniform(0, game.w)), float(rng.uniform(0, game.h))), Vector2D(1, 0), 0, -1, AmmoType.NORMAL.value.img)
+	queue.append(pool, 2)
+	return queue
+
+def _unbatched(queue):
+	def fn():
+		for _, obj in queue._each():
+			obj.draw()
+	return fn
+
+def run(scenarios=SCENARIOS):
+	rng = seed(0)
+	game = BenchGame()
+	# images and frames are converted to the display format like in the game, blits between other formats are a lot slower
+	pygame.display.set_mode((1, 1))
+	try:
+		surface = pygame.Surface(game.windowSize).convert()
+		game.screen = surface
+		results = {}
+		for tanks, projectiles in scenarios:
+			queue = _scene(game, tanks, projectiles, rng)
+			results[f"drawDynamic.{tanks}x{projectiles}"] = {"usPerCall": usPerCall(lambda: queue.drawDynamic(surface), number=50)}
+			results[f"drawEach.{tanks}x{projectiles}"] = {"usPerCall": usPerCall(_unbatched(queue), number=50)}
+			queue = _scene(game, tanks, projectiles, rng, rle=False)
+			results[f"drawDynamic.noRle.{tanks}x{projectiles}"] = {"usPerCall": usPerCall(lambda: queue.drawDynamic(surface), number=50)}
+	finally:
+		pygame.display.quit()
+	return results
+
+if __name__ == "__main__":
+	for name, r in run().items():
+		print(f"{name:<40}{r['usPerCall']:>12.1f} us/call")
@@ -0,0 +1,66 @@
+# Full headless ticks of TankClash with N driving and shooting tanks and M bouncing projectiles
+# usage: python -m benchmarks.gameTick
+import os
+import tempfile
+from math import pi
+from timeit import default_timer
+
+from benchmarks.harness import seed
+from benchmarks.tankMap import syntheticMap
+from PygameCollection.math import Vector2D
+from PygameCollection.simulation import Simulation
+from tankGame import TankClash, Tank, Player
+
+# (tanks, projectiles)
+SCENARIOS = ((1, 0), (4, 100), (8, 1000))
+WALLS = 60
+
+def _game(directory, tanks, projectiles, rng):
+	path = os.path.join(directory, "tickMap")
+	game = TankClash(headless=True, mapName=path)
+	syntheticMap(game, WALLS).save(path, optimize=False)
+	sim = Simulation(game)
+	first = next(iter(game.players))
+	game.map.spawnSampler.rng = rng
+	spawns = game.possibleSpawnLocations(tanks, minDistance=150)
+	first.setPosition(*spawns[0])
+	for i, pos in enumerate(spawns[1:tanks]):
+		p = Player(f"bot{i}", i+2, game)
+		p.setTank(Tank(game, first.tank.img, Vector2D(*pos)))
+		game.addPlayer(p)
+	for _ in range(projectiles):
+		game.projectiles.spawn(
+			Vector2D(float(rng.uniform(50, game.w-50)), float(rng.uniform(50, game.h-50))),
+			Vector2D.fromRadiant(float(rng.uniform(0, 2*pi))), 10, -1, first.tank.ammo.img
+		)
+	return game, sim
+
+def _drive(game, tick):
+	for i, p in enumerate(game.players):
+		actions = p.tank.actions
+		actions["forward"]()
+		actions["left" if (tick // 60 + i) % 2 else "right"]()
+		actions["shoot"]()
+
+def _timeTicks(directory, tanks, projectiles, ticks):
+	game, sim = _game(directory, tanks, projectiles, seed(0))
+	for t in range(20): # warm up
+		_drive(game, t)
+		sim.step()
+	start = default_timer()
+	for t in range(ticks):
+		_drive(game, t)
+		sim.step()
+	return (default_timer() - start) / ticks * 1e6
+
+# every repetition starts from the same seeded game, the fastest one is reported
+def run(ticks=300, repeat=3):
+	results = {}
+	with tempfile.TemporaryDirectory() as directory:
+		for tanks, projectiles in SCENARIOS:
+			results[f"tick.{tanks}tanks.{projectiles}projectiles"] = {"usPerTick": min(_timeTicks(directory, tanks, projectiles, ticks) for _ in range(repeat))}
+	return results
+
+if __name__ == "__main__":
+	for name, r in run().items():
+		print(f"{name:<40}{r['usPerTick']:>12.1f} us/tick")
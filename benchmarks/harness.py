@@ -0,0 +1,66 @@
+# Shared helpers of the benchmark suite (see benchmarks/__main__.py)
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import json
+import platform
+import random
+import timeit
+from datetime import datetime, timezone
+import numpy as np
+import pygame
+
+from PygameCollection.game import Base2DGame
+from PygameCollection.utils import loadConvScaledImg
+from ammo import AmmoType
+
+class BenchGame(Base2DGame):
+	def __init__(self):
+		super().__init__(headless=True)
+		AmmoType.setImage(AmmoType.NORMAL, loadConvScaledImg(("assets", "img", "ProjectileBall.png"), (30, 30)))
+
+	def loop(self):
+		pass
+
+# every benchmark seeds its randomness, so runs on the same machine are comparable
+def seed(value=0):
+	random.seed(value)
+	np.random.seed(value)
+	return np.random.default_rng(value)
+
+# best time per call in microseconds (minimum over repeat runs of number calls each)
+def usPerCall(fn, number=1000, repeat=5):
+	return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+def metadata():
+	return {
+		"created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+		"python": platform.python_version(),
+		"pygame": pygame.version.ver,
+		"numpy": np.__version__,
+		"platform": platform.platform(),
+		"machine": platform.machine(),
+	}
+
+def save(results, path):
+	with open(path, "w", encoding="utf8") as f:
+		json.dump({"meta": metadata(), "results": results}, f, indent=2)
+
+def load(path):
+	with open(path, "r", encoding="utf8") as f:
+		return json.load(f)["results"]
+
+# results: suite -> benchmark -> metric -> value, all metrics are lower-is-better (times, allocations)
+def flatten(results):
+	return {f"{suite}/{name}/{metric}": v for suite, benchmarks in results.items() for name, metrics in benchmarks.items() for metric, v in metrics.items()}
+
+# returns [(key, baseline, current, ratio, status)] for every metric which exists in both runs,
+# status is "regression" or "improvement" if the ratio differs by more than threshold from 1, else "ok"
+def compare(baseline, current, threshold=0.1, minValue=1e-9):
+	base, cur = flatten(baseline), flatten(current)
+	rows = []
+	for key in sorted(base.keys() & cur.keys()):
+		b, c = base[key], cur[key]
+		ratio = c / b if abs(b) > minValue else (1.0 if abs(c) <= minValue else float("inf"))
+		status = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else "ok"
+		rows.append((key, b, c, ratio, status))
+	return rows
@@ -0,0 +1,52 @@
+# Hit detection (grid broadphase, bounding box midphase, mask narrowphase) of N tanks and M bouncing projectiles,
+# compared with testing every projectile against every tank by Sprite2D.maskCollidesWith
+# usage: python -m benchmarks.hitDetection
+import tempfile
+import pygame
+
+from benchmarks.gameTick import _game, _drive
+from benchmarks.harness import seed, usPerCall
+
+# (tanks, projectiles)
+SCENARIOS = ((2, 100), (8, 800))
+
+def _naive(game):
+	pool = game.projectiles
+	slots = pool.alive.nonzero()[0].tolist()
+	def fn():
+		hits = 0
+		for p in game.players:
+			for slot in slots:
+				other = _ProjectileSprite(pool, slot)
+				p.tank.mask = None
+				hits += bool(p.tank.maskCollidesWith(other))
+		return hits
+	return fn
+
+# just enough of a Sprite2D for pygame.sprite.collide_mask
+class _ProjectileSprite:
+	def __init__(self, pool, slot):
+		img = pool.imgs[slot]
+		x, y = pool.pos[slot].tolist()
+		self.rect = img.get_rect(center=(int(x), int(y)))
+		self.mask = None
+		self._img = img
+
+	def getMask(self):
+		return pygame.mask.from_surface(self._img)
+
+def run(scenarios=SCENARIOS):
+	results = {}
+	with tempfile.TemporaryDirectory() as directory:
+		for tanks, projectiles in scenarios:
+			game, sim = _game(directory, tanks, projectiles, seed(0))
+			for t in range(30):
+				_drive(game, t)
+				sim.step()
+			results[f"detect.{tanks}tanks.{projectiles}projectiles"] = {"usPerCall": usPerCall(game.hitDetection.detect, number=200)}
+			results[f"naive.{tanks}tanks.{projectiles}projectiles"] = {"usPerCall": usPerCall(_naive(game), number=3, repeat=3)}
+	return results
+
+if __name__ == "__main__":
+	for name, r in run().items():
+		print(f"{name:<40}{r['usPerCall']:>12.1f} us/call")
@@ -0,0 +1,44 @@
+# MovableSprite.update while rotating, with a warm rotation cache and with every rotation rendered again
+# usage: python -m benchmarks.spriteUpdate
+from math import pi
+
+from benchmarks.harness import BenchGame, seed, usPerCall
+from PygameCollection.math import Vector2D
+from PygameCollection.gameObjects import MovableSprite, rotationCache
+from PygameCollection.utils import loadConvFacScaledImg
+from tankGame import Tank
+
+class BenchSprite(MovableSprite):
+	pass
+
+def _rotating(sprite, step):
+	def fn():
+		sprite.rot = (sprite.rot + step) % (2*pi)
+		sprite.update()
+	return fn
+
+def run():
+	seed(0)
+	game = BenchGame()
+	img = loadConvFacScaledImg(("assets", "img", "TankBlue.png"), 0.5)
+	sprite = BenchSprite(game, img, Vector2D(500, 500))
+	sprite.rotSteps = Tank.ROT_STEPS
+	step = 2*pi/Tank.ROT_STEPS
+	results = {}
+
+	rotationCache.warmUp(img, Tank.ROT_STEPS)
+	results["update.static"] = {"usPerCall": usPerCall(sprite.update, number=5000)}
+	results["update.rotating"] = {"usPerCall": usPerCall(_rotating(sprite, step), number=5000)}
+
+	maxSize = rotationCache.maxSize
+	rotationCache.clear()
+	rotationCache.maxSize = 0
+	try:
+		results["update.rotatingUncached"] = {"usPerCall": usPerCall(_rotating(sprite, step), number=200)}
+	finally:
+		rotationCache.maxSize = maxSize
+	return results
+
+if __name__ == "__main__":
+	for name, r in run().items():
+		print(f"{name:<40}{r['usPerCall']:>12.1f} us/call")
@@ -0,0 +1,70 @@
+# Compares the analytic tank vs. wall solver (Tank.update) with the recursive halving approach (Tank.updateRecursive)
+# usage: python -m benchmarks.tankCollision
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+from math import pi
+from timeit import default_timer
+
+from PygameCollection.math import Vector2D
+from PygameCollection.gameObjects import rotationCache
+from PygameCollection.utils import loadConvFacScaledImg, loadConvScaledImg
+from PygameCollection.game import Base2DGame
+from ammo import AmmoType
+from map import TankMap
+from tankGame import Tank
+
+class CollisionBenchGame(Base2DGame):
+	def __init__(self):
+		super().__init__(headless=True)
+		self.map = TankMap(self)
+		self.map.addWallH((0, 300), 1920)
+		self.map.addWallV((600, 0), 1080)
+
+	def loop(self):
+		pass
+
+# name -> (start position, rotation, actions per tick)
+SCENARIOS = {
+	"free": (Vector2D(1200, 700), 0, ("forward",)),
+	"pressedAgainstWall": (Vector2D(1200, 365), 0, ("forward",)),
+	"rotatingAtWall": (Vector2D(1200, 365), 0, ("forward", "left")),
+	"corner": (Vector2D(665, 365), -pi/4, ("forward", "right")),
+}
+
+def runScenario(game, img, analytic, start, rot, actions, ticks, cached=True):
+	maxSize = rotationCache.maxSize
+	if not cached:
+		# every rotation is rendered and its mask rebuilt again (behaviour before rotationCache)
+		rotationCache.clear()
+		rotationCache.maxSize = 0
+	try:
+		return _timeUpdates(game, img, analytic, start, rot, actions, ticks)
+	finally:
+		rotationCache.maxSize = maxSize
+
+def _timeUpdates(game, img, analytic, start, rot, actions, ticks):
+	tank = Tank(game, img, Vector2D.copy(start))
+	tank.rot = rot
+	tank.analyticCollision = analytic
+	tank.update()
+	t = default_timer()
+	for _ in range(ticks):
+		for a in actions:
+			tank.actions[a]()
+		tank.update()
+	return (default_timer() - t) / ticks * 1e6
+
+def run(ticks=500):
+	game = CollisionBenchGame()
+	AmmoType.setImage(AmmoType.NORMAL, loadConvScaledImg(("assets", "img", "ProjectileBall.png"), (30, 30)))
+	img = loadConvFacScaledImg(("assets", "img", "TankBlue.png"), 0.5)
+	results = {}
+	for name, (start, rot, actions) in SCENARIOS.items():
+		for label, analytic, cached in (("recursiveUncached", False, False), ("recursive", False, True), ("analytic", True, True)):
+			rotationCache.warmUp(img, Tank.ROT_STEPS)
+			results[f"{name}.{label}"] = {"usPerUpdate": runScenario(game, img, analytic, start, rot, actions, ticks, cached)}
+	return results
+
+if __name__ == "__main__":
+	for name, r in run().items():
+		print(f"{name:<40}{r['usPerUpdate']:>10.1f} us/update")
@@ -0,0 +1,109 @@
+# Map queries (collision checks, loading, spawn search) on synthetic maps of increasing size
+# usage: python -m benchmarks.tankMap
+import os
+import tempfile
+from math import pi
+
+from benchmarks.harness import BenchGame, seed, usPerCall
+from PygameCollection.math import Vector2D
+from PygameCollection.gameObjects import MovableSprite, rotationCache
+from PygameCollection.utils import loadConvFacScaledImg
+from map import TankMap, Wall
+from tankGame import Tank
+
+SIZES = (10, 100, 1000)
+SPAWN_SIZES = (10, 100, 200)
+
+# boundary walls plus random horizontal, vertical and diagonal walls (integer coordinates like maps made in the editor)
+def syntheticWalls(walls, size=(1920, 1080), seed_=0):
+	rng = seed(seed_)
+	w, h = size
+	offset = Wall.STANDARD_WIDTH//2
+	segments = [(0, offset-1, w, offset-1), (0, h-offset, w, h-offset), (offset-1, offset, offset-1, h), (w-offset, offset, w-offset, h)]
+	while len(segments) < walls:
+		x, y = int(rng.integers(20, w-20)), int(rng.integers(20, h-20))
+		length = int(rng.integers(40, 300))
+		dx, dy = ((1, 0), (0, 1), (1, 1), (1, -1))[int(rng.integers(4))]
+		segments.append((x, y, min(w-20, max(20, x + dx*length)), min(h-20, max(20, y + dy*length))))
+	return segments[:walls]
+
+def syntheticMap(game, walls, seed_=0):
+	m = TankMap(game)
+	with m.bulkEdit():
+		for x1, y1, x2, y2 in syntheticWalls(walls, game.windowSize, seed_):
+			if (x1, y1) != (x2, y2):
+				m.addWall((x1, y1), (x2, y2))
+	return m
+
+def _tank(game):
+	img = loadConvFacScaledImg(("assets", "img", "TankBlue.png"), 0.5)
+	rotationCache.warmUp(img, Tank.ROT_STEPS)
+	return Tank(game, img, Vector2D(0, 0))
+
+def _cycle(items):
+	state = {"i": 0}
+	def next_():
+		state["i"] = (state["i"] + 1) % len(items)
+		return items[state["i"]]
+	return next_
+
+# the (cached) rotation of the sprite is part of every call, see benchmarks.spriteUpdate for its share
+def _hitBench(tank, positions, check):
+	nextPos = _cycle(positions)
+	def fn():
+		x, y, rot = nextPos()
+		tank.pos = Vector2D(x, y)
+		tank.rot = rot
+		MovableSprite.update(tank)
+		return check(tank)
+	return fn
+
+# spawn locations of 4 tanks like TankClash.possibleSpawnLocations, an empty result would measure nothing
+def _spawns(tankMap, minDistance=0):
+	spawns = tankMap.spawnLocations(Tank.WIDTH, Tank.HEIGHT, 4, minDistance, clearance=Tank.SPAWN_CLEARANCE)
+	assert len(spawns) == 4, f"only {len(spawns)} spawn locations on a map with {len(tankMap.walls)} walls"
+	return spawns
+
+def run(sizes=SIZES):
+	game = BenchGame()
+	tank = _tank(game)
+	rng = seed(0)
+	positions = [(float(x), float(y), float(r)) for x, y, r in zip(rng.uniform(0, 1920, 256), rng.uniform(0, 1080, 256), rng.uniform(0, 2*pi, 256))]
+	results = {}
+
+	wall = Wall(game, (100, 100), (400, 250))
+	results["reflectVector"] = {"usPerCall": usPerCall(lambda: wall.reflectVector(Vector2D(0.6, 0.8)), number=5000)}
+
+	with tempfile.TemporaryDirectory() as directory:
+		for n in sizes:
+			tankMap = syntheticMap(game, n)
+			game.map = tankMap
+			results[f"hitsAnyWall.{n}"] = {"usPerCall": usPerCall(_hitBench(tank, positions, tankMap.hitsAnyWall), number=500)}
+			results[f"hitsWall.{n}"] = {"usPerCall": usPerCall(_hitBench(tank, positions, tankMap.hitsWall), number=500)}
+
+			path = os.path.join(directory, f"synthetic{n}")
+			tankMap.save(path, fitSizes=[(Tank.WIDTH, Tank.HEIGHT)], optimize=False)
+			results[f"loadCsv.{n}"] = {"usPerCall": usPerCall(lambda: TankMap(game).loadCsv(path), number=3, repeat=3)}
+			results[f"loadBinary.{n}"] = {"usPerCall": usPerCall(lambda: TankMap(game).loadBinary(path), number=3, repeat=3)}
+
+			def fitMask():
+				tankMap._fitMasks.clear()
+				return tankMap.maskFittingRect(Tank.WIDTH, Tank.HEIGHT)
+			results[f"maskFittingRect.{n}"] = {"usPerCall": usPerCall(fitMask, number=1, repeat=3)}
+
+	# maps with more random walls have no room left for a tank
+	for n in SPAWN_SIZES:
+		tankMap = syntheticMap(game, n)
+		tankMap.spawnSampler.rng = rng
+		# cold includes building the fit mask, warm only samples from the cached free positions
+		def spawnsCold():
+			tankMap._fitMasks.clear()
+			tankMap.spawnSampler._free.clear()
+			return _spawns(tankMap)
+		results[f"spawnLocations.cold.{n}"] = {"usPerCall": usPerCall(spawnsCold, number=1, repeat=3)}
+		results[f"spawnLocations.warm.{n}"] = {"usPerCall": usPerCall(lambda: _spawns(tankMap, minDistance=200), number=200)}
+	return results
+
+if __name__ == "__main__":
+	for name, r in run().items():
+		print(f"{name:<40}{r['usPerCall']:>12.1f} us/call")
@@ -0,0 +1,120 @@
+# Microbenchmark of PygameCollection.math.Vector2D against the previous NumPy backed implementation
+# usage: python -m benchmarks.vector2d
+import timeit
+import tracemalloc
+from math import pi, sin, cos, acos
+import numpy as np
+
+from PygameCollection.math import Vector2D, Vector2DArray
+
+
+# previous implementation (one np.array per instance), only kept as reference for this benchmark
+class LegacyVector2D:
+	def __init__(self, x, y, dtype=np.double):
+		self.dtype = dtype
+		self.x, self.y = x, y
+		self.vec = np.array((x, y), dtype=self.dtype)
+
+	def magnitude(self):
+		return np.sqrt(self.vec.dot(self.vec))
+
+	def enclosedAngle(self, v2):
+		if v2.x == 1 and v2.y == 0:
+			return acos(self.x/self.magnitude())
+		return acos((self*v2)/(self.magnitude()*v2.magnitude()))
+
+	def projectionLength(self, v2):
+		return self.magnitude()*cos(self.enclosedAngle(v2))
+
+	def toUnitVec(self):
+		m = self.magnitude()
+		self.x = self.x / m
+		self.y = self.y / m
+		self.vec = np.array((self.x, self.y), dtype=self.dtype)
+
+	def __add__(self, other):
+		return LegacyVector2D(self.x + other.x, self.y + other.y)
+
+	def __sub__(self, other):
+		return LegacyVector2D(self.x - other.x, self.y - other.y)
+
+	def __mul__(self, other):
+		if isinstance(other, LegacyVector2D):
+			return self.vec.dot(other.vec)
+		return LegacyVector2D(self.x*other, self.y*other)
+
+	@classmethod
+	def fromRadiant(cls, radiant):
+		return LegacyVector2D(cos(radiant), sin(radiant))
+
+	@classmethod
+	def copy(cls, v):
+		return LegacyVector2D(v.x, v.y)
+
+	@classmethod
+	def fromProjection(cls, v1, v2):
+		c = LegacyVector2D.copy(v2)
+		c.toUnitVec()
+		return c * v1.projectionLength(v2)
+
+	@classmethod
+	def fromSymReflection(cls, v1, v2):
+		return (LegacyVector2D.fromProjection(v1, v2))*2 - v1
+
+
+# name -> callable(vectorClass) returning a function which performs the operation once and returns its result
+OPERATIONS = {
+	"construct": lambda V: (lambda: V(3.0, 4.0)),
+	"add": lambda V: (lambda a=V(3.0, 4.0), b=V(1.0, 2.0): a + b),
+	"scale": lambda V: (lambda a=V(3.0, 4.0): a * 1.5),
+	"dot": lambda V: (lambda a=V(3.0, 4.0), b=V(1.0, 2.0): a * b),
+	"magnitude": lambda V: (lambda a=V(3.0, 4.0): a.magnitude()),
+	"fromRadiant": lambda V: (lambda: V.fromRadiant(0.7)),
+	"forward": lambda V: (lambda p=V(100.0, 100.0), d=V.fromRadiant(0.7): p + d * 5 * 1.0), # BasicMSpriteController.forward
+	"fromSymReflection": lambda V: (lambda a=V(3.0, 4.0), n=V(0.0, 1.0): V.fromSymReflection(a, n)),
+}
+
+def nsPerOp(fn, number=20000, repeat=5):
+	return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e9
+
+# memory blocks and bytes which stay allocated per created result
+def allocationsPerOp(fn, number=2000):
+	results = [None]*number
+	tracemalloc.start()
+	before = tracemalloc.take_snapshot()
+	for i in range(number):
+		results[i] = fn()
+	after = tracemalloc.take_snapshot()
+	tracemalloc.stop()
+	stats = after.compare_to(before, "filename")
+	blocks = sum(s.count_diff for s in stats)
+	size = sum(s.size_diff for s in stats)
+	return blocks / number, size / number
+
+# "forward" for BATCH vectors at once, the results are reported per vector
+BATCH = 10000
+
+def batchedForward(n=BATCH):
+	a = Vector2DArray(np.random.default_rng(0).random((n, 2)))
+	b = Vector2DArray.fromRadiant(np.linspace(0, 2*pi, n))
+	return lambda: a + b * 5
+
+def run():
+	results = {}
+	for name, op in OPERATIONS.items():
+		for label, V in (("legacy", LegacyVector2D), ("scalar", Vector2D)):
+			fn = op(V)
+			blocks, size = allocationsPerOp(fn)
+			results[f"{name}.{label}"] = {"nsPerOp": nsPerOp(fn), "blocksPerOp": blocks, "bytesPerOp": size}
+	fn = batchedForward()
+	blocks, size = allocationsPerOp(fn, number=20)
+	results["forward.batched"] = {"nsPerOp": nsPerOp(fn, number=200) / BATCH, "blocksPerOp": blocks / BATCH, "bytesPerOp": size / BATCH}
+	return results
+
+def printResults(results):
+	print(f"{'operation':<28}{'ns/op':>10}{'blocks/op':>12}{'bytes/op':>10}")
+	for name, r in results.items():
+		print(f"{name:<28}{r['nsPerOp']:>10.1f}{r['blocksPerOp']:>12.2f}{r['bytesPerOp']:>10.1f}")
+
+if __name__ == "__main__":
+	printResults(run())
@@ -0,0 +1,65 @@
+from enum import Enum, auto
+import numpy as np
+
+from PygameCollection.assets import assets
+from PygameCollection.profiling import profiler
+from PygameCollection.spatial import BoxGrid, boxesIntersect
+
+class CollisionKind(Enum):
+	TANK = auto() # two tanks touch each other
+	PROJECTILE = auto() # a projectile hits a tank
+
+class CollisionEvent:
+	def __init__(self, kind, player, other):
+		self.kind = kind
+		self.player = player
+		self.other = other # the other Player (TANK) or the slot of the projectile in the game's ProjectilePool (PROJECTILE)
+
+	def __repr__(self):
+		other = self.other.id if self.kind is CollisionKind.TANK else self.other
+		return f"CollisionEvent({self.kind.name}, {self.player.id}, {other})"
+
+# Finds all tank/tank and projectile/tank contacts of a tick in three stages:
+# a uniform grid over the bounding boxes of all tanks and live projectiles (broadphase), the exact bounding box test
+# of the grid's candidate pairs (midphase) and the overlap of the cached masks (narrowphase, see rotationCache).
+# Projectiles never test against each other. Events are ordered by player id, then by tank id or projectile slot
+class HitDetection:
+	def __init__(self, game, cellSize=128):
+		self.game = game
+		self.grid = BoxGrid(cellSize)
+
+	@profiler.timed("hitDetection")
+	def detect(self):
+		players = self.game.playersById()
+		if not players:
+			return []
+		tanks = [p.tank for p in players]
+		tankBoxes = np.array([(t.rect.left, t.rect.top, t.rect.right - 1, t.rect.bottom - 1) for t in tanks], dtype=np.double)
+		pool = self.game.projectiles
+		slots = np.flatnonzero(pool.alive)
+		pos = pool.pos[slots]
+		radius = pool.radius[slots, None]
+		boxes = np.concatenate((tankBoxes, np.hstack((pos - radius, pos + radius))))
+
+		self.grid.build(boxes)
+		queries, items = self.grid.query(tankBoxes)
+		# tank pairs are found from both sides, keep the one with the lower index first
+		keep = (items >= len(tanks)) | (queries < items)
+		queries, items = queries[keep], items[keep]
+		keep = boxesIntersect(tankBoxes[queries], boxes[items])
+
+		events = []
+		for i, j in zip(queries[keep].tolist(), items[keep].tolist()):
+			tank = tanks[i]
+			if j < len(tanks):
+				other = tanks[j]
+				if tank.rotMask.overlap(other.rotMask, (other.rect.x - tank.rect.x, other.rect.y - tank.rect.y)):
+					events.append(CollisionEvent(CollisionKind.TANK, players[i], players[j]))
+				continue
+			slot = int(slots[j - len(tanks)])
+			img = pool.imgs[slot]
+			x, y = pos[j - len(tanks)].tolist()
+			offset = (int(x) - img.get_width()//2 - tank.rect.x, int(y) - img.get_height()//2 - tank.rect.y)
+			if tank.rotMask.overlap(assets.mask(img), offset):
+				events.append(CollisionEvent(CollisionKind.PROJECTILE, players[i], slot))
+		return events
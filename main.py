@@ -1,6 +1,5 @@
 # overhaul key mapping system
 # account for tank speed when shooting?
-# implement map optimization (e.g. 2 walls combined into 1)
 
 from tankGame import TankClash
 from tankGameMapEditor import TankClashMapEditor
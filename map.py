@@ -1,8 +1,16 @@
 import csv
-from math import pi
+import os
+import numpy as np
+from contextlib import contextmanager
+from math import pi, gcd
 
 from PygameCollection.math import Vector2D, Point2D
 from PygameCollection.gameObjects import GraphicalObj
+from PygameCollection.profiling import profiler
+from PygameCollection.spatial import SegmentGrid, BoxGrid
+from PygameCollection.utils import maskToArray
+from PygameCollection.collision import SweepHit, OrientedBox, sweepCircles, segmentBoxes, solveBoxMotion, boxesOverlap, wallBox
+from mapFile import MapFile, writeMapFile, EXTENSION as BINARY_EXTENSION
 import pygame
 
 class Wall(GraphicalObj):
@@ -17,6 +25,8 @@ class Wall(GraphicalObj):
 		self.width = 10
 		self.norm = Vector2D.getNormVec(self.start-self.end)
 		self.color = (0, 0, 0, 255)
+		self._surface = None
+		self._mask = None
 
 	# todo: change into polygons? -> made up of walls
 	# todo: add small circles to the end of a wall to make them look "cleaner"
@@ -24,12 +34,31 @@ class Wall(GraphicalObj):
 	def draw(self, surface=None):
 		s = self.screen if surface is None else surface
 		#pygame.draw.line(s, self.color, self.start.toTuple(), self.end.toTuple(), self.width) #todo: confirm that performance isn't effected to heavily be drawing rects
-		se = self.end-self.start
-		wallSurface = pygame.Surface((se.magnitude(), self.width), pygame.SRCALPHA)
-		wallSurface.fill(self.color)
-		rotatedWall = pygame.transform.rotate(wallSurface, -se.toDegrees())
-		offset = Vector2D(-rotatedWall.get_width()//2, -rotatedWall.get_height()//2)
-		s.blit(rotatedWall, ((self.start+self.end)*0.5+offset).toTuple())
+		rotatedWall, topLeft = self.getSurface()
+		s.blit(rotatedWall, topLeft)
+
+	# walls are immutable, so the rotated surface is only rendered once
+	def getSurface(self):
+		if self._surface is None:
+			se = self.end-self.start
+			wallSurface = pygame.Surface((se.magnitude(), self.width), pygame.SRCALPHA)
+			wallSurface.fill(self.color)
+			rotatedWall = pygame.transform.rotate(wallSurface, -se.toDegrees())
+			offset = Vector2D(-rotatedWall.get_width()//2, -rotatedWall.get_height()//2)
+			self._surface = (rotatedWall, ((self.start+self.end)*0.5+offset).toTuple())
+		return self._surface
+
+	# mask of the wall and its offset in screen coordinates
+	def getMask(self):
+		if self._mask is None:
+			rotatedWall, topLeft = self.getSurface()
+			self._mask = (pygame.mask.from_surface(rotatedWall), (int(topLeft[0]), int(topLeft[1])))
+		return self._mask
+
+	# area covered by the wall on screen
+	def getRect(self):
+		mask, topLeft = self.getMask()
+		return pygame.Rect(topLeft, mask.get_size())
 
 	# reflects a vector at the norm vector (e.g. used in projectile reflection logic)
 	def reflectVector(self, v):
@@ -45,42 +74,248 @@ class Wall(GraphicalObj):
 	def __len__(self):
 		return len(self.start-self.end)
 
+# Counts of an optimization pass (see optimizeSegments)
+class MapOptimizationReport:
+	def __init__(self, before=0):
+		self.before = before
+		self.after = before
+		self.degenerate = 0 # zero-length walls
+		self.duplicates = 0 # walls completely covered by another collinear wall
+		self.merged = 0 # collinear walls which overlapped or touched another one
+		self.snapped = 0 # endpoints moved onto a nearby endpoint
+
+	@property
+	def changed(self):
+		return self.degenerate + self.duplicates + self.merged + self.snapped > 0
+
+	def __str__(self):
+		return f"{self.before} -> {self.after} walls ({self.degenerate} degenerate, {self.duplicates} duplicates, {self.merged} merged, {self.snapped} endpoints snapped)"
+
+# Merges collinear walls which overlap or touch, removes zero-length walls and snaps endpoints which are at most
+# tolerance pixels apart (per axis) onto the same point. Segments are (x1, y1, x2, y2) with integer coordinates,
+# the result keeps the order of the first wall of every merged group. Returns (segments, MapOptimizationReport)
+def optimizeSegments(segments, tolerance=1):
+	report = MapOptimizationReport(len(segments))
+	endpoints = set()
+
+	def snap(x, y):
+		p = (round(x), round(y))
+		if p in endpoints:
+			return p
+		for px in range(p[0] - tolerance, p[0] + tolerance + 1):
+			for py in range(p[1] - tolerance, p[1] + tolerance + 1):
+				if (px, py) in endpoints:
+					report.snapped += (px, py) != p
+					return px, py
+		endpoints.add(p)
+		return p
+
+	# integer points on a line are origin + k*(dx, dy) if (dx, dy) is the reduced direction of the line,
+	# so every wall becomes an interval of k on its line
+	lines = {}
+	for order, (x1, y1, x2, y2) in enumerate(segments):
+		a, b = snap(x1, y1), snap(x2, y2)
+		if a == b:
+			report.degenerate += 1
+			continue
+		dx, dy = b[0] - a[0], b[1] - a[1]
+		g = gcd(dx, dy)
+		dx, dy = dx // g, dy // g
+		if dx < 0 or (dx == 0 and dy < 0):
+			dx, dy = -dx, -dy
+		origin, intervals = lines.setdefault((dx, dy, dy*a[0] - dx*a[1]), (a, []))
+		ka = ((a[0] - origin[0])*dx + (a[1] - origin[1])*dy) // (dx*dx + dy*dy)
+		kb = ((b[0] - origin[0])*dx + (b[1] - origin[1])*dy) // (dx*dx + dy*dy)
+		intervals.append((min(ka, kb), max(ka, kb), order))
+
+	merged = []
+	for (dx, dy, _), (origin, intervals) in lines.items():
+		intervals.sort()
+		start, end, order = intervals[0]
+		for s, e, o in intervals[1:]:
+			if s > end:
+				merged.append((order, origin, dx, dy, start, end))
+				start, end, order = s, e, o
+				continue
+			if e <= end:
+				report.duplicates += 1
+			else:
+				report.merged += 1
+				end = e
+			order = min(order, o)
+		merged.append((order, origin, dx, dy, start, end))
+
+	merged.sort(key=lambda m: m[0])
+	result = [(ox + s*dx, oy + s*dy, ox + e*dx, oy + e*dy) for _, (ox, oy), dx, dy, s, e in merged]
+	report.after = len(result)
+	return result, report
+
 # Basically a collection of walls
 class TankMap(GraphicalObj):
 	DATA_DELIMITER = ","
+	INDEX_CELL_SIZE = 64
+	TILE_COLORKEY = (255, 0, 255)
 
 	def __init__(self, game):
 		super().__init__(game)
 		self.walls = list()
 		self.mask: pygame.mask.Mask = None
+		# broadphase for wall lookups, kept in sync with self.walls
+		self.wallIndex = SegmentGrid(TankMap.INDEX_CELL_SIZE)
+		self.version = 0 # changes whenever walls are added or removed
+		self._wallArrays = None
+		self._wallGrid = None
+		self._fitMasks = {} # (w, h) -> result of maskFittingRect
+		self._bulkEditing = False
+		# walls are pre-rendered into a layer, which is split into tiles of tileSize (None = one tile for the whole window)
+		self.tileSize = None
+		self._tiles = {} # (x, y) of the top left corner -> rendered surface, missing tiles are rendered on demand
+		self.static = True
+		self.spawnSampler = SpawnSampler(self)
 		self._renewMask()
 
 	def addWall(self, start, end):
-		self.walls.append(Wall(self.game, start, end))
-		self._renewMask() # Size effects "hits any wall"
+		wall = Wall(self.game, start, end)
+		self.walls.append(wall)
+		self.wallIndex.insert(wall, wall.start.toTuple(), wall.end.toTuple(), wall.width/2)
+		self._wallsChanged(wall)
+		if not self._bulkEditing:
+			self._drawIntoMask(wall) # Size effects "hits any wall"
 
 	def removeWall(self, wall):
 		self.walls.remove(wall)
-		self._renewMask()
+		self.wallIndex.remove(wall)
+		self._wallsChanged(wall)
+		if not self._bulkEditing:
+			self._eraseFromMask(wall)
 
 	def removeLast(self, minAmount=0):
 		if len(self.walls) > 0:
-			del self.walls[-1]
+			wall = self.walls.pop()
+			self.wallIndex.remove(wall)
+			self._wallsChanged(wall)
+			if not self._bulkEditing:
+				self._eraseFromMask(wall)
+
+	def clear(self):
+		self.walls = list()
+		self.wallIndex.clear()
+		self._wallsChanged()
+		if not self._bulkEditing:
+			self._renewMask()
+
+	# see optimizeSegments, the walls are only replaced if anything changed
+	def optimize(self, tolerance=1):
+		segments, report = optimizeSegments([(*w.start.toTuple(), *w.end.toTuple()) for w in self.walls], tolerance)
+		if report.changed:
+			with self.bulkEdit():
+				self.clear()
+				for x1, y1, x2, y2 in segments:
+					self.addWall((x1, y1), (x2, y2))
+		return report
+
+	# wall: the added or removed wall (None = everything changed)
+	def _wallsChanged(self, wall=None):
+		self.version += 1
+		self._wallArrays = None
+		self._wallGrid = None
+		self._fitMasks = {}
+		self._invalidateTiles(None if wall is None else wall.getRect())
+
+	# walls as arrays for batched computations (indices match self.walls):
+	# starts (n, 2), deltas end-start (n, 2), squared lengths (n), unit norm vectors (n, 2), half widths (n)
+	def wallArrays(self):
+		if self._wallArrays is None:
+			n = len(self.walls)
+			starts = np.array([w.start.toTuple() for w in self.walls], dtype=np.double).reshape(n, 2)
+			deltas = np.array([(w.end-w.start).toTuple() for w in self.walls], dtype=np.double).reshape(n, 2)
+			lengthsSq = np.maximum(np.sum(deltas*deltas, axis=1), 1e-12)
+			norms = np.array([w.norm.toTuple() for w in self.walls], dtype=np.double).reshape(n, 2)
+			norms /= np.maximum(np.linalg.norm(norms, axis=1), 1e-12)[:, None]
+			halfWidths = np.array([w.width/2 for w in self.walls], dtype=np.double)
+			self._wallArrays = (starts, deltas, lengthsSq, norms, halfWidths)
+		return self._wallArrays
+
+	# BoxGrid over the bounding boxes of wallArrays() (broadphase of sweepCircles)
+	def wallGrid(self):
+		if self._wallGrid is None:
+			starts, deltas, lengthsSq, norms, halfWidths = self.wallArrays()
+			self._wallGrid = BoxGrid(TankMap.INDEX_CELL_SIZE)
+			self._wallGrid.build(segmentBoxes(starts, deltas, halfWidths))
+		return self._wallGrid
+
+	# the mask is only rebuilt once all edits inside the with block are done (e.g. when loading a map)
+	@contextmanager
+	def bulkEdit(self):
+		if self._bulkEditing:
+			yield self
+			return
+		self._bulkEditing = True
+		try:
+			yield self
+		finally:
+			self._bulkEditing = False
 			self._renewMask()
 
 	# checks if sprite overlaps map mask
 	def hitsAnyWall(self, sprite):
-		return self.mask.overlap(sprite.getMask(), sprite.getMaskOffset().toTuple())
+		with profiler.phase("hitsAnyWall"):
+			return self.mask.overlap(sprite.getMask(), sprite.getMaskOffset().toTuple())
 
 	# checks if sprite hits wall and which one that is
 	def hitsWall(self, sprite):
-		# 1.) get point of collision 2.) distance to all lines 3.) choose closest wall
-		cp = self.hitsAnyWall(sprite)
-		if cp is None:
+		with profiler.phase("hitsWall"):
+			# 1.) get point of collision 2.) closest wall around that point
+			cp = self.hitsAnyWall(sprite)
+			if cp is None:
+				return
+			return self.closestWall(*cp)
+
+	# continuous collision of a circle moving from start to end (e.g. for fast objects which could skip walls)
+	# returns the first SweepHit on the way or None
+	def sweep(self, start: Vector2D, end: Vector2D, radius=0, ignore=None):
+		starts, deltas, lengthsSq, norms, halfWidths = self.wallArrays()
+		t, walls, normals = sweepCircles(
+			np.array([start.toTuple()]), np.array([(end-start).toTuple()]), np.array([radius], dtype=np.double),
+			starts, deltas, lengthsSq, halfWidths,
+			ignore=None if ignore is None else np.array([self.walls.index(ignore)]), grid=self.wallGrid()
+		)
+		if walls[0] == -1:
 			return
-		distances = {w: self._distanceToWall(*cp, w) for w in self.walls}
-		sd = sorted(distances.items(), key=lambda x: x[1])
-		return sd[0][0]
+		return SweepHit(self.walls[walls[0]], t[0], start + (end-start)*float(t[0]), Vector2D(*normals[0].tolist()))
+
+	# walls as (ax, ay, bx, by, halfWidth) which might be touched by a circle of radius at (x, y) moving by (dx, dy)
+	def wallSegmentsNear(self, x, y, radius, dx=0, dy=0):
+		walls = self.wallIndex.queryRect(min(x, x+dx) - radius, min(y, y+dy) - radius, max(x, x+dx) + radius, max(y, y+dy) + radius)
+		return [(w.start.x, w.start.y, w.end.x, w.end.y, w.width/2) for w in walls]
+
+	# rotates and then moves an OrientedBox as far as possible without entering a wall, returns the allowed (dx, dy, dAngle)
+	def moveBox(self, box: OrientedBox, dx, dy, dAngle, slide=True, rotationStep=None):
+		walls = self.wallSegmentsNear(box.cx, box.cy, box.boundingRadius(), dx, dy)
+		return solveBoxMotion(box, dx, dy, dAngle, walls, slide=slide, rotationStep=rotationStep)
+
+	# True if the OrientedBox (grown by margin on every side) overlaps any wall, exact unlike the fit masks of maskFittingRect
+	def boxHitsWall(self, box: OrientedBox, margin=0):
+		box = OrientedBox(box.cx, box.cy, box.hx + margin, box.hy + margin, box.angle)
+		return any(boxesOverlap(box, wallBox(*w)) for w in self.wallSegmentsNear(box.cx, box.cy, box.boundingRadius()))
+
+	# up to amount (x, y) centers of upright w x h rects, which are at least clearance away from every wall
+	# (candidates of the spawnSampler are checked exactly, see boxHitsWall)
+	def spawnLocations(self, w, h, amount, minDistance=0, clearance=0):
+		candidates = self.spawnSampler.sample(w, h, 2*amount, minDistance)
+		return [p for p in candidates if not self.boxHitsWall(OrientedBox(*p, w/2, h/2, 0), margin=clearance)][:amount]
+
+	# wall closest to the given point (None if there are no walls)
+	def closestWall(self, x, y, maxDistance=float("inf")):
+		return self.wallIndex.nearest(x, y, maxDistance)[0]
+
+	# all walls which are at most radius away from the given point
+	def wallsNear(self, x, y, radius):
+		return self.wallIndex.queryRadius(x, y, radius)
+
+	# all walls which might intersect the given rect (broadphase only)
+	def wallsInRect(self, rect):
+		return self.wallIndex.queryRect(rect.left, rect.top, rect.right, rect.bottom)
 
 	def addWallH(self, start, length):
 		self.addWall(start, (start[0]+length, start[1]))
@@ -101,7 +336,14 @@ class TankMap(GraphicalObj):
 		return closest[0]
 
 	# returns a mask that is true for every bit that has enough space to fit a rect with given width and height
+	# the result is cached until the walls change (do not modify it)
 	def maskFittingRect(self, w, h):
+		if (w, h) not in self._fitMasks:
+			with profiler.phase("maskBuild"):
+				self._fitMasks[(w, h)] = self._buildMaskFittingRect(w, h)
+		return self._fitMasks[(w, h)]
+
+	def _buildMaskFittingRect(self, w, h):
 		# basic approach, which does not work pixel perfect
 		s = pygame.Surface(self.game.windowSize, pygame.SRCALPHA)
 		self.draw(s)
@@ -118,32 +360,176 @@ class TankMap(GraphicalObj):
 		m.invert()
 		return m
 
-	def _distanceToWall(self, x, y, wall):
-		m = (wall.end-wall.start).slope()
-		xp = wall.start.x if m is None else (m**2*wall.start.x+x-m*(wall.start.y-y))/(m**2+1)
-		yp = y if m is None else m*(xp-wall.start.x)+wall.start.y
-		return Point2D.distance(x, y, xp, yp)
-
 	def _renewMask(self):
-		self.mask = self.__maskFromWalls()
+		with profiler.phase("maskBuild"):
+			self.mask = self.__maskFromWalls()
 
+	# the mask is taken from the pre-rendered layer
 	def __maskFromWalls(self):
-		s = pygame.Surface(self.game.windowSize, pygame.SRCALPHA)
-		self.draw(s)
-		return pygame.mask.from_surface(s)
+		m = pygame.mask.Mask(self.game.windowSize)
+		for tile, topLeft in self.tiles():
+			m.draw(pygame.mask.from_surface(tile), topLeft)
+		return m
+
+	def _drawIntoMask(self, wall):
+		self.mask.draw(*wall.getMask())
+
+	# clears the area of the removed wall and redraws the remaining walls that overlap with it
+	def _eraseFromMask(self, wall):
+		area = wall.getRect()
+		self.mask.erase(pygame.mask.Mask(area.size, fill=True), area.topleft)
+		for w in self.wallsInRect(area.inflate(2*wall.width, 2*wall.width)):
+			if w.getRect().colliderect(area):
+				self._drawIntoMask(w)
 
 	def draw(self, surface=None):
-		for w in self.walls:
-			w.draw(surface)
+		s = self.screen if surface is None else surface
+		s.blits(self.tiles(), doreturn=False)
+
+	# (surface, topLeft) of every tile of the pre-rendered wall layer
+	def tiles(self):
+		w, h = self.game.windowSize
+		tw, th = self.game.windowSize if self.tileSize is None else self.tileSize
+		tiles = []
+		for y in range(0, h, th):
+			for x in range(0, w, tw):
+				tile = self._tiles.get((x, y))
+				if tile is None:
+					tile = self._tiles[(x, y)] = self._renderTile(pygame.Rect(x, y, min(tw, w-x), min(th, h-y)))
+				tiles.append((tile, (x, y)))
+		return tiles
 
-	def save(self, filepath):
+	# tiles are opaque surfaces with a colorkey instead of per pixel alpha, RLE acceleration makes blitting mostly empty tiles cheap
+	def _renderTile(self, area):
+		tile = pygame.Surface(area.size)
+		if pygame.display.get_surface() is not None:
+			tile = tile.convert()
+		tile.fill(TankMap.TILE_COLORKEY)
+		tile.set_colorkey(TankMap.TILE_COLORKEY, pygame.RLEACCEL)
+		for wall in self.wallsInRect(area):
+			img, (x, y) = wall.getSurface()
+			tile.blit(img, (int(x) - area.x, int(y) - area.y))
+		return tile
+
+	# smaller tiles make re-rendering after an edit cheaper (e.g. in the map editor)
+	def setTileSize(self, tileSize):
+		self.tileSize = tileSize
+		self._tiles.clear()
+
+	# drops every tile which overlaps rect (None = all tiles)
+	def _invalidateTiles(self, rect=None):
+		if rect is None or self.tileSize is None:
+			self._tiles.clear()
+			return
+		rect = rect.inflate(2, 2)
+		tw, th = self.tileSize
+		for y in range(rect.top // th * th, rect.bottom, th):
+			for x in range(rect.left // tw * tw, rect.right, tw):
+				self._tiles.pop((x, y), None)
+
+	# the csv file stays the editable source of a map, the binary file (see mapFile.py) is written next to it
+	# fitSizes: (w, h) of rects whose maskFittingRect should be precomputed (e.g. the tank size for spawning)
+	# returns the MapOptimizationReport if the map was optimized before saving
+	# (an optimized copy is saved, the walls of this map stay as they are, e.g. for removeLast in the editor)
+	def save(self, filepath, binary=True, fitSizes=(), optimize=True):
+		tankMap, report = self, None
+		if optimize:
+			segments, report = optimizeSegments([(*w.start.toTuple(), *w.end.toTuple()) for w in self.walls])
+			if report.changed:
+				tankMap = TankMap(self.game)
+				with tankMap.bulkEdit():
+					for x1, y1, x2, y2 in segments:
+						tankMap.addWall((x1, y1), (x2, y2))
 		# saves each wall as a 4 values (start_x, start_y, end_x, end_y)
 		with open(f"{filepath}.csv", "w", newline="", encoding="utf8") as f:
 			csvWriter = csv.writer(f, delimiter=TankMap.DATA_DELIMITER)
-			csvWriter.writerows([(*w.start.toTuple(), *w.end.toTuple()) for w in self.walls])
+			csvWriter.writerows([(*w.start.toTuple(), *w.end.toTuple()) for w in tankMap.walls])
+		if binary:
+			tankMap.saveBinary(filepath, fitSizes)
+		return report
+
+	def saveBinary(self, filepath, fitSizes=()):
+		for size in fitSizes:
+			self.maskFittingRect(*size)
+		writeMapFile(f"{filepath}{BINARY_EXTENSION}", self, self._fitMasks)
+
+	# replaces all walls by the ones of the binary map, the mask, wall index and fit masks are taken from the file as well
+	# (the mask is only rebuilt if the file was made for a different window size)
+	def loadBinary(self, filepath):
+		with MapFile(f"{filepath}{BINARY_EXTENSION}") as mapFile:
+			self.walls = [Wall(self.game, (ax, ay), (bx, by)) for ax, ay, bx, by in mapFile.walls.tolist()]
+			self.wallIndex = mapFile.wallIndex(self.walls)
+			self._wallsChanged()
+			if mapFile.size == tuple(self.game.windowSize):
+				self.mask = mapFile.mask()
+				self._fitMasks = mapFile.fitMasks()
+			else:
+				self._renewMask()
 
+	# an empty map is loaded from the binary file if it is at least as new as the csv file
+	# (binary maps are already optimized when they are written, see save)
 	def load(self, filepath):
+		binaryPath, csvPath = f"{filepath}{BINARY_EXTENSION}", f"{filepath}.csv"
+		if not self.walls and os.path.exists(binaryPath):
+			if not os.path.exists(csvPath) or os.path.getmtime(binaryPath) >= os.path.getmtime(csvPath):
+				try:
+					self.loadBinary(filepath)
+					return
+				except ValueError:
+					if not os.path.exists(csvPath):
+						raise
+		return self.loadCsv(filepath)
+
+	# the walls of the file are optimized before they are added, returns the MapOptimizationReport (None if not optimized)
+	def loadCsv(self, filepath, optimize=True):
+		segments, report = TankMap.readCsv(filepath), None
+		if optimize:
+			segments, report = optimizeSegments(segments)
+		with self.bulkEdit():
+			for x1, y1, x2, y2 in segments:
+				self.addWall((x1, y1), (x2, y2))
+		return report
+
+	# walls of a csv map as (start_x, start_y, end_x, end_y)
+	@staticmethod
+	def readCsv(filepath):
 		with open(f"{filepath}.csv", "r", encoding="utf8") as f:
 			csvReader = csv.reader(f, delimiter=TankMap.DATA_DELIMITER)
-			for l in csvReader:
-				self.addWall((int(l[0]), int(l[1])), (int(l[2]), int(l[3])))
+			return [(int(l[0]), int(l[1]), int(l[2]), int(l[3])) for l in csvReader]
+
+# Draws random positions at which a rect of a given size fits into a map (see TankMap.maskFittingRect).
+# The free positions are extracted once per map version and rect size and then sampled with NumPy
+class SpawnSampler:
+	def __init__(self, tankMap, rng=None):
+		self.map = tankMap
+		self.rng = np.random.default_rng() if rng is None else rng
+		self._free = {} # (w, h) -> (map version, flat indices of all free positions)
+
+	# flat indices (y*width + x) of all positions where a rect of the given size fits
+	def freePositions(self, w, h):
+		cached = self._free.get((w, h))
+		if cached is None or cached[0] != self.map.version:
+			cached = (self.map.version, np.flatnonzero(maskToArray(self.map.maskFittingRect(w, h))))
+			self._free[(w, h)] = cached
+		return cached[1]
+
+	# up to amount distinct (x, y) positions, which are at least minDistance apart from each other
+	def sample(self, w, h, amount, minDistance=0, attempts=32):
+		free = self.freePositions(w, h)
+		if amount <= 0 or len(free) == 0:
+			return []
+		width = self.map.mask.get_size()[0]
+		if minDistance <= 0:
+			picked = self.rng.choice(free, size=min(amount, len(free)), replace=False)
+			return list(zip((picked % width).tolist(), (picked // width).tolist()))
+		# greedy rejection sampling on a batch of candidates
+		candidates = self.rng.choice(free, size=min(amount*attempts, len(free)), replace=False)
+		points = np.stack((candidates % width, candidates // width), axis=1).astype(np.double)
+		chosen = np.empty((0, 2))
+		for p in points:
+			if len(chosen) == 0 or np.min(np.sum((chosen - p)**2, axis=1)) >= minDistance**2:
+				chosen = np.vstack((chosen, p))
+				if len(chosen) >= amount:
+					break
+		return [(int(x), int(y)) for x, y in chosen]
+
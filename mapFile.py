@@ -0,0 +1,120 @@
+import mmap
+import struct
+import numpy as np
+
+from PygameCollection.spatial import SegmentGrid
+from PygameCollection.utils import maskToArray, arrayToMask
+
+# Binary map format (.tmap), all values little endian, every section starts at a multiple of 8 bytes:
+#   header      magic, format version, window width/height, grid cell size and the counts of the sections below
+#   walls       int32 (wallCount, 4) -> start_x, start_y, end_x, end_y
+#   mask        uint8 (height, ceil(width/8)) -> collision mask of all walls, packed bits (np.packbits)
+#   cell keys   int32 (cellCount, 2) -> coordinates of the occupied cells of the wall index (SegmentGrid)
+#   offsets     int32 (cellCount+1) -> walls of cell i are cell walls[offsets[i]:offsets[i+1]]
+#   cell walls  int32 (indexLength) -> wall indices
+#   fit masks   per entry: int32 (w, h) followed by a packed mask like above (see TankMap.maskFittingRect)
+MAGIC = b"TMAP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIIIIII")
+FIT_HEADER = struct.Struct("<ii")
+EXTENSION = ".tmap"
+
+def _aligned(offset):
+	return (offset + 7) & ~7
+
+def _packMask(mask):
+	return np.packbits(maskToArray(mask), axis=1)
+
+# Read only view of a map file. The arrays are zero-copy views into the memory mapped file and
+# are only valid until the file is closed (do not keep references to them)
+class MapFile:
+	def __init__(self, path):
+		with open(path, "rb") as f:
+			self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			self._parse()
+		except Exception:
+			self.close()
+			raise
+
+	def _parse(self):
+		if len(self._mmap) < HEADER.size:
+			raise ValueError("not a map file (too short)")
+		magic, version, _, w, h, self.cellSize, wallCount, cellCount, indexLength, fitCount = HEADER.unpack_from(self._mmap, 0)
+		if magic != MAGIC:
+			raise ValueError("not a map file (wrong magic)")
+		if version != VERSION:
+			raise ValueError(f"unsupported map file version {version} (expected {VERSION})")
+		self.version = version
+		self.size = (w, h)
+		rowBytes = (w + 7) // 8
+		self._offset = HEADER.size
+		self.walls = self._array(np.int32, (wallCount, 4))
+		self.maskBits = self._array(np.uint8, (h, rowBytes))
+		self.cellKeys = self._array(np.int32, (cellCount, 2))
+		self.cellOffsets = self._array(np.int32, (cellCount + 1,))
+		self.cellWalls = self._array(np.int32, (indexLength,))
+		self.fitBits = {}
+		for _ in range(fitCount):
+			self._offset = _aligned(self._offset)
+			if self._offset + FIT_HEADER.size > len(self._mmap):
+				raise ValueError("map file is truncated")
+			fw, fh = FIT_HEADER.unpack_from(self._mmap, self._offset)
+			self._offset += FIT_HEADER.size
+			self.fitBits[(fw, fh)] = self._array(np.uint8, (h, rowBytes))
+
+	def _array(self, dtype, shape):
+		self._offset = _aligned(self._offset)
+		count = int(np.prod(shape))
+		end = self._offset + count * np.dtype(dtype).itemsize
+		if end > len(self._mmap):
+			raise ValueError("map file is truncated")
+		a = np.frombuffer(self._mmap, dtype=np.dtype(dtype).newbyteorder("<"), count=count, offset=self._offset).reshape(shape)
+		self._offset = end
+		return a
+
+	def _unpack(self, bits):
+		return arrayToMask(np.unpackbits(bits, axis=1, count=self.size[0]))
+
+	def mask(self):
+		return self._unpack(self.maskBits)
+
+	# (w, h) -> mask of the positions which fit a rect of that size
+	def fitMasks(self):
+		return {size: self._unpack(bits) for size, bits in self.fitBits.items()}
+
+	# walls: objects in the same order as self.walls
+	def wallIndex(self, walls):
+		return SegmentGrid.fromArrays(self.cellSize, walls, self.walls.tolist(), self.cellKeys, self.cellOffsets, self.cellWalls)
+
+	def close(self):
+		if self._mmap is None:
+			return
+		# views have to be released before the mapping can be closed
+		self.walls = self.maskBits = self.cellKeys = self.cellOffsets = self.cellWalls = None
+		self.fitBits = {}
+		self._mmap.close()
+		self._mmap = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+# fitMasks: (w, h) -> mask, see TankMap.maskFittingRect
+def writeMapFile(path, tankMap, fitMasks=None):
+	w, h = tankMap.mask.get_size()
+	walls = np.array([(*wall.start.toTuple(), *wall.end.toTuple()) for wall in tankMap.walls], dtype="<i4").reshape(-1, 4)
+	keys, offsets, indices = tankMap.wallIndex.toArrays(tankMap.walls)
+	fitMasks = {} if fitMasks is None else fitMasks
+	sections = [walls, _packMask(tankMap.mask), keys.astype("<i4"), offsets.astype("<i4"), indices.astype("<i4")]
+	for (fw, fh), m in fitMasks.items():
+		sections.append(FIT_HEADER.pack(fw, fh))
+		sections.append(_packMask(m))
+
+	with open(path, "wb") as f:
+		f.write(HEADER.pack(MAGIC, VERSION, 0, w, h, tankMap.wallIndex.cellSize, len(walls), len(keys), len(indices), len(fitMasks)))
+		for s in sections:
+			f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+			f.write(s if isinstance(s, bytes) else np.ascontiguousarray(s).tobytes())
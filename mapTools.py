@@ -0,0 +1,67 @@
+# Command line tools for map files
+# usage: python mapTools.py convert [paths ...] [--fit WxH ...]
+#        python mapTools.py optimize [paths ...] [--tolerance N] [--dry-run]
+import argparse
+import glob
+import os
+
+from map import TankMap, optimizeSegments
+from mapFile import EXTENSION
+from tankGame import TankClash, Tank
+
+# paths can be csv files (with or without extension) or directories containing them
+def mapPaths(paths):
+	for p in paths:
+		if os.path.isdir(p):
+			yield from sorted(os.path.splitext(f)[0] for f in glob.glob(os.path.join(p, "*.csv")))
+		else:
+			yield os.path.splitext(p)[0] if p.endswith(".csv") else p
+
+def convert(game, paths, fitSizes):
+	for path in mapPaths(paths):
+		m = TankMap(game)
+		report = m.loadCsv(path)
+		m.saveBinary(path, fitSizes)
+		print(f"{path}.csv -> {path}{EXTENSION} ({report})")
+
+# rewrites the csv (and binary) files of all maps with optimized walls
+def optimize(game, paths, tolerance, fitSizes, dryRun=False):
+	before = after = 0
+	for path in mapPaths(paths):
+		segments, report = optimizeSegments(TankMap.readCsv(path), tolerance)
+		before, after = before + report.before, after + report.after
+		if report.changed and not dryRun:
+			m = TankMap(game)
+			with m.bulkEdit():
+				for x1, y1, x2, y2 in segments:
+					m.addWall((x1, y1), (x2, y2))
+			m.save(path, fitSizes=fitSizes, optimize=False)
+		print(f"{path}: {report}")
+	print(f"total: {before} -> {after} walls")
+
+def fitSize(s):
+	w, h = s.lower().split("x")
+	return int(w), int(h)
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="tank clash map tools")
+	commands = parser.add_subparsers(dest="command", required=True)
+	convertParser = commands.add_parser("convert", help="convert csv maps into the binary map format")
+	convertParser.add_argument("paths", nargs="*", default=[TankClash.MAP_PATH])
+	convertParser.add_argument("--fit", type=fitSize, action="append", help="precomputed spawn fit mask size WxH (default: tank size)")
+	optimizeParser = commands.add_parser("optimize", help="merge collinear and overlapping walls of csv maps")
+	optimizeParser.add_argument("paths", nargs="*", default=[TankClash.MAP_PATH])
+	optimizeParser.add_argument("--tolerance", type=int, default=1, help="endpoints at most this many pixels apart are merged")
+	optimizeParser.add_argument("--fit", type=fitSize, action="append", help="precomputed spawn fit mask size WxH (default: tank size)")
+	optimizeParser.add_argument("--dry-run", action="store_true", help="only report, do not write any files")
+	args = parser.parse_args(args)
+
+	game = TankClash(headless=True)
+	fitSizes = args.fit or [(Tank.WIDTH, Tank.HEIGHT)]
+	if args.command == "convert":
+		convert(game, args.paths, fitSizes)
+	elif args.command == "optimize":
+		optimize(game, args.paths, args.tolerance, fitSizes, args.dry_run)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,196 @@
+# Recording and headless playback of matches. A replay only stores the action masks of every player per tick
+# (see tankGame.Player), the match is reproduced by running the simulation with the recorded seed, map and tps.
+# usage: python replay.py info <replay>
+#        python replay.py play <replay> [--seek TICK] [--snapshot-interval TICKS]
+#
+# file format (little endian): header "<4sHHqHHI" (magic, version, tps, seed, playerCount, length of the map name,
+# length of the settings), the map name (utf8), the settings (utf8 json, e.g. the AmmoType parameters),
+# the player ids (uint16 each), the sha1 digest of the final state (20 bytes, zeros if unknown),
+# the tick count (uint64), the run count (uint32), the run lengths (uint32 each)
+# and the masks of every run (one byte per player). Consecutive ticks with equal input are stored as one run
+import argparse
+import bisect
+import json
+import struct
+from timeit import default_timer
+import numpy as np
+
+from PygameCollection.simulation import Simulation
+from ammo import AmmoType
+from tankGame import TankClash
+
+MAGIC = b"TCRP"
+VERSION = 2
+EXTENSION = ".tcr"
+HEADER = struct.Struct("<4sHHqHHI")
+COUNTS = struct.Struct("<QI")
+DIGEST_SIZE = 20
+
+class Replay:
+	def __init__(self, mapName, seed, tps, playerIds, frames=None, digest=None, settings=None):
+		self.mapName = mapName
+		self.seed = seed
+		self.tps = tps
+		self.playerIds = tuple(playerIds)
+		self.frames = [] if frames is None else frames # per tick a bytes object with the action mask of every player
+		self.digest = digest # TankClash.stateDigest() after the last tick
+		self.settings = {} if settings is None else settings # game parameters which are not part of TankClash itself
+
+	def __len__(self):
+		return len(self.frames)
+
+	def duration(self):
+		return len(self.frames) / self.tps
+
+	def save(self, path):
+		n = len(self.playerIds)
+		frames = np.frombuffer(b"".join(self.frames), dtype=np.uint8).reshape(-1, n)
+		if len(frames):
+			starts = np.flatnonzero(np.concatenate(([True], np.any(frames[1:] != frames[:-1], axis=1))))
+			lengths = np.diff(np.append(starts, len(frames)))
+		else:
+			starts = lengths = np.empty(0, dtype=np.int64)
+		name = self.mapName.encode("utf8")
+		settings = json.dumps(self.settings).encode("utf8")
+		with open(path, "wb") as f:
+			f.write(HEADER.pack(MAGIC, VERSION, self.tps, self.seed, n, len(name), len(settings)))
+			f.write(name)
+			f.write(settings)
+			f.write(np.array(self.playerIds, dtype="<u2").tobytes())
+			f.write(self.digest or bytes(DIGEST_SIZE))
+			f.write(COUNTS.pack(len(frames), len(starts)))
+			f.write(lengths.astype("<u4").tobytes())
+			f.write(frames[starts].tobytes())
+
+	@classmethod
+	def load(cls, path):
+		with open(path, "rb") as f:
+			data = f.read()
+		if len(data) < HEADER.size:
+			raise ValueError(f"{path} is not a replay (file too short)")
+		magic, version, tps, seed, n, nameLength, settingsLength = HEADER.unpack_from(data)
+		if magic != MAGIC:
+			raise ValueError(f"{path} is not a replay (bad magic {magic!r})")
+		if version != VERSION:
+			raise ValueError(f"{path}: unsupported replay version {version} (expected {VERSION})")
+		offset = HEADER.size
+		try:
+			mapName = data[offset:offset+nameLength].decode("utf8")
+			offset += nameLength
+			settings = json.loads(data[offset:offset+settingsLength].decode("utf8"))
+			offset += settingsLength
+			playerIds = np.frombuffer(data, dtype="<u2", count=n, offset=offset).tolist()
+			offset += 2*n
+			digest = data[offset:offset+DIGEST_SIZE]
+			offset += DIGEST_SIZE
+			ticks, runs = COUNTS.unpack_from(data, offset)
+			offset += COUNTS.size
+			lengths = np.frombuffer(data, dtype="<u4", count=runs, offset=offset)
+			offset += 4*runs
+			masks = np.frombuffer(data, dtype=np.uint8, count=runs*n, offset=offset).reshape(runs, n)
+		except (ValueError, struct.error) as e:
+			raise ValueError(f"{path}: truncated replay") from e
+		if lengths.sum() != ticks:
+			raise ValueError(f"{path}: run lengths do not match the tick count")
+		frames = [bytes(m) for m in np.repeat(masks, lengths, axis=0)]
+		return cls(mapName, seed, tps, playerIds, frames, None if digest == bytes(DIGEST_SIZE) else digest, settings)
+
+# Collects the action masks of a running game (TankClash calls record() once per tick)
+class ReplayRecorder:
+	def __init__(self, game: TankClash):
+		assert all(0 <= p.id < 2**16 for p in game.players)
+		self.game = game
+		self.replay = Replay(game.mapName, game.seed, game.tps, [p.id for p in game.playersById()], settings={"ammo": AmmoType.getParameters()})
+
+	def record(self, masks):
+		self.replay.frames.append(bytes(masks))
+
+	def save(self, path):
+		self.replay.digest = self.game.stateDigest()
+		self.replay.save(path)
+		return self.replay
+
+# Reproduces a replay in a headless game as fast as possible. Every snapshotInterval ticks the state is kept,
+# so seeking only has to simulate from the closest snapshot before the target tick.
+# The AmmoType parameters of the replay are applied globally (they are read when the tanks are created)
+class ReplayPlayer:
+	def __init__(self, replay: Replay, snapshotInterval=600):
+		self.replay = replay
+		self.snapshotInterval = snapshotInterval
+		AmmoType.setParameters(replay.settings.get("ammo", {}))
+		self.game = TankClash(headless=True, mapName=replay.mapName, seed=replay.seed, tps=replay.tps, playerCount=len(replay.playerIds))
+		self.simulation = Simulation(self.game)
+		assert [p.id for p in self.game.playersById()] == list(replay.playerIds), "players of the replay do not match the game"
+		self.game.inputSource = self._masks
+		self.snapshots = {0: self.game.getState()}
+		self._snapshotTicks = [0]
+
+	@property
+	def tick(self):
+		return self.game.ticks
+
+	def finished(self):
+		return self.game.ticks >= len(self.replay)
+
+	def _masks(self, tick):
+		return self.replay.frames[tick]
+
+	def step(self):
+		tick = self.game.ticks
+		if tick % self.snapshotInterval == 0 and tick not in self.snapshots:
+			self.snapshots[tick] = self.game.getState()
+			bisect.insort(self._snapshotTicks, tick)
+		self.simulation.step()
+
+	# plays the given amount of ticks (all remaining ones by default), returns the elapsed wall clock time
+	def run(self, ticks=None):
+		start = default_timer()
+		end = len(self.replay) if ticks is None else min(len(self.replay), self.game.ticks + ticks)
+		while self.game.ticks < end:
+			self.step()
+		return default_timer() - start
+
+	def seek(self, tick):
+		assert 0 <= tick <= len(self.replay)
+		closest = self._snapshotTicks[bisect.bisect_right(self._snapshotTicks, tick) - 1]
+		# continuing from the current state is cheaper if it lies between the snapshot and the target
+		if not closest <= self.game.ticks <= tick:
+			self.game.setState(self.snapshots[closest])
+		self.run(tick - self.game.ticks)
+
+	# True/False if the final state matches the recorded digest, None if the replay has none
+	def verify(self):
+		self.seek(len(self.replay))
+		return None if self.replay.digest is None else self.game.stateDigest() == self.replay.digest
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="tank clash replays")
+	commands = parser.add_subparsers(dest="command", required=True)
+	infoParser = commands.add_parser("info", help="show the header of a replay")
+	infoParser.add_argument("path")
+	playParser = commands.add_parser("play", help="simulate a replay without rendering and check its final state")
+	playParser.add_argument("path")
+	playParser.add_argument("--seek", type=int, help="only simulate up to this tick")
+	playParser.add_argument("--snapshot-interval", type=int, default=600)
+	args = parser.parse_args(args)
+
+	replay = Replay.load(args.path)
+	print(f"map: {replay.mapName}, seed: {replay.seed}, tps: {replay.tps}, players: {list(replay.playerIds)}, "
+		  f"ticks: {len(replay)} ({replay.duration():.1f} s)")
+	if args.command == "play":
+		player = ReplayPlayer(replay, args.snapshot_interval)
+		start = default_timer()
+		result = None
+		if args.seek is None:
+			result = player.verify()
+			status = "no digest recorded" if result is None else "final state matches" if result else "final state DIFFERS"
+		else:
+			player.seek(min(args.seek, len(replay)))
+			status = f"stopped at tick {player.tick}"
+		elapsed = default_timer() - start
+		print(f"{status}, simulated {player.tick} ticks in {elapsed:.2f} s ({player.tick / max(elapsed, 1e-9):.0f} ticks/s)")
+		if result is False:
+			raise SystemExit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,399 @@
+# Authoritative match server: runs any number of headless TankClash matches in one process, receives the action
+# masks of the players over UDP and sends every client delta compressed snapshots of the tanks and projectiles.
+# usage: python server.py serve [--host H] [--port P] [--matches N] [--players N] [--map NAME] [--snapshot-rate HZ]
+#        python server.py bot [--host H] [--port P] [--match ID] [--seconds S]
+#        python server.py stats [--host H] [--port P]
+#
+# packets (little endian, first byte is the type):
+#   JOIN     client -> server  "<BH"    match id
+#   WELCOME  server -> client  "<BHHHH" match id, player id (0 --> match full or unknown), tps, snapshot rate
+#   INPUT    client -> server  "<BHBI"  match id, action mask (see tankGame.Player), tick of the last decoded snapshot
+#   LEAVE    client -> server  "<BH"    match id
+#   SNAPSHOT server -> client  "<BHII"  match id, tick, base tick (NO_BASE --> full snapshot), followed by a tank and
+#                                       a projectile table section: "<HH" (changed, removed), the changed records, the removed ids
+#   STATS    client <-> server "<B"     the reply is followed by the server metrics as utf8 json
+# A snapshot only contains the records which differ from the last snapshot the client has acknowledged
+import argparse
+import asyncio
+import json
+import random
+import struct
+from collections import OrderedDict
+from time import perf_counter
+import numpy as np
+
+from PygameCollection.simulation import Simulation
+from tankGame import TankClash
+
+JOIN, WELCOME, INPUT, LEAVE, SNAPSHOT, STATS = range(1, 7)
+JOIN_PACKET = struct.Struct("<BH")
+WELCOME_PACKET = struct.Struct("<BHHHH")
+INPUT_PACKET = struct.Struct("<BHBI")
+SNAPSHOT_HEADER = struct.Struct("<BHII")
+TABLE_HEADER = struct.Struct("<HH")
+NO_BASE = 0xFFFFFFFF
+
+POSITION_SCALE = 8 # positions are sent in 1/8 pixels
+ROTATION_SCALE = 2**16 / (2*np.pi)
+TANK_DTYPE = np.dtype([("id", "<u2"), ("x", "<i2"), ("y", "<i2"), ("rot", "<u2"), ("score", "<i2")])
+PROJECTILE_DTYPE = np.dtype([("id", "<u2"), ("x", "<i2"), ("y", "<i2")])
+TABLES = (TANK_DTYPE, PROJECTILE_DTYPE)
+
+# SNAPSHOT ENCODING ---------
+# quantized state of a match as one structured array per entity kind, sorted by id (projectiles by pool slot)
+def stateTables(game):
+	players = game.playersById()
+	tanks = np.empty(len(players), dtype=TANK_DTYPE)
+	for i, p in enumerate(players):
+		tanks[i] = (p.id, _quantize(p.tank.pos.x), _quantize(p.tank.pos.y), int(p.tank.rot % (2*np.pi) * ROTATION_SCALE) & 0xFFFF, p.score)
+	pool = game.projectiles
+	slots = np.flatnonzero(pool.alive)
+	projectiles = np.empty(len(slots), dtype=PROJECTILE_DTYPE)
+	projectiles["id"] = slots
+	pos = np.clip(np.round(pool.pos[slots] * POSITION_SCALE), -2**15, 2**15 - 1)
+	projectiles["x"], projectiles["y"] = pos[:, 0], pos[:, 1]
+	return tanks, projectiles
+
+def _quantize(v):
+	return int(min(max(round(v * POSITION_SCALE), -2**15), 2**15 - 1))
+
+# ids of both tables are sorted, so membership tests are binary searches
+def _contains(sortedIds, ids):
+	if len(sortedIds) == 0:
+		return np.zeros(len(ids), dtype=bool)
+	idx = np.minimum(np.searchsorted(sortedIds, ids), len(sortedIds) - 1)
+	return sortedIds[idx] == ids
+
+# all record fields are 16 bit, records are compared as rows of uint16
+def _rows(table):
+	return table.view("<u2").reshape(len(table), table.dtype.itemsize // 2)
+
+def encodeTable(table, base=None):
+	if base is None or len(base) == 0:
+		changed, removed = table, np.empty(0, dtype="<u2")
+	else:
+		idx = np.minimum(np.searchsorted(base["id"], table["id"]), len(base) - 1)
+		unchanged = (_rows(base[idx]) == _rows(table)).all(axis=1)
+		changed = table[~unchanged]
+		removed = base["id"][~_contains(table["id"], base["id"])]
+	return TABLE_HEADER.pack(len(changed), len(removed)) + changed.tobytes() + removed.astype("<u2").tobytes()
+
+def decodeTable(data, offset, dtype, base=None):
+	changedCount, removedCount = TABLE_HEADER.unpack_from(data, offset)
+	offset += TABLE_HEADER.size
+	changed = np.frombuffer(data, dtype=dtype, count=changedCount, offset=offset)
+	offset += changed.nbytes
+	removed = np.frombuffer(data, dtype="<u2", count=removedCount, offset=offset)
+	offset += removed.nbytes
+	if base is None:
+		return changed.copy(), offset
+	keep = base[~_contains(np.sort(removed), base["id"]) & ~_contains(changed["id"], base["id"])]
+	table = np.concatenate((keep, changed))
+	return table[np.argsort(table["id"], kind="stable")], offset
+
+def encodeSnapshot(matchId, tick, tables, baseTick=NO_BASE, baseTables=None):
+	data = SNAPSHOT_HEADER.pack(SNAPSHOT, matchId, tick, baseTick)
+	for i, table in enumerate(tables):
+		data += encodeTable(table, None if baseTables is None else baseTables[i])
+	return data
+
+# history: {tick: tables} of decoded snapshots, returns (match id, tick, tables) or None if the base is unknown
+def decodeSnapshot(data, history):
+	_, matchId, tick, baseTick = SNAPSHOT_HEADER.unpack_from(data)
+	if baseTick != NO_BASE and baseTick not in history:
+		return None
+	offset = SNAPSHOT_HEADER.size
+	tables = []
+	for i, dtype in enumerate(TABLES):
+		table, offset = decodeTable(data, offset, dtype, None if baseTick == NO_BASE else history[baseTick][i])
+		tables.append(table)
+	return matchId, tick, tuple(tables)
+
+# SERVER ---------
+class Client:
+	def __init__(self, address, playerIndex, now):
+		self.address = address
+		self.playerIndex = playerIndex
+		self.ack = None # tick of the last snapshot the client has decoded
+		self.lastSeen = now
+		self.bytesSent = 0
+		self.snapshotsSent = 0
+		self.fullSnapshots = 0
+
+class Match:
+	HISTORY = 32 # snapshots kept as possible delta bases
+
+	def __init__(self, matchId, mapName, seed, players, tps):
+		self.id = matchId
+		self.game = TankClash(headless=True, mapName=mapName, seed=seed, playerCount=players, tps=tps)
+		self.simulation = Simulation(self.game)
+		self.players = self.game.playersById()
+		self.masks = [0]*players
+		self.game.inputSource = lambda tick: self.masks
+		self.clients = {} # address -> Client
+		self.history = OrderedDict() # tick -> tables
+
+	def join(self, address, now):
+		if address not in self.clients:
+			taken = {c.playerIndex for c in self.clients.values()}
+			free = [i for i in range(len(self.players)) if i not in taken]
+			if not free:
+				return None
+			self.clients[address] = Client(address, free[0], now)
+		return self.players[self.clients[address].playerIndex]
+
+	def leave(self, address):
+		client = self.clients.pop(address, None)
+		if client is not None:
+			self.masks[client.playerIndex] = 0
+
+	def input(self, address, mask, ack, now):
+		client = self.clients.get(address)
+		if client is None:
+			return
+		self.masks[client.playerIndex] = mask
+		client.lastSeen = now
+		if ack in self.history and (client.ack is None or ack > client.ack):
+			client.ack = ack
+
+	# one snapshot per distinct base tick is encoded, clients which acknowledged the same snapshot share it
+	def snapshots(self, metrics):
+		tick = self.game.ticks
+		tables = stateTables(self.game)
+		self.history[tick] = tables
+		while len(self.history) > Match.HISTORY:
+			self.history.popitem(last=False)
+		encoded = {}
+		for client in self.clients.values():
+			base = client.ack if client.ack in self.history else NO_BASE
+			if base not in encoded:
+				start = perf_counter()
+				encoded[base] = encodeSnapshot(self.id, tick, tables, base, self.history.get(base))
+				metrics.encodeTime += perf_counter() - start
+				metrics.snapshotsEncoded += 1
+			yield client, encoded[base], base == NO_BASE
+
+class ServerMetrics:
+	def __init__(self):
+		self.ticks = 0
+		self.lateTicks = 0 # ticks which started more than one tick after their scheduled time
+		self.tickTime = 0
+		self.encodeTime = 0
+		self.snapshotsEncoded = 0
+		self.packetsReceived = 0
+		self.bytesReceived = 0
+		self.start = perf_counter()
+
+class MatchServer(asyncio.DatagramProtocol):
+	CLIENT_TIMEOUT = 10 # seconds without input until a client is dropped
+
+	def __init__(self, matches=1, players=2, mapName="testMap3", tps=60, snapshotRate=20, seed=None):
+		self.tps = tps
+		self.snapshotRate = snapshotRate
+		rng = random.Random(seed)
+		self.matches = {i: Match(i, mapName, rng.randrange(TankClash.MAX_SEED), players, tps) for i in range(1, matches + 1)}
+		self.metrics = ServerMetrics()
+		self.transport = None
+
+	def connection_made(self, transport):
+		self.transport = transport
+
+	def datagram_received(self, data, address):
+		self.metrics.packetsReceived += 1
+		self.metrics.bytesReceived += len(data)
+		now = perf_counter()
+		try:
+			kind = data[0]
+			if kind == INPUT:
+				_, matchId, mask, ack = INPUT_PACKET.unpack(data)
+				match = self.matches.get(matchId)
+				if match is not None:
+					match.input(address, mask, ack, now)
+			elif kind == JOIN:
+				_, matchId = JOIN_PACKET.unpack(data)
+				match = self.matches.get(matchId)
+				player = None if match is None else match.join(address, now)
+				self.transport.sendto(WELCOME_PACKET.pack(WELCOME, matchId, 0 if player is None else player.id, self.tps, self.snapshotRate), address)
+			elif kind == LEAVE:
+				_, matchId = JOIN_PACKET.unpack(data)
+				if matchId in self.matches:
+					self.matches[matchId].leave(address)
+			elif kind == STATS:
+				self.transport.sendto(bytes((STATS,)) + json.dumps(self.stats()).encode("utf8"), address)
+		except (IndexError, struct.error):
+			pass # malformed packets are ignored
+
+	def stats(self):
+		m = self.metrics
+		elapsed = perf_counter() - m.start
+		clients = [(match.id, c) for match in self.matches.values() for c in match.clients.values()]
+		return {
+			"uptime": elapsed,
+			"matches": len(self.matches),
+			"ticks": m.ticks,
+			"lateTicks": m.lateTicks,
+			"tickMs": m.tickTime / m.ticks * 1000 if m.ticks else 0,
+			"snapshotsEncoded": m.snapshotsEncoded,
+			"encodeUs": m.encodeTime / m.snapshotsEncoded * 1e6 if m.snapshotsEncoded else 0,
+			"bytesReceived": m.bytesReceived,
+			"clients": [{
+				"match": matchId,
+				"address": f"{c.address[0]}:{c.address[1]}",
+				"player": self.matches[matchId].players[c.playerIndex].id,
+				"snapshots": c.snapshotsSent,
+				"fullSnapshots": c.fullSnapshots,
+				"bytesSent": c.bytesSent,
+				"bytesPerSnapshot": c.bytesSent / c.snapshotsSent if c.snapshotsSent else 0,
+				"bytesPerSecond": c.bytesSent / elapsed if elapsed else 0,
+			} for matchId, c in clients],
+		}
+
+	def _tick(self):
+		start = perf_counter()
+		for match in self.matches.values():
+			match.simulation.step()
+		self.metrics.ticks += 1
+		self.metrics.tickTime += perf_counter() - start
+		if self.metrics.ticks % max(1, round(self.tps / self.snapshotRate)) == 0:
+			self._broadcast(start)
+
+	def _broadcast(self, now):
+		for match in self.matches.values():
+			for address in [a for a, c in match.clients.items() if now - c.lastSeen > MatchServer.CLIENT_TIMEOUT]:
+				match.leave(address)
+			for client, data, full in match.snapshots(self.metrics):
+				self.transport.sendto(data, client.address)
+				client.bytesSent += len(data)
+				client.snapshotsSent += 1
+				client.fullSnapshots += full
+
+	# fixed timestep: ticks which are due are caught up, if the server falls behind by more than a second it skips ahead
+	async def serve(self, host="127.0.0.1", port=7777):
+		loop = asyncio.get_running_loop()
+		transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+		dt = 1 / self.tps
+		due = loop.time()
+		try:
+			while True:
+				now = loop.time()
+				if now - due > 1:
+					due = now
+				while due <= now:
+					if now - due > dt:
+						self.metrics.lateTicks += 1
+					self._tick()
+					due += dt
+				await asyncio.sleep(max(0, due - loop.time()))
+		finally:
+			transport.close()
+
+# CLIENT ---------
+# Keeps the decoded state of a match, call sendInput() regularly (it also acknowledges the received snapshots)
+class MatchClient(asyncio.DatagramProtocol):
+	HISTORY = 64
+
+	def __init__(self, matchId):
+		self.matchId = matchId
+		self.transport = None
+		self.playerId = None
+		self.tps = self.snapshotRate = None
+		self.tick = None
+		self.tables = None # (tanks, projectiles), see stateTables
+		self.history = OrderedDict()
+		self.bytesReceived = 0
+		self.snapshotsReceived = 0
+		self.welcome = asyncio.get_running_loop().create_future()
+		self.statsReply = None
+
+	def connection_made(self, transport):
+		self.transport = transport
+		transport.sendto(JOIN_PACKET.pack(JOIN, self.matchId))
+
+	def datagram_received(self, data, address):
+		self.bytesReceived += len(data)
+		if data[0] == SNAPSHOT:
+			decoded = decodeSnapshot(data, self.history)
+			if decoded is None or decoded[0] != self.matchId or (self.tick is not None and decoded[1] <= self.tick):
+				return
+			_, self.tick, self.tables = decoded
+			self.history[self.tick] = self.tables
+			while len(self.history) > MatchClient.HISTORY:
+				self.history.popitem(last=False)
+			self.snapshotsReceived += 1
+		elif data[0] == WELCOME and not self.welcome.done():
+			_, _, playerId, self.tps, self.snapshotRate = WELCOME_PACKET.unpack(data)
+			self.playerId = playerId or None
+			self.welcome.set_result(self.playerId)
+		elif data[0] == STATS and self.statsReply is not None and not self.statsReply.done():
+			self.statsReply.set_result(json.loads(data[1:].decode("utf8")))
+
+	def sendInput(self, mask):
+		self.transport.sendto(INPUT_PACKET.pack(INPUT, self.matchId, mask, NO_BASE if self.tick is None else self.tick))
+
+	def leave(self):
+		self.transport.sendto(JOIN_PACKET.pack(LEAVE, self.matchId))
+
+	async def requestStats(self):
+		self.statsReply = asyncio.get_running_loop().create_future()
+		self.transport.sendto(bytes((STATS,)))
+		return await self.statsReply
+
+async def connect(host="127.0.0.1", port=7777, matchId=1, timeout=2):
+	loop = asyncio.get_running_loop()
+	transport, client = await loop.create_datagram_endpoint(lambda: MatchClient(matchId), remote_addr=(host, port))
+	await asyncio.wait_for(client.welcome, timeout)
+	return client
+
+# holds random action masks, like tournament.RandomController
+async def runBot(host, port, matchId, seconds, seed=None):
+	client = await connect(host, port, matchId)
+	if client.playerId is None:
+		print(f"match {matchId} is full or does not exist")
+		return
+	rng = random.Random(seed)
+	loop = asyncio.get_running_loop()
+	end = loop.time() + seconds
+	mask = 0
+	while loop.time() < end:
+		if rng.random() < 0.05:
+			mask = rng.randrange(32)
+		client.sendInput(mask)
+		await asyncio.sleep(1 / client.tps)
+	client.leave()
+	print(f"player {client.playerId}: {client.snapshotsReceived} snapshots, {client.bytesReceived} bytes "
+		  f"({client.bytesReceived / seconds:.0f} B/s), last tick {client.tick}")
+
+async def printStats(host, port):
+	client = await connect(host, port, 0)
+	print(json.dumps(await asyncio.wait_for(client.requestStats(), 2), indent=2))
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="tank clash match server")
+	commands = parser.add_subparsers(dest="command", required=True)
+	serveParser = commands.add_parser("serve", help="run matches")
+	serveParser.add_argument("--matches", type=int, default=1)
+	serveParser.add_argument("--players", type=int, default=2)
+	serveParser.add_argument("--map", default="testMap3")
+	serveParser.add_argument("--tps", type=int, default=60)
+	serveParser.add_argument("--snapshot-rate", type=int, default=20, help="snapshots per second")
+	serveParser.add_argument("--seed", type=int)
+	botParser = commands.add_parser("bot", help="join a match with random input")
+	botParser.add_argument("--match", type=int, default=1)
+	botParser.add_argument("--seconds", type=float, default=10)
+	commands.add_parser("stats", help="print the metrics of a running server")
+	for p in commands.choices.values():
+		p.add_argument("--host", default="127.0.0.1")
+		p.add_argument("--port", type=int, default=7777)
+	args = parser.parse_args(args)
+
+	if args.command == "serve":
+		server = MatchServer(args.matches, args.players, args.map, args.tps, args.snapshot_rate, args.seed)
+		print(f"serving {args.matches} matches on {args.host}:{args.port}")
+		asyncio.run(server.serve(args.host, args.port))
+	elif args.command == "bot":
+		asyncio.run(runBot(args.host, args.port, args.match, args.seconds))
+	elif args.command == "stats":
+		asyncio.run(printStats(args.host, args.port))
+
+if __name__ == "__main__":
+	main()
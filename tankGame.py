@@ -1,27 +1,42 @@
-import random
-
+import hashlib
 import pygame, sys, os
+import numpy as np
 from math import pi
 from abc import ABC, abstractmethod
-from enum import Enum, auto
-from timeit import default_timer
+from enum import Enum, IntEnum, auto
 
+from PygameCollection.assets import assets, EXTENSION as ASSET_EXTENSION
 from PygameCollection.math import Vector2D, rad2deg
-from PygameCollection.gameObjects import MovableSprite, showRect, showMask, showCenter
-from PygameCollection.game import Base2DGame, KeyType
+from PygameCollection.collision import OrientedBox
+from PygameCollection.gameObjects import MovableSprite, ProfilerOverlay, showRect, showMask, showCenter, rotationCache
+from PygameCollection.game import Base2DGame, GameObjControlManager, keyCode
 from PygameCollection.templates import BasicMSpriteController
-from PygameCollection.utils import loadConvFacScaledImg, loadConvScaledImg, showVecDirSprite, showVector, printRuntime
+from PygameCollection.profiling import profiler
+from PygameCollection.utils import showVecDirSprite, showVector, printRuntime
 
-from ammo import Ammunition, AmmoType
+from ammo import Ammunition, AmmoType, ProjectilePool, Projectile
+from hitDetection import HitDetection, CollisionKind
 from map import Wall, TankMap
 
+# layers of TankClash's drawing queue, lower layers are drawn first
+class DrawLayer(IntEnum):
+	MAP = 0
+	TANKS = 1
+	PROJECTILES = 2
+	HUD = 3
+
+# The input of a player during one tick is a bit mask of its actions (bit i set --> ACTIONS[i] is performed),
+# which is all a replay has to store (see replay.py)
 class Player:
+	ACTIONS = ("forward", "left", "backward", "right", "shoot")
+
 	def __init__(self, name, id, game):
 		self.name = name
 		self.id = id
 		self.game = game
 		self.score = 0
 		self.tank = None
+		self.controls = {} # key code -> action bit
 
 	def setTank(self, tank):
 		self.tank = tank
@@ -29,171 +44,342 @@ class Player:
 	def setPosition(self, x, y):
 		self.tank.pos = Vector2D(x, y)
 
+	# key names are resolved to key codes once when binding (see GameObjControlManager)
 	def setControls(self, controls):
-		for key in controls:
-			action = controls[key]
-			self.game.controls[key] = self.tank.actions[action]
+		self.controls = {keyCode(key): 1 << Player.ACTIONS.index(action) for key, action in controls.items()}
+
+	def actionMask(self, keys):
+		mask = 0
+		for code, bit in self.controls.items():
+			if keys.pyKeys[code]:
+				mask |= bit
+		return mask
+
+	def applyActions(self, mask):
+		if mask:
+			for i, action in enumerate(Player.ACTIONS):
+				if mask >> i & 1:
+					self.tank.actions[action]()
 
 class Tank(MovableSprite, BasicMSpriteController):
 	#todo: implement properly
 	WIDTH = 62#40
 	HEIGHT = 114#80
+	ROT_STEPS = 100
+	MAX_HEALTH = 3
+	OWN_HIT_DELAY = 0.25 # seconds until a tank can be hit by its own projectiles (they are spawned close to it)
+	SPAWN_CLEARANCE = 1 # minimal distance between a spawned tank and the walls
 
 	def __init__(self, game, img, pos, *args, **kwargs):
 		MovableSprite.__init__(self, game, img, pos, *args, **kwargs)
 		BasicMSpriteController.__init__(self)
 
-		self.rotSpeed = 2*pi/100
+		self.rotSpeed = 2*pi/Tank.ROT_STEPS
+		self.rotSteps = Tank.ROT_STEPS
 		self.setRotationOffset(-pi/2) #based on the rotational offset of the sprite image
 		self.v = 5
 
+		self.analyticCollision = True
+		self.slide = True
+
 		self.actions["shoot"] = self.shoot
 		self.ammo: Ammunition = Ammunition.getAmmo(AmmoType.NORMAL)
+		self.health = Tank.MAX_HEALTH
+		self.startPos = pos # pose at the start of the current tick
+		self.startRot = self.rot
+
+	# collision with the map is solved in closed form (see PygameCollection.collision.solveBoxMotion):
+	# the rotation is limited first, then the movement (optionally sliding along walls)
+	def update(self):
+		self.startPos = self.pos
+		self.startRot = self.rot
+		if not self.analyticCollision:
+			return self.updateRecursive()
+		posBefore = self.pos
+		rotBefore = self.rot
+		with profiler.phase("controller"):
+			for f in self._tryUpdate:
+				f()
+			self._tryUpdate = list()
+
+		dx, dy = (self.pos - posBefore).toTuple()
+		dRot = self.rot - rotBefore
+		if dx != 0 or dy != 0 or dRot != 0:
+			with profiler.phase("collision"):
+				dx, dy, dRot = self.game.map.moveBox(self.getBox(posBefore, rotBefore), dx, dy, dRot, slide=self.slide, rotationStep=self.rotSpeed)
+			self.pos = posBefore + Vector2D(dx, dy)
+			self.rot = rotBefore + dRot
+			self.dir = Vector2D.fromRadiant(self.rot + self.rotOffset)
+		MovableSprite.update(self)
 
-	# recursive collision correction
-	#todo: enhance performance, generalize approach and evaluate efficiency
-	def update(self, scale=1.0, threshold=0.01):
+	# bounding box of the tank image (local x axis along the width of the unrotated sprite)
+	def getBox(self, pos=None, rot=None):
+		pos = self.pos if pos is None else pos
+		return OrientedBox(pos.x, pos.y, self.img.get_width()/2, self.img.get_height()/2, self.rot if rot is None else rot)
+
+	# recursive collision correction (previous approach, kept for comparison in benchmarks/tankCollision.py)
+	def updateRecursive(self, scale=1.0, threshold=0.01):
 		posBefore = self.pos
 		rotBefore = self.rot
 		for f in self._tryUpdate:
 			f(scale)
 
 		MovableSprite.update(self)
-		# check for collision with map (todo: don't allow objects to pass through wall because of to high speeds)
-		if self.game.map.hitsAnyWall(self):
+		# check for collision with map
+		if self.game.map.hitsAnyWall(self) or self._hasPhasedAnyWall(posBefore):
 			self.pos = posBefore
 			self.rot = rotBefore
 			if scale >= threshold:
-				self.update(scale=scale*0.5)
+				self.updateRecursive(scale=scale*0.5)
 			else:
 				MovableSprite.update(self)
 
 		self._tryUpdate = list()
 
-	# todo: implement this
 	# if any wall was faced through, this function returns the given wall
-	def _hasPhasedAnyWall(self):
-		# 1.) check new rect and pos and compare with every wall
-		pass
+	# (the center of a tank can never get closer to a wall than its half width without colliding)
+	def _hasPhasedAnyWall(self, posBefore):
+		if posBefore == self.pos:
+			return
+		hit = self.game.map.sweep(posBefore, self.pos)
+		return None if hit is None else hit.wall
+
+	# back to the pose at the start of the tick (a legal position, the map was checked when moving there)
+	def revertMove(self):
+		self.moveTo(self.startPos, self.startRot)
+
+	def moveTo(self, pos, rot):
+		self.pos = pos
+		self.rot = rot
+		self.dir = Vector2D.fromRadiant(self.rot + self.rotOffset)
+		MovableSprite.update(self)
+
+	# everything of the tank which changes during a match (between two ticks no actions are pending)
+	def getState(self):
+		return {"pos": self.pos.toTuple(), "rot": self.rot, "dir": self.dir.toTuple(), "health": self.health, "ammo": self.ammo.getState()}
+
+	def setState(self, state):
+		self.pos = Vector2D(*state["pos"])
+		self.rot = state["rot"]
+		self.dir = Vector2D(*state["dir"])
+		self.health = state["health"]
+		self.ammo.setState(state["ammo"])
+		self._tryUpdate = list()
+		MovableSprite.update(self)
+		# no interpolation across the jump to the restored pose
+		self.savePrevious()
 
 	def shoot(self):
-		projectile = self.ammo.tryGetBullet(
+		self.ammo.tryGetBullet(
 			game=self.game,
 			pos=self.pos+self.dir*70,
 			direction=self.dir
 		)
-		if projectile is not None:
-			self.game.drawingQueue.append(projectile)
 
+# All randomness of a match is drawn from self.rng and all timing is done in ticks, so a match is fully
+# determined by its map, seed, tps and the action masks of its players per tick (see replay.py)
 class TankClash(Base2DGame):
 	MAP_PATH = os.path.join("maps")
-
-	def __init__(self, *args, **kwargs):
+	ASSET_BUNDLE = os.path.join("assets", f"cache{ASSET_EXTENSION}") # preprocessed images, written on the first start
+	MAX_SEED = 2**63
+	PLAYERS = (
+		("Ivo", "TankBlue.png", {"w": "forward", "a": "left", "s": "backward", "d": "right", "space": "shoot"}),
+		("Flitzi", "TankRed.png", {"up": "forward", "left": "left", "down": "backward", "right": "right", "return": "shoot"}),
+	)
+
+	# playerCount: 1 or 2 players with keyboard controls, further players have none (driven by replays or bots)
+	# recordPath: the match is recorded into this replay file (written when the game is closed)
+	def __init__(self, *args, mapName="testMap3", seed=None, playerCount=1, recordPath=None, **kwargs):
 		super().__init__(*args, **kwargs)
+		self.mapName = mapName
+		self.seed = int(np.random.SeedSequence().entropy % TankClash.MAX_SEED) if seed is None else seed
+		self.rng = np.random.default_rng(self.seed)
+		self.playerCount = playerCount
+		self.dirtyRendering = True
 		self.players = set()
-		self.controls = {}
-
+		self.controls = GameObjControlManager()
+		self.inputSource = None # callable(tick) returning the action masks of all players (ordered by id), replaces the keyboard
+		self.recorder = None
+		self.recordPath = recordPath
+		self.collisions = [] # CollisionEvents of the last tick
+
+	# images are loaded once per process and shared by all games (see PygameCollection.assets)
+	@staticmethod
+	def tankImage(name):
+		return assets.image(("assets", "img", name), 0.5)
+
+	def loadAssets(self):
+		assets.useBundle(TankClash.ASSET_BUNDLE)
+		AmmoType.setImage(AmmoType.NORMAL, assets.image(("assets", "img", "ProjectileBall.png"), size=(30, 30)))
+		for _, imgName, _ in TankClash.PLAYERS:
+			rotationCache.warmUp(TankClash.tankImage(imgName), Tank.ROT_STEPS)
+		assets.updateBundle()
 
 	def setup(self):
-		AmmoType.setImage(AmmoType.NORMAL, loadConvScaledImg(("assets", "img", "ProjectileBall.png"), (30, 30)))
+		self.loadAssets()
 
 		self.map = TankMap(self)
-		self.map.load(os.path.join(TankClash.MAP_PATH ,"testMap3"))
-		self.drawingQueue.insert(0, self.map)
+		self.map.load(os.path.join(TankClash.MAP_PATH, self.mapName))
+		self.map.spawnSampler.rng = self.rng
+		self.drawingQueue.append(self.map, DrawLayer.MAP)
+		self.projectiles = ProjectilePool(self)
+		self.drawingQueue.append(self.projectiles, DrawLayer.PROJECTILES)
+		self.hitDetection = HitDetection(self)
 
 		#todo: include placeable spawnpoints
-		spawns = self.possibleSpawnLocations(2)
-
-		p1 = Player("Ivo", 1, self)
-		img = loadConvFacScaledImg(("assets", "img", "TankBlue.png"), 0.5)
-		p1.setTank(Tank(self, img, Vector2D(0, 0)))
-		showRect(p1.tank)
-		showCenter(p1.tank)
-		#hideHitbox(p1.tank)
-		#showMask(p1.tank)
-
-		p1.setControls({
-			"w": "forward",
-			"a": "left",
-			"s": "backward",
-			"d": "right",
-			"space": "shoot"
-		})
-
-		p1.setPosition(*spawns[0])
-
-		# p2 = Player("Flitzi", 2, self)
-		# img = loadConvFacScaledImg(("assets", "img", "TankRed.png"), 0.5)
-		# p2.setTank(Tank(self, img, Vector2D(0, 0)))
-		# p2.setControls({
-		# 	"up": "forward",
-		# 	"left": "left",
-		# 	"down": "backward",
-		# 	"right": "right",
-		# 	"return": "shoot"
-		# })
-		# p2.setPosition((self.w // 3) * 2, self.h // 2)
-		#
-		# self.players.add(p2)
-		self.players.add(p1)  # create playerLobby class
-
-		self.drawingQueue.append(p1.tank)
-		#self.drawingQueue.append(p2.tank)
+		spawns = self.possibleSpawnLocations(max(2, self.playerCount), minDistance=Tank.HEIGHT)
+
+		for i in range(self.playerCount):
+			name, imgName, controls = TankClash.PLAYERS[i] if i < len(TankClash.PLAYERS) else (f"Bot{i+1}", "TankRed.png", {})
+			p = Player(name, i+1, self)
+			p.setTank(Tank(self, TankClash.tankImage(imgName), Vector2D(0, 0)))
+			if i == 0:
+				showRect(p.tank)
+				showCenter(p.tank)
+			#hideHitbox(p.tank)
+			#showMask(p.tank)
+			p.setControls(controls)
+			p.setPosition(*spawns[i % len(spawns)])
+			self.addPlayer(p) # create playerLobby class
+
+		if self.recordPath is not None:
+			from replay import ReplayRecorder
+			self.recorder = ReplayRecorder(self)
+
+		# F3 toggles profiling and its overlay
+		if not self.headless:
+			self.profilerOverlay = ProfilerOverlay(self)
+			self.profilerOverlay.skipDraw = not profiler.enabled
+			self.drawingQueue.append(self.profilerOverlay, DrawLayer.HUD)
+			self.controls.bindKeyUp(pygame.K_F3, self.toggleProfiler)
+
+	def teardown(self):
+		if self.recorder is not None:
+			self.recorder.save(self.recordPath)
+
+	def toggleProfiler(self):
+		profiler.enabled = not profiler.enabled
+		self.profilerOverlay.skipDraw = not profiler.enabled
 
 	# if unique is True locations are only returned if their count matches the amount
-	def possibleSpawnLocations(self, amount, unique=False):
-		m = self.map.maskFittingRect(Tank.WIDTH, Tank.HEIGHT)
-		pos = list()
-		# todo: measure if shuffling saves time since its O(n)
-		w, h = m.get_size()
-		xs = list(range(w))
-		ys = list(range(h))
-		random.shuffle(xs)
-		random.shuffle(ys)
-		for x in xs:
-			for y in ys:
-				if m.get_at((x, y)):
-					pos.append((x, y))
-					if len(pos) >= amount:
-						return pos
-					break #x coordinate is changed
-		if not unique:
+	# minDistance: minimal distance between the returned locations
+	# The locations are meant for upright tanks (rot 0) and keep some clearance to the walls
+	# (the motion solver can not rotate a box away from an exact contact)
+	def possibleSpawnLocations(self, amount, unique=False, minDistance=0):
+		pos = self.map.spawnLocations(Tank.WIDTH, Tank.HEIGHT, amount, minDistance, clearance=Tank.SPAWN_CLEARANCE)
+		if len(pos) >= amount or not unique:
 			return pos
 
+	def playersById(self):
+		return sorted(self.players, key=lambda p: p.id)
+
+	# world logic of one tick, runs the same with or without a window
+	def update(self):
+		players = self.playersById()
+		if self.inputSource is not None:
+			masks = self.inputSource(self.ticks)
+		else:
+			masks = [p.actionMask(self.key) for p in players]
+		if self.recorder is not None:
+			self.recorder.record(masks)
+		for p, mask in zip(players, masks):
+			p.applyActions(mask)
+		self.controls.dispatch(self.key)
+		# projectiles are moved and expired by self.projectiles, tanks collide with the map in Tank.update
+
+	# tanks and projectiles have moved, hits are resolved in the order of the events
+	def lateUpdate(self):
+		self.collisions = self.hitDetection.detect()
+		for e in self.collisions:
+			if e.kind is CollisionKind.TANK:
+				self.onTankContact(e.player, e.other)
+			else:
+				self.onProjectileHit(e.player, e.other)
+
+	# tanks can not drive into each other, a tank which came closer to the other one during this tick is moved back
+	# (moving apart is always possible, e.g. after overlapping spawns)
+	def onTankContact(self, p1, p2):
+		t1, t2 = p1.tank, p2.tank
+		distance = (t1.pos - t2.pos).magnitude()
+		if (t1.startPos - t2.pos).magnitude() >= distance:
+			t1.revertMove()
+		if (t2.startPos - t1.pos).magnitude() >= distance:
+			t2.revertMove()
+
+	# the projectile is removed, the shooter scores when the hit destroys an opponent's tank
+	def onProjectileHit(self, player, slot):
+		pool = self.projectiles
+		if not pool.alive[slot]:
+			return # already hit another tank during this tick
+		owner = pool.owners[slot]
+		shooter = next((p for p in self.players if p.tank.ammo is owner), None)
+		if shooter is player and self.ticks - pool.born[slot] < self.toTicks(Tank.OWN_HIT_DELAY):
+			return
+		if owner is not None:
+			owner.kill(slot)
+		else:
+			pool.kill(slot)
+		tank = player.tank
+		tank.health -= owner.ammoClass.DAMAGE if owner is not None else Projectile.DAMAGE
+		if tank.health <= 0:
+			if shooter is not None and shooter is not player:
+				shooter.score += 1
+			self.respawn(player)
+
+	# upright at the free location farthest away from the other tanks (drawn from the match's rng),
+	# the tank stays where it is if there is none
+	def respawn(self, player, candidates=8):
+		tank = player.tank
+		others = [p.tank.pos for p in self.players if p is not player]
+		spawns = self.possibleSpawnLocations(candidates, minDistance=Tank.HEIGHT)
+		if spawns:
+			pos = max(spawns, key=lambda s: min(((Vector2D(*s) - o).magnitude() for o in others), default=0))
+			tank.moveTo(Vector2D(*pos), 0)
+		tank.startPos = tank.pos
+		tank.startRot = tank.rot
+		tank.health = Tank.MAX_HEALTH
+		tank.savePrevious()
+
 	#@printRuntime
 	def loop(self):
-		for k in self.controls:
-			if self.key.heldDown(k, KeyType.STRING):
-				self.controls[k]()
-
-		# collision testing
-		# player collisions
-		# tanks = [p.tank for p in self.players]
-		# t1, t2 = tuple(tanks)
-		# if t1.maskCollidesWith(t2):
-		# 	print("boom")
-		# player wall collisions
-
-		# for w in self.map.walls:
-
-
-		for player in self.players:
-			#showVecDirSprite(player.tank)
-			toBeRemoved = set()
-			# checks bullet timeout
-			for b in player.tank.ammo.activeShots:
-				#showVecDirSprite(b)
-				if b.hasExpired():
-					toBeRemoved.add(b)
-
-			for i in toBeRemoved:
-				player.tank.ammo.kill(i)
-				self.drawingQueue.remove(i)
+		pass
+
+	# snapshot of everything that changes during a match (the map is not part of it)
+	def getState(self):
+		return {
+			"ticks": self.ticks,
+			"rng": self.rng.bit_generator.state,
+			"players": {p.id: {"score": p.score, "tank": p.tank.getState()} for p in self.players},
+			"projectiles": self.projectiles.getState(),
+		}
+
+	def setState(self, state):
+		self.ticks = state["ticks"]
+		self.rng.bit_generator.state = state["rng"]
+		for p in self.players:
+			p.score = state["players"][p.id]["score"]
+			p.tank.setState(state["players"][p.id]["tank"])
+		self.projectiles.setState(state["projectiles"])
+
+	# fingerprint of the match state, two runs of the same replay have to end with the same digest
+	def stateDigest(self):
+		h = hashlib.sha1()
+		h.update(np.int64(self.ticks).tobytes())
+		for p in self.playersById():
+			t = p.tank
+			h.update(np.array((p.id, p.score, t.health, t.pos.x, t.pos.y, t.rot), dtype=np.double).tobytes())
+		pool = self.projectiles
+		alive = np.flatnonzero(pool.alive)
+		for a in (alive, pool.pos[alive], pool.dir[alive], pool.born[alive]):
+			h.update(a.tobytes())
+		return h.digest()
 
 	def addPlayer(self, player):
 		self.players.add(player)
-		self.drawingQueue.append(player.tank)
+		player.tank.ammo.attach(self.projectiles)
+		self.drawingQueue.append(player.tank, DrawLayer.TANKS)
 
 	def removePlayer(self, player):
 		self.players.remove(player)
-		self.drawingQueue.remove(player)
\ No newline at end of file
+		player.tank.ammo.detach()
+		self.drawingQueue.remove(player.tank)
\ No newline at end of file
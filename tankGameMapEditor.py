@@ -3,12 +3,13 @@ from enum import Enum
 
 from PygameCollection.math import Vector2D, rad2deg
 from PygameCollection.game import KeyType
-from PygameCollection.utils import loadConvFacScaledImg, loadConvScaledImg, showVecDirSprite, showVector
+from PygameCollection.utils import showVecDirSprite, showVector
 
-from ammo import AmmoType
+from ammo import ProjectilePool
+from hitDetection import HitDetection
 from map import Wall, TankMap
 
-from tankGame import TankClash, Tank, Player
+from tankGame import TankClash, Tank, Player, DrawLayer
 
 class ClipMode(Enum):
 	HORIZONTAL = "Horizontal"
@@ -20,6 +21,7 @@ class TankClashMapEditor(TankClash):
 
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
+		self.dirtyRendering = False # previews and texts are drawn directly in loop()
 
 		self.startPoint = None
 		self.endPoint = None
@@ -30,10 +32,14 @@ class TankClashMapEditor(TankClash):
 
 	def setup(self):
 		print("save map by pressing 'ctrl+s'")
-		AmmoType.setImage(AmmoType.NORMAL, loadConvScaledImg(("assets", "img", "ProjectileBall.png"), (30, 30)))
+		self.loadAssets()
 
 		self.map = TankMap(self)
-		self.drawingQueue.append(self.map)
+		self.map.setTileSize((256, 256))
+		self.drawingQueue.append(self.map, DrawLayer.MAP)
+		self.projectiles = ProjectilePool(self)
+		self.drawingQueue.append(self.projectiles, DrawLayer.PROJECTILES)
+		self.hitDetection = HitDetection(self)
 		# base map
 		offset = Wall.STANDARD_WIDTH//2
 		#todo: use this or implement reflection by "hitting" walls (basic norm reflection)
@@ -43,8 +49,7 @@ class TankClashMapEditor(TankClash):
 		self.map.addWallV((self.w-offset, offset), self.h)
 
 		p1 = Player("Ivo", 1, self)
-		img = loadConvFacScaledImg(("assets", "img", "TankBlue.png"), 0.5)
-		p1.setTank(Tank(self, img, Vector2D(0, 0)))
+		p1.setTank(Tank(self, TankClash.tankImage("TankBlue.png"), Vector2D(0, 0)))
 		# showRect(p1.tank)
 		# hideHitbox(p1.tank)
 		# showMask(p1.tank)
@@ -60,12 +65,16 @@ class TankClashMapEditor(TankClash):
 		p1.setPosition(self.w // 3, self.h // 2)
 		self.players.add(p1)
 
-		self.drawingQueue.append(p1.tank)
+		# select mode of snapping
+		self.controls.bindKeyUp(pygame.K_z, lambda: self.map.removeLast(minAmount=4)) #4 base walls are used as a boundary
+		self.controls.bindKeyUp(pygame.K_1, lambda: setattr(self, "clipMode", ClipMode.HORIZONTAL))
+		self.controls.bindKeyUp(pygame.K_2, lambda: setattr(self, "clipMode", ClipMode.VERTICAL))
+		self.controls.bindKeyUp(pygame.K_3, lambda: setattr(self, "clipMode", ClipMode.DIAGONAL))
+		self.controls.bindKeyUp(pygame.K_4, lambda: setattr(self, "cornerMode", not self.cornerMode))
+
+		self.drawingQueue.append(p1.tank, DrawLayer.TANKS)
 
 	def loop(self):
-		for k in self.controls:
-			if self.key.heldDown(k, KeyType.STRING):
-				self.controls[k]()
 		# snap courser to closest wall point
 		#if self.key.heldDown(pygame.K_LSHIFT) and self.key.keyDown(pygame.K_s) and self.startPoint is None:
 
@@ -109,18 +118,6 @@ class TankClashMapEditor(TankClash):
 		if self.startPoint is not None:
 			pygame.draw.line(self.screen, (122, 122, 122), self.startPoint, self.fixedTargetEnd, 5)
 
-		# select mode of snapping
-		if self.key.keyUp(pygame.K_z):
-			self.map.removeLast(minAmount=4) #4 base walls are used as a boundary
-		elif self.key.keyUp(pygame.K_1):
-			self.clipMode = ClipMode.HORIZONTAL
-		elif self.key.keyUp(pygame.K_2):
-			self.clipMode = ClipMode.VERTICAL
-		elif self.key.keyUp(pygame.K_3):
-			self.clipMode = ClipMode.DIAGONAL
-		elif self.key.keyUp(pygame.K_4):
-			self.cornerMode = not self.cornerMode
-
 		# render clipping mode as text
 		clipModeTxtSurface = self.font.render(f"Current clipping mode: {self.clipMode.value}", True, (0, 0, 0))
 		cornerModeTxtSurface = self.font.render(f"Corner snap-mode: {self.cornerMode}", True, (0, 0, 0))
@@ -130,5 +127,5 @@ class TankClashMapEditor(TankClash):
 		# save map
 		if self.key.heldDown(pygame.K_LCTRL) and self.key.keyDown(pygame.K_s):
 			mapName = input("enter a map name:")
-			self.map.save(os.path.join(TankClash.MAP_PATH, mapName))
-			print(f"save map: '{mapName}'")
\ No newline at end of file
+			report = self.map.save(os.path.join(TankClash.MAP_PATH, mapName), fitSizes=[(Tank.WIDTH, Tank.HEIGHT)])
+			print(f"save map: '{mapName}' ({report})")
\ No newline at end of file
@@ -0,0 +1,30 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from benchmarks.harness import BenchGame
+from map import TankMap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _segments(tankMap):
+	return [(*w.start.toTuple(), *w.end.toTuple()) for w in tankMap.walls]
+
+# like the map editor: save with ctrl+s, then undo the last wall with z
+def test_save_keeps_the_walls_of_the_map(tmp_path, monkeypatch):
+	monkeypatch.chdir(ROOT) # assets are loaded relative to the working directory
+	game = BenchGame()
+	path = str(tmp_path / "edited")
+	tankMap = TankMap(game)
+	for start, end in (((100, 100), (300, 100)), ((300, 100), (500, 100)), ((100, 400), (100, 600))):
+		tankMap.addWall(start, end)
+	before = _segments(tankMap)
+
+	report = tankMap.save(path)
+	assert report.changed
+	assert _segments(tankMap) == before
+	saved = TankMap(game)
+	saved.loadCsv(path, optimize=False)
+	assert len(saved.walls) == 2 # the two collinear walls are merged in the file
+
+	tankMap.removeLast()
+	assert _segments(tankMap) == before[:-1]
@@ -0,0 +1,45 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pytest
+
+from benchmarks.harness import BenchGame
+from benchmarks.tankMap import syntheticMap
+from map import TankMap
+from mapFile import EXTENSION, FIT_HEADER, MapFile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def saved(tmp_path, monkeypatch):
+	monkeypatch.chdir(ROOT) # assets are loaded relative to the working directory
+	game = BenchGame()
+	path = str(tmp_path / "synthetic")
+	tankMap = syntheticMap(game, 20, seed_=1)
+	tankMap.save(path, fitSizes=((40, 50),), optimize=False)
+	return game, tankMap, path
+
+# cuts the binary map in the middle of the header of its (only) fit mask
+def _truncateFitHeader(path):
+	binaryPath = f"{path}{EXTENSION}"
+	with MapFile(binaryPath) as mapFile:
+		fitBytes = mapFile.maskBits.nbytes
+	with open(binaryPath, "rb") as f:
+		data = f.read()
+	with open(binaryPath, "wb") as f:
+		f.write(data[:len(data) - fitBytes - FIT_HEADER.size//2])
+	# newer than the csv file, so load prefers it
+	os.utime(binaryPath, (os.path.getmtime(f"{path}.csv") + 1,)*2)
+
+def test_truncated_fit_header_raises_value_error(saved):
+	_, _, path = saved
+	_truncateFitHeader(path)
+	with pytest.raises(ValueError, match="truncated"):
+		MapFile(f"{path}{EXTENSION}")
+
+def test_truncated_binary_map_falls_back_to_csv(saved):
+	game, tankMap, path = saved
+	_truncateFitHeader(path)
+	loaded = TankMap(game)
+	loaded.load(path)
+	assert [(w.start.toTuple(), w.end.toTuple()) for w in loaded.walls] == [(w.start.toTuple(), w.end.toTuple()) for w in tankMap.walls]
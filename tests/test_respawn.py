@@ -0,0 +1,32 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pytest
+
+from benchmarks.tankMap import syntheticMap
+from PygameCollection.simulation import Simulation
+from tankGame import TankClash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def game(tmp_path, monkeypatch):
+	monkeypatch.chdir(ROOT) # assets are loaded relative to the working directory
+	path = str(tmp_path / "synthetic")
+	game = TankClash(headless=True, mapName=path, seed=2, playerCount=4)
+	syntheticMap(game, 80, seed_=5).save(path, optimize=False)
+	Simulation(game)
+	return game
+
+def test_spawned_tanks_do_not_overlap_walls(game):
+	for p in game.players:
+		assert not game.map.boxHitsWall(p.tank.getBox())
+
+@pytest.mark.parametrize("rot", [0, 0.7, 2.5])
+def test_respawned_tank_never_overlaps_a_wall(game, rot):
+	player = game.playersById()[0]
+	for _ in range(200):
+		player.tank.rot = rot
+		game.respawn(player)
+		assert player.tank.rot == 0
+		assert not game.map.boxHitsWall(player.tank.getBox())
@@ -0,0 +1,26 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from benchmarks.tankMap import syntheticMap
+from PygameCollection.simulation import Simulation
+from tankGame import TankClash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# frames drawn right after a snapshot is restored (e.g. seeking in a replay) show the restored pose
+def test_restored_tanks_are_not_interpolated_across_the_jump(tmp_path, monkeypatch):
+	monkeypatch.chdir(ROOT) # assets are loaded relative to the working directory
+	path = str(tmp_path / "synthetic")
+	game = TankClash(headless=True, mapName=path, seed=2, playerCount=2)
+	syntheticMap(game, 40, seed_=5).save(path, optimize=False)
+	sim = Simulation(game)
+	state = game.getState()
+	sim.run(60, lambda t: ("w", "a"))
+	for p in game.players:
+		p.tank.savePrevious() # done before every tick by games which are drawn
+
+	game.setState(state)
+	game.alpha = 0.5
+	for p in game.players:
+		pos, rot, _, _ = p.tank.interpolated()
+		assert pos == p.tank.pos and rot == p.tank.rot
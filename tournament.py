@@ -0,0 +1,290 @@
+# Runs many headless matches in parallel (one worker process per cpu core) and aggregates them into a single report,
+# e.g. for balance tests of AmmoType parameters
+# usage: python tournament.py [maps ...] [--matches N] [--ticks N] [--players N] [--controllers NAME ...]
+#                             [--ammo [TYPE.]NAME=VALUE ...] [--seed N] [--workers N] [--profile] [--replays DIR] [--out PATH]
+import argparse
+import json
+import multiprocessing
+import os
+from math import atan2
+from timeit import default_timer
+import numpy as np
+
+from PygameCollection.profiling import profiler
+from PygameCollection.simulation import Simulation
+from ammo import AmmoType, AMMO_PARAMETERS
+from mapTools import mapPaths
+from replay import ReplayRecorder, EXTENSION as REPLAY_EXTENSION
+from tankGame import TankClash, Player
+
+def actionMask(*actions):
+	return sum(1 << Player.ACTIONS.index(a) for a in actions)
+
+FORWARD, LEFT, BACKWARD, RIGHT, SHOOT = (actionMask(a) for a in Player.ACTIONS)
+
+# CONTROLLER-classes ---------
+# a controller returns the action mask of its player for the current tick (see tankGame.Player),
+# every controller gets its own seeded rng so matches are reproducible
+class Controller:
+	def __init__(self, rng):
+		self.rng = rng
+
+	def __call__(self, game, player):
+		return 0
+
+class IdleController(Controller):
+	pass
+
+# holds a random combination of actions for a random amount of ticks
+class RandomController(Controller):
+	def __init__(self, rng, minHold=5, maxHold=60):
+		super().__init__(rng)
+		self.minHold = minHold
+		self.maxHold = maxHold
+		self.mask = 0
+		self.until = 0
+
+	def __call__(self, game, player):
+		if game.ticks >= self.until:
+			self.mask = int(self.rng.integers(1 << len(Player.ACTIONS)))
+			self.until = game.ticks + int(self.rng.integers(self.minHold, self.maxHold + 1))
+		return self.mask
+
+# cycles through (ticks, actions) steps, starting at a random point of the script
+class ScriptedController(Controller):
+	SCRIPT = ((60, ("forward",)), (25, ("left", "shoot")), (40, ("forward", "shoot")), (25, ("right",)))
+
+	def __init__(self, rng, script=SCRIPT):
+		super().__init__(rng)
+		self.steps = [(ticks, actionMask(*actions)) for ticks, actions in script]
+		self.length = sum(ticks for ticks, _ in self.steps)
+		self.offset = int(rng.integers(self.length))
+
+	def __call__(self, game, player):
+		t = (game.ticks + self.offset) % self.length
+		for ticks, mask in self.steps:
+			if t < ticks:
+				return mask
+			t -= ticks
+
+# turns towards the closest opponent, shoots once it is aligned and closes in if it is further away than distance.
+# If a wall blocks the rotation, it backs off for a random amount of ticks
+class AimController(Controller):
+	def __init__(self, rng, distance=300, tolerance=0.1):
+		super().__init__(rng)
+		self.distance = distance
+		self.tolerance = tolerance
+		self.lastRot = None
+		self.reverseUntil = 0
+
+	def __call__(self, game, player):
+		tank = player.tank
+		others = [p.tank for p in game.players if p is not player]
+		if not others:
+			return 0
+		target = min(others, key=lambda t: (t.pos - tank.pos).magnitude())
+		v = target.pos - tank.pos
+		d = tank.dir
+		# signed angle from the facing direction to the target (positive --> clockwise on screen)
+		angle = atan2(d.x*v.y - d.y*v.x, d.x*v.x + d.y*v.y)
+		mask = 0
+		if angle > tank.rotSpeed/2:
+			mask |= RIGHT
+		elif angle < -tank.rotSpeed/2:
+			mask |= LEFT
+		if mask and tank.rot == self.lastRot and game.ticks >= self.reverseUntil:
+			self.reverseUntil = game.ticks + int(self.rng.integers(10, 40))
+		self.lastRot = tank.rot
+		if game.ticks < self.reverseUntil:
+			return mask | BACKWARD
+		if abs(angle) < self.tolerance:
+			mask |= SHOOT
+			if v.magnitude() > self.distance:
+				mask |= FORWARD
+		return mask
+
+CONTROLLERS = {
+	"idle": IdleController,
+	"random": RandomController,
+	"scripted": ScriptedController,
+	"aim": AimController,
+}
+
+# MATCHES ---------
+# runs a single match in the current process, spec is a dict created by schedule()
+def runMatch(spec):
+	previous = AmmoType.getParameters()
+	AmmoType.setParameters(spec["ammo"])
+	try:
+		game = TankClash(headless=True, mapName=spec["map"], seed=spec["seed"], playerCount=len(spec["controllers"]))
+		simulation = Simulation(game)
+		players = game.playersById()
+		controllers = [CONTROLLERS[name](np.random.default_rng((spec["seed"], p.id))) for name, p in zip(spec["controllers"], players)]
+		game.inputSource = lambda tick: [c(game, p) for c, p in zip(controllers, players)]
+		if spec["replay"] is not None:
+			game.recorder = ReplayRecorder(game)
+		profiler.reset()
+		profiler.enabled = spec["profile"]
+		elapsed = simulation.run(spec["ticks"])
+		profiler.enabled = False
+		if game.recorder is not None:
+			game.recorder.save(spec["replay"])
+		return {
+			"index": spec["index"],
+			"map": spec["map"],
+			"seed": spec["seed"],
+			"ticks": game.ticks,
+			"seconds": game.time(),
+			"elapsed": elapsed,
+			"players": [{"id": p.id, "controller": name, "score": p.score, "shotsFired": p.tank.ammo.shotsFired}
+						for name, p in zip(spec["controllers"], players)],
+			"phases": profiler.stats()["phases"] if spec["profile"] else {},
+			"projectilePool": game.projectiles.stats(),
+		}
+	finally:
+		profiler.enabled = False
+		AmmoType.setParameters(previous)
+
+# the controllers take turns on the player slots, so no controller always gets the same spawn order
+def schedule(maps, matches, ticks, players, controllers, seed=0, ammo=None, profile=False, replays=None):
+	rng = np.random.default_rng(seed)
+	specs = []
+	for i in range(matches):
+		specs.append({
+			"index": i,
+			"map": maps[i % len(maps)],
+			"seed": int(rng.integers(TankClash.MAX_SEED)),
+			"ticks": ticks,
+			"controllers": [controllers[(i + j) % len(controllers)] for j in range(players)],
+			"ammo": ammo or {},
+			"profile": profile,
+			"replay": None if replays is None else os.path.join(replays, f"match{i:05d}{REPLAY_EXTENSION}"),
+		})
+	return specs
+
+def runMatches(specs, workers=None, progress=None):
+	results = []
+	if workers == 1:
+		for spec in specs:
+			results.append(runMatch(spec))
+			if progress is not None:
+				progress(results[-1], len(results), len(specs))
+	else:
+		pool = multiprocessing.Pool(workers)
+		try:
+			for result in pool.imap_unordered(runMatch, specs):
+				results.append(result)
+				if progress is not None:
+					progress(result, len(results), len(specs))
+			pool.close()
+		except BaseException:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+	return sorted(results, key=lambda r: r["index"])
+
+# a match is won by the single player with the highest score (draws have no winner)
+def winner(result):
+	scores = sorted((p["score"] for p in result["players"]), reverse=True)
+	if len(scores) > 1 and scores[0] == scores[1]:
+		return None
+	return max(result["players"], key=lambda p: p["score"])
+
+def aggregate(results, wallTime=None):
+	ticks = sum(r["ticks"] for r in results)
+	cpuTime = sum(r["elapsed"] for r in results)
+	controllers = {}
+	for r in results:
+		best = winner(r)
+		for p in r["players"]:
+			c = controllers.setdefault(p["controller"], {"players": 0, "wins": 0, "score": 0, "shotsFired": 0})
+			c["players"] += 1
+			c["wins"] += p is best
+			c["score"] += p["score"]
+			c["shotsFired"] += p["shotsFired"]
+	for c in controllers.values():
+		c["meanScore"] = c["score"] / c["players"]
+		c["winRate"] = c["wins"] / c["players"]
+	maps = {}
+	for r in results:
+		maps[r["map"]] = maps.get(r["map"], 0) + 1
+	# phase times: mean over all matches of the mean per tick, the worst p99 of any match
+	phases = {}
+	for r in results:
+		for name, s in r["phases"].items():
+			phases.setdefault(name, []).append(s)
+	return {
+		"matches": len(results),
+		"ticks": ticks,
+		"simulatedSeconds": sum(r["seconds"] for r in results),
+		"cpuSeconds": cpuTime,
+		"wallSeconds": wallTime,
+		"ticksPerSecond": ticks / cpuTime if cpuTime else 0,
+		"controllers": controllers,
+		"maps": maps,
+		"phases": {name: {"mean": sum(s["mean"] for s in stats) / len(stats), "p99": max(s["p99"] for s in stats), "matches": len(stats)}
+				   for name, stats in sorted(phases.items())},
+		"results": results,
+	}
+
+def printReport(report):
+	print(f"{report['matches']} matches, {report['ticks']} ticks in {report['cpuSeconds']:.1f} cpu s "
+		  f"({report['ticksPerSecond']:.0f} ticks/s per worker)" + (f", {report['wallSeconds']:.1f} s wall time" if report["wallSeconds"] else ""))
+	print(f"{'controller':<12}{'players':>8}{'wins':>6}{'win rate':>10}{'mean score':>12}{'shots':>8}")
+	for name, c in sorted(report["controllers"].items()):
+		print(f"{name:<12}{c['players']:>8}{c['wins']:>6}{c['winRate']:>10.2f}{c['meanScore']:>12.2f}{c['shotsFired']:>8}")
+	if report["phases"]:
+		print(f"{'phase':<40}{'mean ms':>10}{'p99 ms':>10}")
+		for name, s in report["phases"].items():
+			print(f"{name:<40}{s['mean']:>10.3f}{s['p99']:>10.3f}")
+
+# "[TYPE.]NAME=VALUE" --> (type name, parameter, value), the type defaults to NORMAL
+def ammoOverride(s):
+	key, value = s.split("=")
+	key = key if "." in key else f"{AmmoType.NORMAL.name}.{key}"
+	typeName, parameter = key.split(".")
+	if typeName not in AmmoType.__members__ or parameter not in AMMO_PARAMETERS:
+		raise argparse.ArgumentTypeError(f"unknown ammo parameter '{key}'")
+	return typeName, parameter, int(value) if parameter == "shotMaximum" else float(value)
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="runs headless tank clash matches in parallel")
+	parser.add_argument("maps", nargs="*", default=[TankClash.MAP_PATH], help="csv maps or directories containing them")
+	parser.add_argument("--matches", type=int, default=16)
+	parser.add_argument("--ticks", type=int, default=60*60, help="length of every match")
+	parser.add_argument("--players", type=int, default=2)
+	parser.add_argument("--controllers", nargs="+", default=["aim", "random"], help=f"any of {', '.join(CONTROLLERS)}")
+	parser.add_argument("--ammo", type=ammoOverride, action="append", default=[], help="e.g. shotInterval=0.5 or NORMAL.shotMaximum=5")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--workers", type=int, default=None, help="worker processes (default: cpu count)")
+	parser.add_argument("--profile", action="store_true", help="collect per-phase timings")
+	parser.add_argument("--replays", help="directory to store a replay of every match in")
+	parser.add_argument("--out", default="tournamentReport.json")
+	args = parser.parse_args(args)
+
+	unknown = [c for c in args.controllers if c not in CONTROLLERS]
+	if unknown:
+		parser.error(f"unknown controllers: {', '.join(unknown)} (choose from {', '.join(CONTROLLERS)})")
+	# absolute paths, as map names are relative to TankClash.MAP_PATH
+	maps = [os.path.abspath(p) for p in mapPaths(args.maps)]
+	if not maps:
+		parser.error(f"no maps found in {', '.join(args.maps)}")
+	if args.replays is not None:
+		os.makedirs(args.replays, exist_ok=True)
+
+	ammo = {}
+	for typeName, parameter, value in args.ammo:
+		ammo.setdefault(typeName, {})[parameter] = value
+	specs = schedule(maps, args.matches, args.ticks, args.players, args.controllers, args.seed, ammo, args.profile, args.replays)
+	start = default_timer()
+	results = runMatches(specs, args.workers, lambda r, done, total: print(f"[{done}/{total}] match {r['index']} on {os.path.basename(r['map'])}: "
+		+ ", ".join(f"{p['controller']} {p['score']}" for p in r["players"])))
+	report = aggregate(results, default_timer() - start)
+	printReport(report)
+	with open(args.out, "w", encoding="utf8") as f:
+		json.dump(report, f, indent=2)
+	print(f"saved report to '{args.out}'")
+
+if __name__ == "__main__":
+	main()